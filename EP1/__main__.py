@@ -1,23 +1,142 @@
 import os
-import sys
+import argparse
 
 from threading import Thread
 
 from src.exceptions.InvalidDirectoryException import InvalidDirectoryException
-from src.main import init_server, menu, handle_list_peers, load_peers, handle_show_stats
+from src.models.logger import setup_logging, flush_logging
+from src.models.metrics import MetricsExporter
+from src.models.peer import Peer
+from src.models.scheduler import SCHEDULERS
+from src.main import init_server, menu, handle_list_peers, load_peers, handle_show_stats, handle_list_downloads, \
+    handle_resume_downloads, handle_show_metrics
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Peer da rede P2P")
+    parser.add_argument("address", help="Endereço do peer no formato <host>:<port>")
+    parser.add_argument("peers", help="Arquivo com a lista de peers conhecidos")
+    parser.add_argument("shared_dir", help="Pasta compartilhada")
+    parser.add_argument("--download", nargs="+", metavar="ARQUIVO",
+                        help="Baixa os arquivos informados sem abrir o menu e encerra")
+    parser.add_argument("--resume", action="store_true",
+                        help="Retoma os downloads interrompidos sem abrir o menu e encerra")
+    parser.add_argument("--max-downloads", type=int, default=4,
+                        help="Quantidade máxima de downloads simultâneos")
+    parser.add_argument("--chunk-size", type=int,
+                        help="Tamanho do chunk em bytes")
+    parser.add_argument("--engine", choices=["threads", "asyncio"], default="threads",
+                        help="Engine de rede: uma thread por conexão ou asyncio")
+    parser.add_argument("--scheduler", choices=list(SCHEDULERS.keys()),
+                        help="Estratégia de distribuição dos chunks entre os peers")
+    parser.add_argument("--streams", type=int,
+                        help="Conexões de dados pedidas a cada peer para receber chunks (0 = só a conexão de controle)")
+    parser.add_argument("--no-compression", action="store_true",
+                        help="Não comprime os chunks enviados")
+    parser.add_argument("--connect-timeout", type=float,
+                        help="Tempo máximo (s) para conectar a um peer")
+    parser.add_argument("--probe-timeout", type=float,
+                        help="Tempo máximo (s) de espera pelas respostas de \"Obter peers\"")
+    parser.add_argument("--gossip-interval", type=float,
+                        help="Intervalo (s) entre as rodadas de gossip da lista de peers (0 desliga)")
+    parser.add_argument("--gossip-fanout", type=int,
+                        help="Quantidade de peers consultados em cada rodada de gossip")
+    parser.add_argument("--dht", action="store_true",
+                        help="Busca arquivos pela DHT em vez de pedir a listagem a todos os peers")
+    parser.add_argument("--swarm", action="store_true",
+                        help="Troca chunks com outros peers que baixam o mesmo arquivo (modo enxame)")
+    parser.add_argument("--no-hedging", action="store_true",
+                        help="Não pede em duplicata a outro peer os últimos chunks em andamento")
+    parser.add_argument("--upload-rate", type=float,
+                        help="Taxa máxima de envio de chunks, em bytes por segundo (0 = sem limite)")
+    parser.add_argument("--peer-upload-rate", type=float,
+                        help="Taxa máxima de envio de chunks para cada peer, em bytes por segundo (0 = sem limite)")
+    parser.add_argument("--upload-workers", type=int,
+                        help="Threads que enviam os chunks pedidos (0 = envia na thread da conexão)")
+    parser.add_argument("--serve-workers", type=int,
+                        help="Processos extras que atendem os pedidos de chunks na mesma porta (SO_REUSEPORT)")
+    parser.add_argument("--log-level", choices=["DEBUG", "INFO", "WARNING", "ERROR"], default="INFO",
+                        help="Nível mínimo das mensagens de log (DEBUG inclui relógio e chunks)")
+    parser.add_argument("--metrics", metavar="ARQUIVO",
+                        help="Grava periodicamente as métricas no arquivo (JSON se terminar em .json, senão texto)")
+    parser.add_argument("--metrics-interval", type=float, default=5.0,
+                        help="Intervalo (s) entre as gravações do arquivo de métricas")
+    parser.add_argument("--query-stats", metavar="PEER",
+                        help="Consulta as métricas de um peer (<host>:<port>) via STATS e encerra")
+    return parser.parse_args()
+
 
 if __name__ == "__main__":
+    exporter = None
     try:
-        address, txt, shared_dir = (
-            sys.argv[1], sys.argv[2], sys.argv[3])
+        args = parse_args()
+        shared_dir = args.shared_dir
+        setup_logging(level=args.log_level)
 
         server = init_server(
-            address=address, shared_dir=shared_dir, peers=load_peers(path=txt))
+            address=args.address, shared_dir=shared_dir, peers=load_peers(path=args.peers),
+            max_downloads=args.max_downloads)
+        if args.chunk_size:
+            server.chunk_size = args.chunk_size
+        server.engine = args.engine
+        if args.scheduler:
+            server.scheduler = args.scheduler
+        if args.streams is not None:
+            server.data_streams = args.streams
+        if args.no_compression:
+            server.compression = False
+        if args.connect_timeout:
+            Peer.connect_timeout = args.connect_timeout
+        if args.probe_timeout:
+            server.probe_timeout = args.probe_timeout
+        if args.gossip_interval is not None:
+            server.gossip_interval = args.gossip_interval
+        if args.gossip_fanout:
+            server.gossip_fanout = args.gossip_fanout
+        if args.dht:
+            server.use_dht = True
+        if args.swarm:
+            server.use_swarm = True
+        if args.no_hedging:
+            server.hedging = False
+        if args.upload_rate is not None:
+            server.upload_rate = args.upload_rate
+        if args.peer_upload_rate is not None:
+            server.peer_upload_rate = args.peer_upload_rate
+        if args.upload_workers is not None:
+            server.upload_workers = args.upload_workers
+        if args.serve_workers is not None:
+            server.serving_workers = args.serve_workers
+
+        if args.metrics:
+            exporter = MetricsExporter(metrics=server.metrics, path=args.metrics, interval=args.metrics_interval)
+            exporter.start()
 
         t = Thread(target=server.listen)
         t.start()
 
-        running = True
+        running = args.download is None and not args.resume and args.query_stats is None
+        if args.query_stats:
+            host, port = args.query_stats.split(":")
+            if args.query_stats not in server.peers:
+                server.peers[args.query_stats] = Peer(host=host, port=int(port))
+            snapshot = server.query_stats(peer=server.peers[args.query_stats])
+            if snapshot is None:
+                print(f"=> Peer {args.query_stats} não respondeu")
+            else:
+                handle_show_metrics(snapshot=snapshot)
+            server.shutdown()
+        elif not running:
+            server.find_peers()
+            if args.resume:
+                server.downloads.wait([download_id for download_id, _ in server.downloads.resume()])
+            if args.download:
+                server.download_files(names=args.download)
+            handle_show_stats(server=server)
+            server.shutdown()
+        elif len(server.downloads.resumable()) > 0:
+            print("=> Existem downloads interrompidos (opção 8 para retomar)")
+
         while running:
             opt = menu()
             if opt == 1:
@@ -36,6 +155,10 @@ if __name__ == "__main__":
                 new_chunk_size = int(input("> "))
                 server.chunk_size = new_chunk_size
                 print(f"Tamanho de chunk alterado: {new_chunk_size}")
+            elif opt == 7:
+                handle_list_downloads(server=server)
+            elif opt == 8:
+                handle_resume_downloads(server=server)
             elif opt == 9:
                 running = False
                 server.shutdown()
@@ -46,3 +169,7 @@ if __name__ == "__main__":
         print("=> Programa finalizado")
     except Exception as err:
         print(f"Ocorreu um erro inesperado: {err}")
+    finally:
+        if exporter is not None:
+            exporter.stop()
+        flush_logging()
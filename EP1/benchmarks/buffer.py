@@ -0,0 +1,90 @@
+"""
+Microbenchmark do Buffer de recepção.
+
+Envia uma única mensagem textual de tamanho crescente por um socketpair e
+mede o tempo de leitura com read_until, usando recv de --recv-size bytes
+(padrão: 256, o chunk_size padrão), na implementação original (bytes
+concatenados e busca do separador no buffer inteiro a cada recv) e na
+atual. Na implementação atual o tempo por byte deve se manter constante.
+
+Uso (a partir da pasta EP1):
+    python3 -m benchmarks.buffer [--sizes 16384 65536 ...] [--naive-max-size 1048576] [--recv-size 256]
+"""
+import argparse
+from socket import socketpair
+from threading import Thread
+from time import time
+
+from src.models.buffer import Buffer, EOF
+from src.utils import draw_row
+
+SIZES = [16 * 1024, 64 * 1024, 256 * 1024, 1024 * 1024, 4 * 1024 * 1024]
+# A implementação original é quadrática; acima disso demora demais
+NAIVE_MAX_SIZE = 1024 * 1024
+RECV_SIZE = 256
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Microbenchmark do Buffer de recepção")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="Tamanhos das mensagens em bytes")
+    parser.add_argument("--naive-max-size", type=int, default=NAIVE_MAX_SIZE,
+                        help="Maior mensagem lida também pela implementação original")
+    parser.add_argument("--recv-size", type=int, default=RECV_SIZE, help="Bytes pedidos a cada recv")
+    return parser.parse_args()
+
+
+class NaiveBuffer:
+    """
+    Implementação original do Buffer, mantida apenas para comparação.
+    """
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.buffer = b''
+
+    def read_until(self, separator: bytes = EOF.encode(), buffer_size: int = 1024):
+        while separator not in self.buffer:
+            data = self.sock.recv(buffer_size)
+            if not data:
+                return None
+            self.buffer += data
+
+        line, _, self.buffer = self.buffer.partition(separator)
+        return line
+
+
+def measure(buffer_class, size: int, recv_size: int) -> float:
+    a, b = socketpair()
+    payload = b"x" * size + EOF.encode()
+    t = Thread(target=a.sendall, args=(payload,))
+
+    started_at = time()
+    t.start()
+    line = buffer_class(b).read_until(buffer_size=recv_size)
+    elapsed = time() - started_at
+
+    t.join()
+    a.close()
+    b.close()
+    assert len(line) == size
+    return elapsed
+
+
+def main():
+    args = parse_args()
+    widths = [12, 14, 14, 14, 14]
+    print(draw_row(["Tamanho", "Original[s]", "Original[ns/B]",
+          "Atual[s]", "Atual[ns/B]"], widths))
+    for size in args.sizes:
+        current = measure(Buffer, size, args.recv_size)
+        if size <= args.naive_max_size:
+            naive = measure(NaiveBuffer, size, args.recv_size)
+            naive_cols = [f"{naive:.4f}", f"{naive / size * 1e9:.1f}"]
+        else:
+            naive_cols = ["-", "-"]
+        print(draw_row([size, *naive_cols, f"{current:.4f}",
+              f"{current / size * 1e9:.1f}"], widths))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Busca de arquivos pela DHT com dezenas de peers no mesmo processo (loopback).
+
+Sobe N servidores com a DHT ligada, cada um compartilhando um arquivo com
+um nome único, e cada um conhecendo apenas o primeiro peer (e o anterior).
+Depois que todos publicam seus arquivos, alguns peers buscam arquivos de
+outros peers e são medidos os passos da busca, as mensagens trocadas e o
+tempo, comparando com as N mensagens LS da busca original.
+
+Uso (a partir da pasta EP1):
+    python3 -m benchmarks.dht [--nodes 8 16 32 64] [--searches 10]
+"""
+import os
+import sys
+import random
+import shutil
+import argparse
+import tempfile
+from threading import Thread
+from time import sleep, time
+from typing import Dict, List
+
+from src.models.dht import key_for
+from src.models.peer import Peer
+from src.models.server import Server
+from src.utils import draw_row
+
+HOST = "127.0.0.1"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark da busca de arquivos pela DHT")
+    parser.add_argument("--nodes", type=int, nargs="+", default=[8, 16, 32, 64])
+    parser.add_argument("--searches", type=int, default=10, help="Buscas por quantidade de peers")
+    parser.add_argument("--port", type=int, default=21000, help="Porta base")
+    parser.add_argument("--timeout", type=float, default=60.0,
+                        help="Tempo máximo (s) para todos os peers publicarem seus arquivos")
+    return parser.parse_args()
+
+
+def file_name(index: int) -> str:
+    return f"relatorio{index:04d}.bin"
+
+
+def dht_messages(servers: List[Server]) -> int:
+    """
+    Total de consultas FIND_NODE/FIND_VALUE enviadas por todos os peers.
+    """
+    total = 0
+    for server in servers:
+        for sample in server.metrics.snapshot()["counters"].get("messages_out", []):
+            if sample["labels"]["action"] in ("FIND_NODE", "FIND_VALUE"):
+                total += sample["value"]
+    return int(total)
+
+
+def run_nodes(nodes: int, port: int, searches: int, timeout: float) -> Dict:
+    workdir = tempfile.mkdtemp(prefix="peerare-dht-")
+    servers = []
+    for i in range(nodes):
+        shared_dir = os.path.join(workdir, f"peer{i}")
+        os.mkdir(shared_dir)
+        with open(os.path.join(shared_dir, file_name(i)), mode="wb") as file:
+            file.write(random.Random(i).randbytes(1024))
+
+        known = {f"{HOST}:{port + j}" for j in {0, i - 1} if 0 <= j < i}
+        peers = {address: Peer(host=HOST, port=int(address.split(":")[1]), status="online")
+                 for address in known}
+        server = Server(host=HOST, port=port + i, shared_dir=shared_dir, peers=peers)
+        server.use_dht = True
+        server.gossip_interval = 0
+        servers.append(server)
+        Thread(target=server.listen, daemon=True).start()
+        sleep(0.02)
+
+    try:
+        deadline = time() + timeout
+        while time() < deadline and any(s.dht.published_version is None for s in servers):
+            sleep(0.2)
+
+        hops, messages, elapsed, found = [], [], [], 0
+        for _ in range(searches):
+            client, target = random.sample(range(nodes), 2)
+            before = dht_messages(servers)
+            start = time()
+            _, records, steps = servers[client].dht.lookup(
+                target=key_for("token", file_name(target).split(".")[0]), find_value=True)
+            elapsed.append(time() - start)
+            messages.append(dht_messages(servers) - before)
+            hops.append(steps)
+            found += any(r.provider == f"{HOST}:{port + target}" for r in records)
+
+        return {"nodes": nodes, "searches": searches, "found": found,
+                "hops": sum(hops) / len(hops), "messages": sum(messages) / len(messages),
+                "time": sum(elapsed) / len(elapsed)}
+    finally:
+        for server in servers:
+            server.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    args = parse_args()
+    out = sys.stdout
+    # Os servidores imprimem as mudanças de status; apenas os resultados vão para a saída
+    sys.stdout = open(os.devnull, "w")
+
+    widths = [8, 8, 12, 12, 22, 12, 10]
+    print(draw_row(["Peers", "Buscas", "Encontrados", "Passos", "Mensagens (DHT)", "Mensagens (LS)", "Tempo[s]"],
+                   widths), file=out, flush=True)
+    port = args.port
+    for nodes in args.nodes:
+        result = run_nodes(nodes=nodes, port=port, searches=args.searches, timeout=args.timeout)
+        print(draw_row([result["nodes"], result["searches"], result["found"], f"{result['hops']:.2f}",
+                        f"{result['messages']:.1f}", nodes - 1, f"{result['time']:.4f}"], widths),
+              file=out, flush=True)
+        port += nodes
+
+
+if __name__ == "__main__":
+    main()
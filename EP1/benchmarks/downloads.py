@@ -0,0 +1,226 @@
+"""
+Reproduz os experimentos de tempo de download do readme sem o menu interativo.
+
+Para cada quantidade de peers, sobe N servidores "semeadores" em processos
+separados (loopback), cada um com uma pasta compartilhada gerada contendo os
+mesmos arquivos, e um servidor cliente neste processo. Para cada combinação
+de tamanho de chunk e tamanho de arquivo, o cliente baixa o arquivo R vezes
+e são calculados média, desvio padrão e percentis p50/p95/p99 do tempo.
+
+Os resultados são exibidos em tabela e podem ser salvos em JSON/CSV. Com
+--baseline, os tempos médios são comparados com um JSON de uma execução
+anterior, e o script termina com código 1 se alguma configuração ficou mais
+lenta que a tolerância permitida.
+
+Uso (a partir da pasta EP1):
+    python3 -m benchmarks.downloads [--chunk-sizes 256 1024] [--peers 1 2 3]
+        [--sizes 1048576] [--repeat 3] [--json saida.json] [--csv saida.csv]
+        [--baseline anterior.json --tolerance 0.2]
+"""
+import os
+import sys
+import csv
+import json
+import random
+import shutil
+import argparse
+import tempfile
+from multiprocessing import Process
+from threading import Thread
+from time import sleep
+from typing import Dict, List
+
+from src.models.download import DownloadStatus
+from src.models.peer import Peer
+from src.models.scheduler import SCHEDULERS
+from src.models.server import Server
+from src.utils import draw_row, percentile, standard_deviation
+
+HOST = "127.0.0.1"
+
+FIELDS = ["chunk_size", "peers", "file_size", "runs", "failures", "mean", "stddev",
+          "p50", "p95", "p99", "throughput_mb_s"]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark de downloads entre peers locais")
+    parser.add_argument("--chunk-sizes", type=int, nargs="+", default=[256, 1024, 4096])
+    parser.add_argument("--peers", type=int, nargs="+", default=[1, 2, 3])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1024 * 1024])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--scheduler", choices=list(SCHEDULERS.keys()))
+    parser.add_argument("--engine", choices=["threads", "asyncio"], default="threads")
+    parser.add_argument("--timeout", type=float, default=120.0,
+                        help="Tempo máximo (s) de cada download")
+    parser.add_argument("--port", type=int, default=19600, help="Porta base")
+    parser.add_argument("--json", help="Arquivo JSON de saída")
+    parser.add_argument("--csv", help="Arquivo CSV de saída")
+    parser.add_argument("--baseline", help="JSON de uma execução anterior para comparação")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Aumento relativo máximo do tempo médio em relação ao baseline")
+    return parser.parse_args()
+
+
+def file_name(size: int) -> str:
+    return f"bench_{size}.bin"
+
+
+def generate_files(directory: str, sizes: List[int]):
+    """
+    Gera arquivos pseudoaleatórios (sempre com o mesmo conteúdo, para que
+    todos os peers anunciem o mesmo hash).
+    """
+    for size in sizes:
+        rng = random.Random(size)
+        with open(os.path.join(directory, file_name(size)), mode="wb") as file:
+            file.write(rng.randbytes(size))
+
+
+def seed(port: int, shared_dir: str, engine: str):
+    sys.stdout = open(os.devnull, "w")
+    server = Server(host=HOST, port=port, shared_dir=shared_dir)
+    server.engine = engine
+    # A primeira varredura do índice roda em segundo plano; a listagem precisa de todos os arquivos
+    server.index.ready.wait()
+    server.listen()
+
+
+def summarize(chunk_size: int, peers: int, file_size: int, times: List[float], failures: int) -> Dict:
+    mean = sum(times) / len(times) if times else 0.0
+    return {"chunk_size": chunk_size, "peers": peers, "file_size": file_size, "runs": len(times),
+            "failures": failures, "mean": mean, "stddev": standard_deviation(times),
+            "p50": percentile(times, 50), "p95": percentile(times, 95), "p99": percentile(times, 99),
+            "throughput_mb_s": file_size / mean / 1e6 if mean > 0 else 0.0}
+
+
+def run_peers(args, peers: int, port: int, source_dir: str, out) -> List[Dict]:
+    """
+    Executa todas as combinações de chunk e tamanho de arquivo com `peers` semeadores.
+    """
+    workdir = tempfile.mkdtemp(prefix="peerare-bench-")
+    processes = []
+    for i in range(peers):
+        shared_dir = os.path.join(workdir, f"peer{i}")
+        shutil.copytree(source_dir, shared_dir)
+        p = Process(target=seed, args=(port + 1 + i, shared_dir, args.engine), daemon=True)
+        p.start()
+        processes.append(p)
+
+    client_dir = os.path.join(workdir, "client")
+    os.mkdir(client_dir)
+    client = Server(host=HOST, port=port, shared_dir=client_dir,
+                    peers={f"{HOST}:{port + 1 + i}": Peer(host=HOST, port=port + 1 + i) for i in range(peers)})
+    client.engine = args.engine
+    if args.scheduler:
+        client.scheduler = args.scheduler
+    Thread(target=client.listen, daemon=True).start()
+    sleep(1.0)
+    client.find_peers()
+
+    results = []
+    try:
+        for file_size in args.sizes:
+            for chunk_size in args.chunk_sizes:
+                client.chunk_size = chunk_size
+                times, failures = [], 0
+                for _ in range(args.repeat):
+                    download_ids = client.download_files(names=[file_name(file_size)], wait=False)
+                    ok = len(download_ids) == 1 and client.downloads.wait(download_ids, timeout=args.timeout)
+                    if ok:
+                        times.append(client.downloads.downloads[download_ids[0]].elapsed())
+                    else:
+                        failures += 1
+                        for download_id in download_ids:
+                            download = client.downloads.downloads[download_id]
+                            if download.status == DownloadStatus.Running:
+                                download.fail()
+
+                    for entry in os.listdir(client_dir):
+                        if entry.startswith(file_name(file_size)):
+                            os.remove(os.path.join(client_dir, entry))
+                    client.index.rescan()
+
+                result = summarize(chunk_size=chunk_size, peers=peers, file_size=file_size,
+                                   times=times, failures=failures)
+                results.append(result)
+                print(row(result), file=out, flush=True)
+    finally:
+        client.stop()
+        for p in processes:
+            p.kill()
+            p.join()
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+WIDTHS = [10, 7, 12, 5, 7, 10, 10, 10, 10, 10, 8]
+
+
+def row(result: Dict) -> str:
+    return draw_row([result["chunk_size"], result["peers"], result["file_size"], result["runs"],
+                     result["failures"], f"{result['mean']:.4f}", f"{result['stddev']:.4f}",
+                     f"{result['p50']:.4f}", f"{result['p95']:.4f}", f"{result['p99']:.4f}",
+                     f"{result['throughput_mb_s']:.2f}"], WIDTHS)
+
+
+def compare(results: List[Dict], baseline_path: str, tolerance: float, out) -> bool:
+    """
+    Compara os tempos médios com os de uma execução anterior.
+
+    Returns:
+        bool: False se alguma configuração ficou mais lenta que a tolerância.
+    """
+    with open(baseline_path, mode="r", encoding="utf-8") as file:
+        baseline = {(r["chunk_size"], r["peers"], r["file_size"]): r for r in json.load(file)["results"]}
+
+    ok = True
+    print("\nComparação com o baseline:", file=out)
+    for result in results:
+        previous = baseline.get((result["chunk_size"], result["peers"], result["file_size"]))
+        if previous is None or previous["mean"] <= 0 or result["runs"] == 0:
+            continue
+        change = result["mean"] / previous["mean"] - 1
+        regression = change > tolerance
+        ok = ok and not regression
+        print(f"chunk={result['chunk_size']} peers={result['peers']} arquivo={result['file_size']}: "
+              f"{previous['mean']:.4f}s -> {result['mean']:.4f}s ({change * 100:+.1f}%)"
+              f"{' REGRESSÃO' if regression else ''}", file=out)
+    return ok
+
+
+def main():
+    args = parse_args()
+    out = sys.stdout
+    # Os servidores imprimem cada mensagem trocada; apenas os resultados vão para a saída
+    sys.stdout = open(os.devnull, "w")
+
+    source_dir = tempfile.mkdtemp(prefix="peerare-files-")
+    generate_files(source_dir, args.sizes)
+
+    print(draw_row(["Tam. chunk", "Peers", "Tam. arquivo", "N", "Falhas", "Média[s]", "Desvio",
+                    "p50", "p95", "p99", "MB/s"], WIDTHS), file=out, flush=True)
+    results = []
+    try:
+        for i, peers in enumerate(args.peers):
+            results += run_peers(args=args, peers=peers, port=args.port + i * 20,
+                                 source_dir=source_dir, out=out)
+    finally:
+        shutil.rmtree(source_dir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, mode="w", encoding="utf-8") as file:
+            json.dump({"config": {"repeat": args.repeat, "engine": args.engine,
+                                  "scheduler": args.scheduler or Server.scheduler},
+                       "results": results}, file, indent=2)
+    if args.csv:
+        with open(args.csv, mode="w", encoding="utf-8", newline="") as file:
+            writer = csv.DictWriter(file, fieldnames=FIELDS)
+            writer.writeheader()
+            writer.writerows(results)
+
+    if args.baseline and not compare(results, args.baseline, args.tolerance, out):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Compara a engine de threads com a engine asyncio do servidor.
+
+Abre C conexões simultâneas com um servidor local (em outro processo),
+mede threads e memória do servidor com as conexões abertas e então envia
+M mensagens "LS" por conexão, medindo a vazão de mensagens respondidas.
+
+Uso (a partir da pasta EP1):
+    python3 -m benchmarks.engine [--connections 200] [--messages 50]
+"""
+import os
+import sys
+import argparse
+import tempfile
+from multiprocessing import Process
+from socket import socket, AF_INET, SOCK_STREAM, SOL_SOCKET, SO_REUSEADDR, create_connection
+from threading import Thread, Lock
+from time import sleep, time
+
+from src.models.buffer import EOF
+from src.models.server import Server
+from src.utils import draw_row
+
+HOST = "127.0.0.1"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark das engines de rede do servidor")
+    parser.add_argument("--connections", type=int, default=200, help="Conexões simultâneas")
+    parser.add_argument("--messages", type=int, default=50, help="Mensagens LS por conexão")
+    parser.add_argument("--port", type=int, default=19500, help="Porta base")
+    return parser.parse_args()
+
+
+def serve(engine: str, port: int, shared_dir: str):
+    sys.stdout = open(os.devnull, "w")
+    server = Server(host=HOST, port=port, shared_dir=shared_dir)
+    server.engine = engine
+    server.listen()
+
+
+def process_status(pid: int):
+    """
+    Lê a quantidade de threads e a memória residente (kB) de um processo.
+    """
+    status = {}
+    with open(f"/proc/{pid}/status", encoding="utf-8") as file:
+        for line in file:
+            key, _, value = line.partition(":")
+            status[key] = value.strip()
+    return int(status["Threads"]), int(status["VmRSS"].split()[0])
+
+
+class Sink:
+    """
+    Recebe as respostas LS_LIST do servidor e conta quantas chegaram.
+    """
+
+    def __init__(self, port: int):
+        self.count = 0
+        self._lock = Lock()
+        self._app = socket(AF_INET, SOCK_STREAM)
+        self._app.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)
+        self._app.bind((HOST, port))
+        self._app.listen()
+        Thread(target=self.__accept, daemon=True).start()
+
+    def __accept(self):
+        while True:
+            conn, _ = self._app.accept()
+            Thread(target=self.__read, args=(conn,), daemon=True).start()
+
+    def __read(self, conn):
+        separator = EOF.encode()
+        rest = b''
+        while True:
+            data = conn.recv(65536)
+            if not data:
+                return
+            data = rest + data
+            n = data.count(separator)
+            rest = data[data.rfind(separator) + len(separator):] if n else data
+            with self._lock:
+                self.count += n
+
+
+def run(engine: str, port: int, connections: int, messages: int, shared_dir: str):
+    p = Process(target=serve, args=(engine, port, shared_dir), daemon=True)
+    p.start()
+    sleep(0.5)
+
+    sink = Sink(port=port + 1)
+    conns = [create_connection((HOST, port)) for _ in range(connections)]
+    sleep(0.5)
+    threads, rss = process_status(p.pid)
+
+    payload = "".join(
+        f"{HOST}:{port + 1} {i} LS{EOF}" for i in range(messages)).encode()
+    started_at = time()
+    for conn in conns:
+        conn.sendall(payload)
+
+    total = connections * messages
+    while sink.count < total and time() - started_at < 120:
+        sleep(0.01)
+    elapsed = time() - started_at
+
+    for conn in conns:
+        conn.close()
+    p.kill()
+    p.join()
+    return threads, rss, sink.count / elapsed
+
+
+def main():
+    args = parse_args()
+
+    shared_dir = tempfile.mkdtemp()
+    for i in range(10):
+        with open(os.path.join(shared_dir, f"arquivo{i}.txt"), mode="w", encoding="utf-8") as file:
+            file.write("x" * i)
+
+    widths = [10, 10, 10, 12, 12]
+    print(draw_row(["Engine", "Conexões", "Threads", "RSS[kB]", "Msg/s"], widths))
+    for i, engine in enumerate(["threads", "asyncio"]):
+        threads, rss, rate = run(engine=engine, port=args.port + i * 10, connections=args.connections,
+                                 messages=args.messages, shared_dir=shared_dir)
+        print(draw_row([engine, args.connections, threads,
+              rss, f"{rate:.0f}"], widths))
+
+
+if __name__ == "__main__":
+    main()
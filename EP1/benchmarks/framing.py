@@ -0,0 +1,97 @@
+"""
+Compara o protocolo textual (base64 + EOF) com os frames binários
+na transferência de chunks, usando os tamanhos de chunk da tabela do readme.
+
+Uso (a partir da pasta EP1):
+    python3 -m benchmarks.framing [--size 1048576] [--chunk-sizes 128 256 512 1024 2048 5096]
+"""
+import os
+import argparse
+from base64 import b64encode, b64decode
+from socket import socketpair
+from threading import Thread
+from time import time
+
+from src.models.buffer import Buffer, EOF
+from src.models.frame import Frame, TYPE_BY_ACTION
+from src.models.message import Message
+from src.utils import draw_row
+
+CHUNK_SIZES = [128, 256, 512, 1024, 2048, 5096]
+ADDRESS = "127.0.0.1:9001"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark do protocolo textual contra os frames binários")
+    parser.add_argument("--size", type=int, default=1024 * 1024, help="Tamanho do arquivo em bytes")
+    parser.add_argument("--chunk-sizes", type=int, nargs="+", default=CHUNK_SIZES)
+    return parser.parse_args()
+
+
+def send_text(sock, data: bytes, chunk_size: int):
+    for index in range(0, (len(data) + chunk_size - 1) // chunk_size):
+        chunk = data[index * chunk_size:(index + 1) * chunk_size]
+        b64chunk = b64encode(chunk).decode("utf-8")
+        m = f"{ADDRESS} {index} FILE arquivo {chunk_size} {index} {b64chunk}{EOF}"
+        sock.sendall(m.encode())
+    sock.close()
+
+
+def send_binary(sock, data: bytes, chunk_size: int):
+    for index in range(0, (len(data) + chunk_size - 1) // chunk_size):
+        chunk = data[index * chunk_size:(index + 1) * chunk_size]
+        meta = f"{ADDRESS} {index} FILE arquivo {chunk_size} {index}".encode()
+        frame = Frame(type=TYPE_BY_ACTION["FILE"], clock=index,
+                      chunk_index=index, meta=meta, payload=chunk)
+        sock.sendall(frame.encode())
+    sock.close()
+
+
+def receive(sock, chunk_size: int):
+    received, wire = 0, 0
+    buffer = Buffer(sock)
+    while True:
+        data = buffer.read_message(buffer_size=chunk_size)
+        if data is None:
+            break
+
+        if isinstance(data, Frame):
+            wire += len(data.encode())
+            message = Message(data=data.meta, payload=data.payload)
+            chunk = message.payload
+        else:
+            wire += len(data) + len(EOF.encode())
+            message = Message(data=data)
+            chunk = b64decode(message.args[3])
+        received += len(chunk)
+    return received, wire
+
+
+def run(sender, data: bytes, chunk_size: int):
+    a, b = socketpair()
+    started_at = time()
+    t = Thread(target=sender, args=(a, data, chunk_size))
+    t.start()
+    received, wire = receive(b, chunk_size)
+    t.join()
+    b.close()
+    assert received == len(data)
+    return time() - started_at, wire
+
+
+def main():
+    args = parse_args()
+    data = os.urandom(args.size)
+
+    widths = [10, 12, 12, 14, 14, 8]
+    print(draw_row(["Chunk", "Texto[s]", "Binário[s]",
+               "Texto[B]", "Binário[B]", "Ganho"], widths))
+    for chunk_size in args.chunk_sizes:
+        text_time, text_wire = run(send_text, data, chunk_size)
+        binary_time, binary_wire = run(send_binary, data, chunk_size)
+        print(draw_row([chunk_size, f"{text_time:.4f}", f"{binary_time:.4f}", text_wire,
+                        binary_wire, f"{text_time / binary_time:.2f}x"], widths))
+
+
+if __name__ == "__main__":
+    main()
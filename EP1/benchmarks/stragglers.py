@@ -0,0 +1,146 @@
+"""
+Tempo de download com uma fonte lenta ou travada, com e sem o endgame.
+
+Sobe três peers semeadores com o mesmo arquivo, cada um em um processo
+próprio (loopback), e baixa o arquivo de todos ao mesmo tempo em outro
+processo. Cenários:
+
+- normal: as três fontes respondem normalmente
+- peer lento: uma das fontes envia no máximo --slow-rate bytes/s
+- peer travado: uma das fontes é congelada (SIGSTOP) no meio do download;
+  a conexão continua aberta, mas nenhum chunk pedido a ela chega
+
+Para cada cenário são medidos o tempo total do download, os pedidos
+vencidos (devolvidos ao escalonador por passarem do RTO) e os pedidos
+duplicados no endgame.
+
+Uso (a partir da pasta EP1):
+    python3 -m benchmarks.stragglers [--size 33554432] [--chunk-size 16384] [--slow-rate 200000] [--runs 3]
+"""
+import os
+import sys
+import signal
+import random
+import shutil
+import argparse
+import tempfile
+from multiprocessing import Pool, Process
+from statistics import median
+from threading import Thread, Timer
+from time import sleep, time
+from typing import Dict, List, Optional
+
+from src.models.index import SharedIndex
+from src.models.peer import Peer
+from src.models.server import Server
+from src.utils import draw_row
+
+HOST = "127.0.0.1"
+FILE_NAME = "video.bin"
+SEEDERS = 3
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark de fontes lentas e travadas")
+    parser.add_argument("--size", type=int, default=32 * 1024 * 1024, help="Tamanho do arquivo em bytes")
+    parser.add_argument("--chunk-size", type=int, default=16 * 1024)
+    parser.add_argument("--slow-rate", type=float, default=200e3, help="Taxa (bytes/s) do peer lento")
+    parser.add_argument("--stall-after", type=float, default=0.2,
+                        help="Tempo (s) após o início do download em que o peer é congelado")
+    parser.add_argument("--runs", type=int, default=3, help="Downloads por configuração")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Tempo máximo (s) de cada download")
+    parser.add_argument("--port", type=int, default=24000, help="Porta base")
+    return parser.parse_args()
+
+
+def seed(port: int, shared_dir: str, peer_upload_rate: float):
+    sys.stdout = open(os.devnull, "w")
+    server = Server(host=HOST, port=port, shared_dir=shared_dir)
+    server.gossip_interval = 0
+    server.peer_upload_rate = peer_upload_rate
+    server.listen()
+
+
+def counter(server: Server, name: str) -> int:
+    return int(sum(sample["value"] for sample in server.metrics.snapshot()["counters"].get(name, [])))
+
+
+def download(port: int, seeders: List[int], shared_dir: str, size: int, chunk_size: int, hedging: bool,
+             timeout: float, stall_pid: Optional[int], stall_after: float) -> Dict:
+    # O servidor imprime as mudanças de status; apenas os resultados vão para a saída
+    sys.stdout = open(os.devnull, "w")
+    server = Server(host=HOST, port=port, shared_dir=shared_dir,
+                    peers={f"{HOST}:{p}": Peer(host=HOST, port=p, status="online") for p in seeders})
+    server.gossip_interval = 0
+    server.chunk_size = chunk_size
+    server.hedging = hedging
+    Thread(target=server.listen, daemon=True).start()
+    sleep(0.2)
+
+    start = time()
+    download_id = server.downloads.enqueue(name=FILE_NAME, size=size,
+                                           sources={f"{HOST}:{p}": FILE_NAME for p in seeders})
+    if stall_pid is not None:
+        Timer(stall_after, os.kill, args=(stall_pid, signal.SIGSTOP)).start()
+    ok = server.downloads.wait([download_id], timeout=timeout)
+    elapsed = time() - start
+    server.stop()
+    return {"ok": ok, "time": elapsed, "timed_out": counter(server, "chunks_timed_out"),
+            "hedged": counter(server, "chunks_hedged")}
+
+
+def run(args, scenario: str, hedging: bool, port: int, workdir: str) -> Dict:
+    seed_dir = os.path.join(workdir, "seeder")
+    seeders = [port + 1 + i for i in range(SEEDERS)]
+    processes = []
+    for i, p in enumerate(seeders):
+        rate = args.slow_rate if scenario == "peer lento" and i == 0 else 0
+        processes.append(Process(target=seed, args=(p, seed_dir, rate), daemon=True))
+        processes[-1].start()
+    sleep(0.5)
+
+    shared_dir = tempfile.mkdtemp(dir=workdir)
+    try:
+        stall_pid = processes[0].pid if scenario == "peer travado" else None
+        with Pool(processes=1) as pool:
+            return pool.apply(download, kwds=dict(port=port, seeders=seeders, shared_dir=shared_dir,
+                                                  size=args.size, chunk_size=args.chunk_size, hedging=hedging,
+                                                  timeout=args.timeout, stall_pid=stall_pid,
+                                                  stall_after=args.stall_after))
+    finally:
+        for p in processes:
+            p.kill()
+            p.join()
+        shutil.rmtree(shared_dir, ignore_errors=True)
+
+
+def main():
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix="peerare-stragglers-")
+    seed_dir = os.path.join(workdir, "seeder")
+    os.mkdir(seed_dir)
+    with open(os.path.join(seed_dir, FILE_NAME), mode="wb") as file:
+        file.write(random.Random(args.size).randbytes(args.size))
+    # Indexa o arquivo antes, para que os semeadores não calculem o hash ao subir
+    SharedIndex(shared_dir=seed_dir).rescan()
+
+    widths = [14, 8, 6, 12, 10, 12]
+    print(draw_row(["Cenário", "Endgame", "OK", "Tempo[s]", "Vencidos", "Duplicados"], widths), flush=True)
+    port = args.port
+    try:
+        for scenario in ("normal", "peer lento", "peer travado"):
+            for hedging in (False, True):
+                results = []
+                for _ in range(args.runs):
+                    results.append(run(args, scenario=scenario, hedging=hedging, port=port, workdir=workdir))
+                    port += SEEDERS + 1
+                print(draw_row([scenario, "sim" if hedging else "não", "sim" if all(r["ok"] for r in results) else "não",
+                                f"{median(r['time'] for r in results):.3f}",
+                                f"{median(r['timed_out'] for r in results):.0f}",
+                                f"{median(r['hedged'] for r in results):.0f}"], widths), flush=True)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Distribuição de um arquivo novo a vários peers ao mesmo tempo, com e sem
+o modo enxame, no mesmo processo (loopback).
+
+Sobe um peer semeador com o arquivo e N peers que o baixam ao mesmo tempo,
+conhecendo apenas o semeador. Para cada N são medidos o tempo até todos
+terminarem e quantas vezes o semeador enviou o arquivo inteiro: sem o modo
+enxame, ele envia o arquivo N vezes; com o modo enxame, os peers trocam os
+chunks entre si e o semeador envia pouco mais de uma cópia.
+
+Cada configuração roda em um processo próprio, para que as conexões dos
+servidores de uma rodada não interfiram nas seguintes.
+
+Uso (a partir da pasta EP1):
+    python3 -m benchmarks.swarm [--downloaders 2 4 8 16] [--size 4194304] [--chunk-size 16384]
+"""
+import os
+import sys
+import random
+import shutil
+import argparse
+import tempfile
+from multiprocessing import Pool
+from threading import Thread
+from time import sleep, time
+from typing import Dict
+
+from src.models.peer import Peer
+from src.models.server import Server
+from src.utils import draw_row
+
+HOST = "127.0.0.1"
+FILE_NAME = "video.bin"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark do modo enxame")
+    parser.add_argument("--downloaders", type=int, nargs="+", default=[2, 4, 8, 16])
+    parser.add_argument("--size", type=int, default=4 * 1024 * 1024, help="Tamanho do arquivo em bytes")
+    parser.add_argument("--chunk-size", type=int, default=16 * 1024)
+    parser.add_argument("--port", type=int, default=22000, help="Porta base")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Tempo máximo (s) da distribuição")
+    return parser.parse_args()
+
+
+def bytes_sent(server: Server, action: str) -> int:
+    return int(sum(sample["value"] for sample in server.metrics.snapshot()["counters"].get("bytes_out", [])
+                   if sample["labels"]["action"] == action))
+
+
+def run(downloaders: int, swarm: bool, size: int, chunk_size: int, port: int, timeout: float) -> Dict:
+    # Os servidores imprimem as mudanças de status; apenas os resultados vão para a saída
+    sys.stdout = open(os.devnull, "w")
+    workdir = tempfile.mkdtemp(prefix="peerare-swarm-")
+    servers = []
+    try:
+        for i in range(downloaders + 1):
+            shared_dir = os.path.join(workdir, f"peer{i}")
+            os.mkdir(shared_dir)
+            if i == 0:
+                with open(os.path.join(shared_dir, FILE_NAME), mode="wb") as file:
+                    file.write(random.Random(size).randbytes(size))
+
+            peers = {} if i == 0 else {f"{HOST}:{port}": Peer(host=HOST, port=port, status="online")}
+            server = Server(host=HOST, port=port + i, shared_dir=shared_dir, peers=peers,
+                            max_downloads=1)
+            server.chunk_size = chunk_size
+            server.gossip_interval = 0
+            server.use_swarm = swarm
+            servers.append(server)
+            Thread(target=server.listen, daemon=True).start()
+        sleep(0.2)
+
+        seeder = servers[0]
+        entry = seeder.index.get(FILE_NAME)
+        start = time()
+        ids = [server.downloads.enqueue(name=FILE_NAME, size=entry.size, hash=entry.hash, root=entry.root,
+                                        sources={f"{HOST}:{port}": FILE_NAME})
+               for server in servers[1:]]
+        ok = all(server.downloads.wait([download_id], timeout=timeout)
+                 for server, download_id in zip(servers[1:], ids))
+        elapsed = time() - start
+
+        return {"downloaders": downloaders, "swarm": swarm, "ok": ok, "time": elapsed,
+                "copies": bytes_sent(seeder, "FILE") / size,
+                "partial": sum(bytes_sent(s, "FILE") for s in servers[1:]) / size}
+    finally:
+        for server in servers:
+            server.stop()
+        # Espera quem ainda registra o download concluído no índice
+        sleep(0.5)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    args = parse_args()
+    widths = [8, 8, 6, 10, 22, 22]
+    print(draw_row(["Peers", "Enxame", "OK", "Tempo[s]", "Cópias (semeador)", "Cópias (entre peers)"],
+                   widths), flush=True)
+    port = args.port
+    for downloaders in args.downloaders:
+        for swarm in (False, True):
+            with Pool(processes=1) as pool:
+                result = pool.apply(run, kwds=dict(downloaders=downloaders, swarm=swarm, size=args.size,
+                                                   chunk_size=args.chunk_size, port=port, timeout=args.timeout))
+            print(draw_row([downloaders, "sim" if swarm else "não", "sim" if result["ok"] else "não",
+                            f"{result['time']:.3f}", f"{result['copies']:.2f}", f"{result['partial']:.2f}"],
+                           widths), flush=True)
+            port += downloaders + 1
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+"""
+Latência das mensagens de controle com o semeador sob carga de upload.
+
+Sobe um peer semeador e dois peers que baixam dele o mesmo arquivo sem
+parar, cada um em um processo próprio (loopback): um "agressivo", com
+chunks minúsculos, e um normal, com chunks de 16 KB. Enquanto isso, o
+semeador é sondado com GET_PEERS pelos próprios downloaders (cujas
+mensagens de controle disputam a conexão com os pedidos de chunks) e por
+um terceiro peer ocioso (neste processo). Para cada cenário são exibidos
+os percentis da latência das sondagens e a taxa recebida por cada
+downloader:
+
+- sem carga
+- com carga, enviando os chunks na thread da conexão (upload_workers = 0)
+- com carga e o escalonador de upload (filas justas por peer)
+- com carga, o escalonador e limite de taxa por peer
+
+No final, o p99 das sondagens do peer ocioso nos cenários com o
+escalonador é comparado com o do cenário sem carga: o script termina com
+código 1 se ele passou de --max-p99-ratio vezes o p99 sem carga mais
+--p99-slack milissegundos, isto é, se a carga de upload atrasou as
+mensagens de controle.
+
+Uso (a partir da pasta EP1):
+    python3 -m benchmarks.uploads [--duration 5] [--aggressive-chunk 64] [--peer-rate 4000000]
+        [--max-p99-ratio 3] [--p99-slack 10]
+"""
+import os
+import sys
+import random
+import shutil
+import argparse
+import tempfile
+from multiprocessing import Process, Event, Queue, Value
+from threading import Thread
+from time import sleep, time
+from typing import Dict, List
+
+from src.models.download import DownloadStatus
+from src.models.peer import Peer
+from src.models.server import Server
+from src.utils import draw_row, percentile
+
+HOST = "127.0.0.1"
+FILE_NAME = "carga.bin"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark do escalonador de upload")
+    parser.add_argument("--duration", type=float, default=5.0, help="Duração (s) de cada cenário")
+    parser.add_argument("--size", type=int, default=1024 * 1024, help="Tamanho do arquivo em bytes")
+    parser.add_argument("--aggressive-chunk", type=int, default=64, help="Chunk do downloader agressivo")
+    parser.add_argument("--normal-chunk", type=int, default=16 * 1024, help="Chunk do downloader normal")
+    parser.add_argument("--peer-rate", type=float, default=4e6,
+                        help="Limite por peer (bytes/s) do último cenário")
+    parser.add_argument("--probe-interval", type=float, default=0.02, help="Intervalo (s) entre as sondagens")
+    parser.add_argument("--port", type=int, default=23000, help="Porta base")
+    parser.add_argument("--max-p99-ratio", type=float, default=3.0,
+                        help="p99 máximo do peer ocioso com carga, em relação ao p99 sem carga")
+    parser.add_argument("--p99-slack", type=float, default=10.0,
+                        help="Folga (ms) somada ao limite do p99, para medições sem carga muito curtas")
+    return parser.parse_args()
+
+
+def seed(port: int, shared_dir: str, upload_workers: int, peer_rate: float):
+    sys.stdout = open(os.devnull, "w")
+    server = Server(host=HOST, port=port, shared_dir=shared_dir)
+    server.gossip_interval = 0
+    server.upload_workers = upload_workers
+    server.peer_upload_rate = peer_rate
+    server.listen()
+
+
+def probe(server: Server, seeder: Peer, interval: float, latencies, measuring, stopped):
+    """
+    Sonda o semeador com GET_PEERS enquanto `measuring` estiver ativo, enviando cada latência para a fila.
+    """
+    while not stopped.is_set():
+        if measuring.is_set():
+            seeder.probe_latency = None
+            server.find_peers()
+            if seeder.probe_latency is not None:
+                latencies.put(seeder.probe_latency)
+        sleep(interval)
+
+
+def leech(port: int, seeder_port: int, shared_dir: str, chunk_size: int, size: int, received, stopped,
+          probe_interval: float = 0, latencies=None, measuring=None):
+    """
+    Baixa o arquivo do semeador repetidamente, registrando o total de bytes
+    recebidos e, se `latencies` for dada, sondando o semeador ao mesmo tempo.
+    """
+    sys.stdout = open(os.devnull, "w")
+    seeder = Peer(host=HOST, port=seeder_port, status="online")
+    server = Server(host=HOST, port=port, shared_dir=shared_dir, peers={f"{HOST}:{seeder_port}": seeder})
+    server.gossip_interval = 0
+    server.chunk_size = chunk_size
+    Thread(target=server.listen, daemon=True).start()
+    if latencies is not None:
+        Thread(target=probe, args=(server, seeder, probe_interval, latencies, measuring, stopped),
+               daemon=True).start()
+
+    completed = 0
+    while not stopped.is_set():
+        download_id = server.downloads.enqueue(name=FILE_NAME, size=size,
+                                               sources={f"{HOST}:{seeder_port}": FILE_NAME})
+        download = server.downloads.downloads[download_id]
+        while not download.done.wait(timeout=0.1) and not stopped.is_set():
+            received.value = completed + download.received_bytes
+        if download.status == DownloadStatus.Done:
+            completed += size
+            received.value = completed
+        for entry in os.listdir(shared_dir):
+            if entry.startswith(FILE_NAME):
+                os.remove(os.path.join(shared_dir, entry))
+    server.stop()
+
+
+def summary(latencies: List[float]) -> List[str]:
+    if len(latencies) == 0:
+        return ["-", "-", "-"]
+    return [f"{percentile(latencies, 50) * 1000:.2f}", f"{percentile(latencies, 99) * 1000:.2f}",
+            f"{max(latencies) * 1000:.2f}"]
+
+
+def scenario(args, port: int, workdir: str, load: bool, upload_workers: int, peer_rate: float) -> Dict:
+    seed_dir = os.path.join(workdir, "seeder")
+    processes = [Process(target=seed, args=(port, seed_dir, upload_workers, peer_rate), daemon=True)]
+    stopped, measuring = Event(), Event()
+    latencies = {"aggressive": Queue(), "normal": Queue(), "other": Queue()}
+    counters = {"aggressive": Value("d", 0.0), "normal": Value("d", 0.0)}
+    if load:
+        for i, (kind, chunk_size) in enumerate((("aggressive", args.aggressive_chunk),
+                                                ("normal", args.normal_chunk))):
+            shared_dir = tempfile.mkdtemp(dir=workdir)
+            probing = dict(probe_interval=args.probe_interval, latencies=latencies[kind], measuring=measuring)
+            processes.append(Process(target=leech, daemon=True, kwargs=probing,
+                                     args=(port + 1 + i, port, shared_dir, chunk_size, args.size,
+                                           counters[kind], stopped)))
+
+    processes[0].start()
+    sleep(0.5)
+    for p in processes[1:]:
+        p.start()
+
+    prober_dir = tempfile.mkdtemp(dir=workdir)
+    seeder = Peer(host=HOST, port=port, status="online")
+    prober = Server(host=HOST, port=port + 3, shared_dir=prober_dir, peers={f"{HOST}:{port}": seeder})
+    prober.gossip_interval = 0
+    Thread(target=prober.listen, daemon=True).start()
+
+    try:
+        # Espera a carga se estabilizar antes de medir
+        sleep(1.0)
+        start = {kind: counter.value for kind, counter in counters.items()}
+        began = time()
+        measuring.set()
+        Thread(target=probe, args=(prober, seeder, args.probe_interval, latencies["other"], measuring, stopped),
+               daemon=True).start()
+        sleep(args.duration)
+        measuring.clear()
+        elapsed = time() - began
+        rates = {kind: (counter.value - start[kind]) / elapsed for kind, counter in counters.items()}
+        # Espera as sondagens em andamento
+        sleep(prober.probe_timeout)
+        samples = {kind: [] for kind in latencies}
+        for kind, queue in latencies.items():
+            while not queue.empty():
+                samples[kind].append(queue.get())
+    finally:
+        stopped.set()
+        prober.stop()
+        # Os downloaders saem antes do semeador, para não acusarem a queda dele
+        for p in reversed(processes):
+            p.kill()
+            p.join()
+
+    return {"latencies": samples, "rates": rates}
+
+
+def check(results: Dict[str, Dict], idle: str, loaded: List[str], ratio: float, slack: float, out) -> bool:
+    """
+    Compara o p99 das sondagens do peer ocioso nos cenários com carga com o do cenário sem carga.
+
+    Returns:
+        bool: False se algum cenário passou do limite ou ficou sem sondagens.
+    """
+    idle_latencies = results[idle]["latencies"]["other"]
+    if len(idle_latencies) == 0:
+        print("\nSem sondagens no cenário sem carga", file=out)
+        return False
+    limit = percentile(idle_latencies, 99) * ratio + slack / 1000
+
+    ok = True
+    print(f"\nLimite do p99 do peer ocioso: {limit * 1000:.2f} ms", file=out)
+    for name in loaded:
+        latencies = results[name]["latencies"]["other"]
+        p99 = percentile(latencies, 99) if len(latencies) > 0 else None
+        passed = p99 is not None and p99 <= limit
+        ok = ok and passed
+        print(f"{name}: {'-' if p99 is None else f'{p99 * 1000:.2f} ms'}{'' if passed else ' ACIMA DO LIMITE'}",
+              file=out)
+    return ok
+
+
+def main():
+    args = parse_args()
+    out = sys.stdout
+    # Os servidores imprimem as sondagens; apenas os resultados vão para a saída
+    sys.stdout = open(os.devnull, "w")
+
+    workdir = tempfile.mkdtemp(prefix="peerare-uploads-")
+    seed_dir = os.path.join(workdir, "seeder")
+    os.mkdir(seed_dir)
+    with open(os.path.join(seed_dir, FILE_NAME), mode="wb") as file:
+        file.write(random.Random(args.size).randbytes(args.size))
+
+    scenarios = [
+        ("sem carga", False, Server.upload_workers, 0),
+        ("carga, na conexão", True, 0, 0),
+        ("carga, escalonador", True, Server.upload_workers, 0),
+        ("carga, limite por peer", True, Server.upload_workers, args.peer_rate),
+    ]
+
+    widths = [24, 24, 24, 24, 12, 12]
+    print(draw_row(["Cenário", "Agressivo [ms]", "Normal [ms]", "Outro peer [ms]",
+                    "Agr. [MB/s]", "Norm. [MB/s]"], widths), file=out, flush=True)
+    port = args.port
+    results = {}
+    try:
+        for name, load, upload_workers, peer_rate in scenarios:
+            result = scenario(args, port=port, workdir=workdir, load=load,
+                              upload_workers=upload_workers, peer_rate=peer_rate)
+            results[name] = result
+            print(draw_row([name] + [" / ".join(summary(result["latencies"][kind]))
+                                     for kind in ("aggressive", "normal", "other")]
+                           + [f"{result['rates'][kind] / 1e6:.2f}" for kind in ("aggressive", "normal")], widths),
+                  file=out, flush=True)
+            port += 10
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    # Apenas os cenários com o escalonador: enviar na thread da conexão é o caso sem a proteção
+    if not check(results, idle="sem carga", loaded=["carga, escalonador", "carga, limite por peer"],
+                 ratio=args.max_p99_ratio, slack=args.p99_slack, out=out):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
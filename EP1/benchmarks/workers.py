@@ -0,0 +1,150 @@
+"""
+Taxa de upload de um semeador com vários processos atendendo a mesma porta.
+
+Sobe um peer semeador com --workers processos extras (SO_REUSEPORT) e
+vários peers que baixam dele o mesmo arquivo sem parar, cada um em um
+processo próprio (loopback). Para cada quantidade de workers é medida a
+taxa total recebida pelos peers durante --duration segundos.
+
+Os chunks são enviados comprimidos (zlib) a todos os peers, para que o
+envio custe CPU no semeador. O ganho com os workers depende da quantidade
+de núcleos disponíveis, exibida no início.
+
+Uso (a partir da pasta EP1):
+    python3 -m benchmarks.workers [--workers 0 1 2 4] [--clients 8] [--duration 5] [--chunk-size 16384]
+"""
+import os
+import sys
+import random
+import shutil
+import argparse
+import tempfile
+from multiprocessing import Process, Event, Value
+from threading import Thread
+from time import sleep, time
+from typing import List
+
+from src.models.download import DownloadStatus
+from src.models.index import SharedIndex
+from src.models.peer import Peer
+from src.models.server import Server
+from src.utils import draw_row
+
+HOST = "127.0.0.1"
+FILE_NAME = "carga.bin"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark dos workers de envio")
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, 1, 2, 4])
+    parser.add_argument("--clients", type=int, default=8, help="Peers baixando ao mesmo tempo")
+    parser.add_argument("--duration", type=float, default=5.0, help="Duração (s) de cada medição")
+    parser.add_argument("--size", type=int, default=4 * 1024 * 1024, help="Tamanho do arquivo em bytes")
+    parser.add_argument("--chunk-size", type=int, default=16 * 1024)
+    parser.add_argument("--port", type=int, default=26000, help="Porta base")
+    return parser.parse_args()
+
+
+def compressible(size: int) -> bytes:
+    """
+    Conteúdo que comprime cerca de 2x: metade de cada bloco aleatória, metade repetida.
+    """
+    rng = random.Random(size)
+    block = 4096
+    data = bytearray()
+    while len(data) < size:
+        data += rng.randbytes(block // 2) + b"a" * (block // 2)
+    return bytes(data[:size])
+
+
+def seed(port: int, shared_dir: str, workers: int):
+    sys.stdout = open(os.devnull, "w")
+    server = Server(host=HOST, port=port, shared_dir=shared_dir)
+    server.gossip_interval = 0
+    server.use_sendfile = False
+    server.serving_workers = workers
+    server.listen()
+
+
+def leech(port: int, seeder_port: int, shared_dir: str, chunk_size: int, size: int, received, stopped):
+    """
+    Baixa o arquivo do semeador repetidamente, registrando o total de bytes recebidos.
+    """
+    sys.stdout = open(os.devnull, "w")
+    server = Server(host=HOST, port=port, shared_dir=shared_dir,
+                    peers={f"{HOST}:{seeder_port}": Peer(host=HOST, port=seeder_port, status="online")})
+    server.gossip_interval = 0
+    server.chunk_size = chunk_size
+    Thread(target=server.listen, daemon=True).start()
+
+    completed = 0
+    while not stopped.is_set():
+        download_id = server.downloads.enqueue(name=FILE_NAME, size=size,
+                                               sources={f"{HOST}:{seeder_port}": FILE_NAME})
+        download = server.downloads.downloads[download_id]
+        while not download.done.wait(timeout=0.1) and not stopped.is_set():
+            received.value = completed + download.received_bytes
+        if download.status == DownloadStatus.Done:
+            completed += size
+            received.value = completed
+        for entry in os.listdir(shared_dir):
+            if entry.startswith(FILE_NAME):
+                os.remove(os.path.join(shared_dir, entry))
+    server.stop()
+
+
+def measure(args, workers: int, port: int, workdir: str) -> float:
+    # O semeador não é daemon: processos daemon não podem criar os workers
+    seeder = Process(target=seed, args=(port, os.path.join(workdir, "seeder"), workers))
+    seeder.start()
+    sleep(1.0 + 0.5 * workers)
+
+    stopped = Event()
+    counters: List = []
+    clients: List[Process] = []
+    for i in range(args.clients):
+        counters.append(Value("d", 0.0))
+        clients.append(Process(target=leech, daemon=True,
+                               args=(port + 1 + i, port, tempfile.mkdtemp(dir=workdir), args.chunk_size,
+                                     args.size, counters[-1], stopped)))
+        clients[-1].start()
+
+    try:
+        # Espera os downloads começarem antes de medir
+        sleep(1.0)
+        start, began = sum(c.value for c in counters), time()
+        sleep(args.duration)
+        return (sum(c.value for c in counters) - start) / (time() - began)
+    finally:
+        stopped.set()
+        for p in clients + [seeder]:
+            p.kill()
+            p.join()
+
+
+def main():
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix="peerare-workers-")
+    seed_dir = os.path.join(workdir, "seeder")
+    os.mkdir(seed_dir)
+    with open(os.path.join(seed_dir, FILE_NAME), mode="wb") as file:
+        file.write(compressible(args.size))
+    SharedIndex(shared_dir=seed_dir).rescan()
+
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+    print(f"Núcleos disponíveis: {cores}", flush=True)
+    widths = [10, 12, 14, 16]
+    print(draw_row(["Workers", "Processos", "Taxa[MB/s]", "Por cliente[MB/s]"], widths), flush=True)
+    port = args.port
+    try:
+        for workers in args.workers:
+            rate = measure(args, workers=workers, port=port, workdir=workdir)
+            print(draw_row([workers, workers + 1, f"{rate / 1e6:.2f}", f"{rate / args.clients / 1e6:.2f}"],
+                           widths), flush=True)
+            port += args.clients + 1
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
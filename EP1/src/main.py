@@ -37,20 +37,21 @@ def load_peers(path: str) -> Dict[str, Peer]:
         return peers
 
 
-def init_server(address: str, shared_dir: str, peers: Dict[str, Peer]) -> Server:
+def init_server(address: str, shared_dir: str, peers: Dict[str, Peer], max_downloads: int = 4) -> Server:
     """
     Inicializa a instância do servidor com o endereço e os peers conhecidos.
 
     Args:
         address (str): Endereço no formato "<host>:<port>".
         peers (Dict[str, Peer]): Dicionário de peers já conhecidos.
+        max_downloads (int): Quantidade máxima de downloads simultâneos.
 
     Returns:
         Server: Instância do servidor pronta para escutar conexões.
     """
     host, port = address.split(":")
     server = Server(host=host, port=int(port),
-                    shared_dir=shared_dir, peers=peers)
+                    shared_dir=shared_dir, peers=peers, max_downloads=max_downloads)
     return server
 
 
@@ -68,6 +69,8 @@ def menu() -> int:
     print("\t4. Buscar arquivos")
     print("\t5. Exibir estatísticas")
     print("\t6. Alterar tamanho de chunk")
+    print("\t7. Listar downloads")
+    print("\t8. Retomar downloads")
     print("\t[9]. Sair")
     opt = int(input("> "))
     return opt
@@ -102,10 +105,114 @@ def handle_list_peers(server: Server):
 
 
 def handle_show_stats(server: Server):
-    widths = [15, 10, 15, 5, 50, 10]
-    print(draw_row(["Tam. chunk", "N peers", "Tam. arquivo",
+    widths = [15, 10, 15, 10, 5, 50, 10]
+    print(draw_row(["Tam. chunk", "N peers", "Tam. arquivo", "Conexões",
           "N", "Tempo[s]", "Desvio"], widths))
 
-    for [(chunk_size, peers, file_size), ellapsed_times] in server.state["stats"].items():
-        print(draw_row([chunk_size, peers, file_size, len(ellapsed_times), ", ".join(
+    for [(chunk_size, peers, file_size, streams), ellapsed_times] in server.state["stats"].items():
+        print(draw_row([chunk_size, peers, file_size, streams, len(ellapsed_times), ", ".join(
             map(str, ellapsed_times)), standard_deviation(ellapsed_times)], widths))
+
+    transfer = server.state["transfer"]
+    for direction, label in (("sent", "enviados"), ("received", "recebidos")):
+        raw, wire = transfer[f"{direction}_raw"], transfer[direction]
+        saved = (1 - wire / raw) * 100 if raw > 0 else 0.0
+        print(f"\nBytes de chunks {label}: {raw} originais, {wire} transmitidos ({saved:.1f}% economizados)")
+
+    pool = server.file_pool.stats()
+    print(f"\nArquivos servidos: {pool['open']} abertos, {pool['hits']} acertos, {pool['misses']} faltas "
+          f"(taxa de acerto {pool['hit_rate'] * 100:.1f}%), {pool['evictions']} fechados")
+
+    print()
+    handle_show_metrics(snapshot=server.metrics.snapshot())
+
+
+def handle_show_metrics(snapshot: Dict):
+    """
+    Exibe um resumo das métricas de um peer (locais ou recebidas via STATS):
+    mensagens e bytes por ação, conexões, bytes em buffer e latências por peer.
+
+    Args:
+        snapshot (Dict): Métricas no formato de Metrics.snapshot().
+    """
+    def values(kind: str, name: str) -> Dict[str, float]:
+        return {sample["labels"].get("action", ""): sample["value"] for sample in snapshot[kind].get(name, [])}
+
+    counters = {name: values("counters", name) for name in ("messages_in", "bytes_in", "messages_out", "bytes_out")}
+    actions = sorted(set().union(*(c.keys() for c in counters.values())))
+
+    widths = [12, 12, 15, 12, 15]
+    print(draw_row(["Ação", "Msgs receb.", "Bytes receb.", "Msgs env.", "Bytes env."], widths))
+    for action in actions:
+        print(draw_row([action] + [int(counters[name].get(action, 0)) for name in counters], widths))
+
+    gauges = {name: values("gauges", name).get("", 0) for name in ("connections_active", "buffered_bytes")}
+    print(f"\nConexões ativas: {int(gauges['connections_active'])}, bytes em buffer: {int(gauges['buffered_bytes'])}")
+
+    widths = [25, 25, 8, 12, 12]
+    print("\n" + draw_row(["Métrica", "Peer", "N", "Média[ms]", "p95[ms]"], widths))
+    for name in ("rtt_seconds", "chunk_latency_seconds"):
+        for sample in snapshot["histograms"].get(name, []):
+            mean = sample["sum"] / sample["count"] * 1000 if sample["count"] > 0 else 0.0
+            print(draw_row([name, sample["labels"].get("peer", ""), sample["count"], f"{mean:.2f}",
+                            bucket_percentile(buckets=sample["buckets"], p=95)], widths))
+
+
+def bucket_percentile(buckets: Dict[str, int], p: float) -> str:
+    """
+    Estima um percentil (em ms) a partir dos baldes cumulativos de um histograma,
+    retornando o limite superior do balde onde ele cai.
+    """
+    total = buckets.get("+Inf", 0)
+    if total == 0:
+        return "-"
+    previous = None
+    for bound, count in buckets.items():
+        if count >= total * p / 100:
+            return f"> {float(previous) * 1000:g}" if bound == "+Inf" else f"<= {float(bound) * 1000:g}"
+        previous = bound
+    return "-"
+
+
+def handle_list_downloads(server: Server):
+    """
+    Exibe os downloads gerenciados pelo servidor com seu progresso.
+
+    Args:
+        server (Server): Instância do servidor atual.
+    """
+    widths = [10, 30, 10, 15, 8, 10, 12]
+    print(draw_row(["Id", "Arquivo", "Status", "Chunks",
+          "Peers", "Conexões", "Tempo[s]"], widths))
+
+    for download in list(server.downloads.downloads.values()):
+        print(draw_row([download.id, download.name, download.status,
+                        f"{download.downloaded}/{download.qtd_chunks}", download.peers, download.streams,
+                        f"{download.elapsed():.4f}"], widths))
+
+
+def handle_resume_downloads(server: Server):
+    """
+    Exibe os downloads interrompidos e retoma os escolhidos pelo usuário,
+    pedindo apenas os chunks que faltam.
+
+    Args:
+        server (Server): Instância do servidor atual.
+    """
+    journals = server.downloads.resumable()
+    if len(journals) == 0:
+        print("Nenhum download interrompido")
+        return
+
+    widths = [5, 30, 15, 15]
+    print(draw_row(["", "Arquivo", "Tamanho", "Chunks"], widths))
+    for index, journal in enumerate(journals):
+        print(draw_row([f"[{index + 1}]", journal.name, journal.size,
+                        f"{journal.bitmap.count}/{journal.bitmap.size}"], widths))
+
+    print("\nDigite o número do download para retomar (ou vários, separados por espaço)")
+    opts = [int(x) for x in input("> ").split()]
+
+    names = [journals[opt - 1].name for opt in opts if opt > 0 and opt <= len(journals)]
+    for download_id, name in server.downloads.resume(names=names):
+        print(f"Download {download_id} do arquivo {name} retomado")
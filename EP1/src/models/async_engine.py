@@ -0,0 +1,169 @@
+import asyncio
+from asyncio import StreamReader, StreamWriter, IncompleteReadError
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from typing import Deque, Optional, Union
+
+from src.models.buffer import EOF
+from src.models.frame import Frame, HEADER, MAGIC
+from src.models.logger import logger
+
+# Limite de uma mensagem textual (chunks em base64 podem ser grandes)
+STREAM_LIMIT = 64 * 1024 * 1024
+
+
+class AsyncEngine:
+    """
+    Engine de rede baseada em asyncio, alternativa à engine de uma thread
+    por conexão.
+
+    Todas as conexões são lidas por um único event loop. As mensagens são
+    processadas pelos mesmos handlers do Server (Server.handle_message),
+    executados em um pool fixo de threads, já que os handlers usam sockets
+    e arquivos bloqueantes. Enquanto um lote de mensagens de uma conexão é
+    processado, as próximas são acumuladas e entregues ao pool de uma só vez,
+    mantendo a ordem das mensagens de cada conexão.
+    """
+
+    # Quantidade de mensagens pendentes por conexão antes de parar de ler
+    MAX_PENDING = 1024
+
+    def __init__(self, server, max_workers: int = 8):
+        """
+        Args:
+            server (Server): Servidor cujos handlers processam as mensagens.
+            max_workers (int): Quantidade de threads para executar os handlers.
+        """
+        self.server = server
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stopped: Optional[asyncio.Event] = None
+
+    def run(self):
+        """
+        Executa o event loop até que stop() seja chamado.
+        O socket do servidor já deve estar em modo de escuta.
+        """
+        asyncio.run(self.__serve())
+        self._executor.shutdown(wait=False)
+
+    def stop(self):
+        if self._loop is not None and self._stopped is not None:
+            self._loop.call_soon_threadsafe(self._stopped.set)
+
+    async def __serve(self):
+        self._loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        app = await asyncio.start_server(self.__handle_connection, sock=self.server._app,
+                                         limit=STREAM_LIMIT)
+        async with app:
+            await self._stopped.wait()
+
+    async def __handle_connection(self, reader: StreamReader, writer: StreamWriter):
+        connection = _Connection()
+        draining = None
+        self.server.metrics.add("connections_active", 1)
+        try:
+            while not connection.closed:
+                data = await self.read_message(reader=reader)
+                if data is None:
+                    break
+
+                if connection.push(data=data):
+                    draining = self._loop.run_in_executor(
+                        self._executor, self.__drain, connection, writer)
+
+                if len(connection.pending) >= self.MAX_PENDING and draining is not None:
+                    await draining
+        finally:
+            self.server.metrics.add("connections_active", -1)
+            writer.close()
+
+    def __drain(self, connection: '_Connection', writer: StreamWriter):
+        """
+        Processa, em ordem, as mensagens pendentes de uma conexão. Se um
+        handler falhar, a conexão é encerrada, como na engine de threads.
+        """
+        try:
+            while True:
+                data = connection.pop()
+                if data is None:
+                    return
+                if not self.server.handle_message(data):
+                    break
+        except Exception as err:
+            logger.warning(f"Falha ao processar mensagem, encerrando a conexão: {err!r}")
+        connection.close()
+        self._loop.call_soon_threadsafe(writer.close)
+
+    @staticmethod
+    async def read_message(reader: StreamReader) -> Optional[Union[bytes, Frame]]:
+        """
+        Lê a próxima mensagem do stream, seja textual (terminada em EOF)
+        ou um frame binário (iniciado pelo byte MAGIC).
+        """
+        try:
+            first = await reader.readexactly(1)
+        except (IncompleteReadError, ConnectionError):
+            return None
+
+        if first[0] == MAGIC:
+            try:
+                header = first + await reader.readexactly(HEADER.size - 1)
+                _, type, flags, meta_size, payload_size, clock, chunk_index = Frame.unpack_header(
+                    header)
+                meta = await reader.readexactly(meta_size)
+                payload = await reader.readexactly(payload_size)
+            except (IncompleteReadError, ConnectionError):
+                return None
+            return Frame(type=type, clock=clock, chunk_index=chunk_index, meta=meta, payload=payload, flags=flags)
+
+        separator = EOF.encode()
+        try:
+            line = await reader.readuntil(separator)
+        except IncompleteReadError as err:
+            return first + err.partial
+        except ConnectionError:
+            return first
+        return first + line[:-len(separator)]
+
+
+class _Connection:
+    """
+    Fila de mensagens pendentes de uma conexão da AsyncEngine. Garante que
+    no máximo um lote por conexão esteja sendo processado no pool.
+    """
+
+    def __init__(self):
+        self.pending: Deque[Union[bytes, Frame]] = deque()
+        self.closed = False
+        self._running = False
+        self._lock = Lock()
+
+    def push(self, data: Union[bytes, Frame]) -> bool:
+        """
+        Enfileira a mensagem.
+
+        Returns:
+            bool: True se é preciso iniciar um novo lote no pool.
+        """
+        with self._lock:
+            self.pending.append(data)
+            if self._running:
+                return False
+            self._running = True
+            return True
+
+    def pop(self) -> Optional[Union[bytes, Frame]]:
+        with self._lock:
+            if len(self.pending) == 0 or self.closed:
+                self._running = False
+                return None
+            return self.pending.popleft()
+
+    def close(self):
+        with self._lock:
+            self.closed = True
+            self._running = False
+            self.pending.clear()
@@ -0,0 +1,66 @@
+class Bitmap:
+    """
+    Mapa de bits compacto que indica quais chunks de um arquivo já foram recebidos.
+    """
+
+    size: int
+    bits: bytearray
+    count: int
+
+    def __init__(self, size: int, bits: bytes = b''):
+        """
+        Args:
+            size (int): Quantidade de chunks representados.
+            bits (bytes): Conteúdo serializado (opcional), como retornado por to_bytes().
+        """
+        self.size = size
+        self.bits = bytearray((size + 7) // 8)
+        self.bits[:len(bits)] = bits[:len(self.bits)]
+        self.count = sum(bin(b).count("1") for b in self.bits)
+
+    def __contains__(self, index: int) -> bool:
+        return bool(self.bits[index >> 3] & (1 << (index & 7)))
+
+    def set(self, index: int) -> bool:
+        """
+        Marca o chunk como recebido.
+
+        Returns:
+            bool: False se o chunk já estava marcado.
+        """
+        if index in self:
+            return False
+        self.bits[index >> 3] |= 1 << (index & 7)
+        self.count += 1
+        return True
+
+    def clear(self, index: int) -> bool:
+        """
+        Desmarca o chunk.
+
+        Returns:
+            bool: False se o chunk não estava marcado.
+        """
+        if index not in self:
+            return False
+        self.bits[index >> 3] &= ~(1 << (index & 7))
+        self.count -= 1
+        return True
+
+    def missing(self):
+        """
+        Itera sobre os índices dos chunks ainda não recebidos.
+        """
+        return (i for i in range(self.size) if i not in self)
+
+    def present(self):
+        """
+        Itera sobre os índices dos chunks já recebidos.
+        """
+        return (i for i in range(self.size) if i in self)
+
+    def is_complete(self) -> bool:
+        return self.count == self.size
+
+    def to_bytes(self) -> bytes:
+        return bytes(self.bits)
@@ -1,15 +1,45 @@
 from socket import socket
-from typing import Dict, Optional
+from typing import Dict, Optional, Union
+
+from src.models.frame import Frame, HEADER, MAGIC
 
 EOF = '\u200B'
 
 
 class Buffer:
+    """
+    Buffer de recepção de um socket.
+
+    Os dados são lidos com recv_into, em blocos grandes, para dentro de um
+    bytearray reaproveitado entre as leituras. A busca pelo separador continua
+    de onde a busca anterior parou, e cada mensagem é copiada uma única vez
+    para fora do buffer, de forma que o custo de ler um frame é linear no seu
+    tamanho, independente do tamanho dos blocos recebidos.
+    """
+
     __instances: Dict[socket, 'Buffer'] = {}
 
+    # Tamanho mínimo de cada leitura do socket
+    BLOCK_SIZE = 64 * 1024
+
     def __init__(self, sock: socket):
         self.sock = sock
-        self.buffer = b''
+        self._data = bytearray(self.BLOCK_SIZE)
+        # Dados ainda não consumidos ficam em self._data[self._start:self._end]
+        self._start = 0
+        self._end = 0
+        # Posição a partir da qual o separador ainda não foi procurado
+        self._scan = 0
+
+    def __len__(self) -> int:
+        return self._end - self._start
+
+    @property
+    def buffer(self) -> bytes:
+        """
+        Cópia dos dados recebidos e ainda não consumidos.
+        """
+        return bytes(self._data[self._start:self._end])
 
     @classmethod
     def get(cls, sock: socket) -> 'Buffer':
@@ -17,32 +47,135 @@ class Buffer:
             cls.__instances[sock] = Buffer(sock)
         return cls.__instances[sock]
 
+    @classmethod
+    def release(cls, sock: socket):
+        """
+        Descarta o buffer associado a um socket que foi encerrado.
+        """
+        cls.__instances.pop(sock, None)
+
+    @classmethod
+    def buffered(cls) -> int:
+        """
+        Total de bytes recebidos e ainda não consumidos em todos os buffers.
+        """
+        return sum(len(instance) for instance in list(cls.__instances.values()))
+
+    def __reserve(self, size: int):
+        """
+        Garante espaço livre para ao menos `size` bytes no final do buffer,
+        movendo os dados não consumidos para o início e, se preciso,
+        dobrando a capacidade.
+        """
+        if len(self._data) - self._end >= size:
+            return
+
+        unread = self._end - self._start
+        if self._start > 0:
+            self._data[:unread] = self._data[self._start:self._end]
+            self._scan -= self._start
+            self._start, self._end = 0, unread
+
+        capacity = len(self._data)
+        if capacity - unread < size:
+            capacity = max(capacity * 2, unread + size)
+            self._data.extend(bytes(capacity - len(self._data)))
+
+    def __recv(self, buffer_size: int) -> bool:
+        """
+        Lê mais dados do socket para o buffer interno.
+
+        Returns:
+            bool: False se a conexão foi encerrada ou ocorreu erro.
+        """
+        size = max(buffer_size, self.BLOCK_SIZE)
+        self.__reserve(size)
+
+        try:
+            with memoryview(self._data) as view:
+                n = self.sock.recv_into(view[self._end:self._end + size])
+        except (ConnectionResetError, ConnectionAbortedError, OSError):
+            return False
+
+        if n == 0:
+            return False
+
+        self._end += n
+        return True
+
+    def __consume(self, start: int, end: int, skip: int = 0) -> bytes:
+        """
+        Copia self._data[start:end] para fora do buffer e descarta os dados
+        consumidos até end + skip.
+        """
+        with memoryview(self._data) as view:
+            data = bytes(view[start:end])
+
+        self._start = end + skip
+        if self._start >= self._end:
+            self._start = self._end = 0
+        self._scan = self._start
+        return data
+
     def read_until(self, separator: bytes = EOF.encode(), buffer_size: int = 1024) -> Optional[bytes]:
-        while separator not in self.buffer:
-            try:
-                data = self.sock.recv(buffer_size)
-            except (ConnectionResetError, ConnectionAbortedError, OSError):
-                if self.buffer:
-                    remaining = self.buffer
-                    self.buffer = b''
-                    return remaining
-                else:
-                    return None
-
-            if not data:
-                if self.buffer:
-                    remaining = self.buffer
-                    self.buffer = b''
-                    return remaining
-                else:
-                    return None
-
-            self.buffer += data
-
-        line, _, self.buffer = self.buffer.partition(separator)
-        return line
+        while True:
+            index = self._data.find(separator, max(
+                self._scan, self._start), self._end)
+            if index >= 0:
+                return self.__consume(start=self._start, end=index, skip=len(separator))
+
+            # O separador pode estar dividido entre o bloco atual e o próximo
+            self._scan = max(self._start, self._end - len(separator) + 1)
+
+            if not self.__recv(buffer_size):
+                if len(self) > 0:
+                    return self.__consume(start=self._start, end=self._end)
+                return None
+
+    def read_frame(self, buffer_size: int = 1024) -> Optional[Frame]:
+        """
+        Lê um frame binário completo (cabeçalho + meta + payload).
+
+        Returns:
+            Optional[Frame]: Frame lido ou None se a conexão foi encerrada no meio do frame.
+        """
+        while len(self) < HEADER.size:
+            if not self.__recv(buffer_size):
+                return None
+
+        _, type, flags, meta_size, payload_size, clock, chunk_index = Frame.unpack_header(
+            self._data, offset=self._start)
+        total = HEADER.size + meta_size + payload_size
+
+        while len(self) < total:
+            if not self.__recv(total - len(self)):
+                return None
+
+        meta_start = self._start + HEADER.size
+        with memoryview(self._data) as view:
+            meta = bytes(view[meta_start:meta_start + meta_size])
+        payload = self.__consume(start=meta_start + meta_size,
+                                 end=self._start + total)
+        return Frame(type=type, clock=clock, chunk_index=chunk_index, meta=meta, payload=payload, flags=flags)
+
+    def read_message(self, buffer_size: int = 1024) -> Optional[Union[bytes, Frame]]:
+        """
+        Lê a próxima mensagem da conexão, seja textual (terminada em EOF)
+        ou um frame binário (iniciado pelo byte MAGIC).
+        """
+        if len(self) == 0 and not self.__recv(buffer_size):
+            return None
+
+        if self._data[self._start] == MAGIC:
+            return self.read_frame(buffer_size=buffer_size)
+        return self.read_until(buffer_size=buffer_size)
 
     @staticmethod
     def readuntil(sock: socket, separator: bytes = EOF.encode(), buffer_size: int = 1024) -> Optional[bytes]:
         instance = Buffer.get(sock)
         return instance.read_until(separator=separator, buffer_size=buffer_size)
+
+    @staticmethod
+    def readmessage(sock: socket, buffer_size: int = 1024) -> Optional[Union[bytes, Frame]]:
+        instance = Buffer.get(sock)
+        return instance.read_message(buffer_size=buffer_size)
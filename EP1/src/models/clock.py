@@ -1,3 +1,6 @@
+from src.models.logger import logger
+
+
 class Clock:
     """
     Relógio lógico simples utilizado para manter a ordem de eventos no sistema distribuído.
@@ -13,11 +16,11 @@ class Clock:
 
     def increment(self):
         """
-        Incrementa o valor do relógio em 1 e imprime o novo valor.
+        Incrementa o valor do relógio em 1 e registra o novo valor (nível DEBUG).
         Este método deve ser chamado a cada evento local ou mensagem recebida.
         """
         self.count += 1
-        print(f"=> Atualizando relogio para {self.count}")
+        logger.debug("=> Atualizando relogio para %d", self.count)
 
     def update(self, new_clock: int) -> bool:
         """
@@ -0,0 +1,89 @@
+import zlib
+from typing import Callable, Dict, List, Optional
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+# Os 4 bits menos significativos das flags do frame indicam o codec do payload
+CODEC_MASK = 0x0F
+
+# Tamanho da amostra usada para decidir se vale a pena comprimir um arquivo
+SAMPLE_SIZE = 64 * 1024
+# Razão máxima (comprimido / original) da amostra para que o arquivo seja comprimido
+MAX_RATIO = 0.9
+
+
+class Codec:
+    """
+    Algoritmo de compressão dos chunks, identificado no frame por um número
+    (flags & CODEC_MASK) e na negociação (mensagem CODECS) por um nome.
+    """
+
+    id: int
+    name: str
+
+    def __init__(self, id: int, name: str, compress: Callable[[bytes], bytes], decompress: Callable[[bytes], bytes]):
+        self.id = id
+        self.name = name
+        self.compress = compress
+        self.decompress = decompress
+
+
+def _zstd_codec() -> Optional[Codec]:
+    if zstandard is None:
+        return None
+    # Os objetos do zstandard não podem ser compartilhados entre threads,
+    # então cada chamada cria o seu (a criação é barata perto da compressão)
+    return Codec(id=2, name="zstd",
+                 compress=lambda data: zstandard.ZstdCompressor(level=3).compress(data),
+                 decompress=lambda data: zstandard.ZstdDecompressor().decompress(data))
+
+
+def _lz4_codec() -> Optional[Codec]:
+    if lz4_frame is None:
+        return None
+    return Codec(id=3, name="lz4", compress=lz4_frame.compress, decompress=lz4_frame.decompress)
+
+
+# Codecs disponíveis, em ordem de preferência
+CODECS: List[Codec] = [codec for codec in (
+    _zstd_codec(),
+    _lz4_codec(),
+    Codec(id=1, name="zlib", compress=lambda data: zlib.compress(data, 1), decompress=zlib.decompress),
+) if codec is not None]
+
+CODEC_BY_ID: Dict[int, Codec] = {codec.id: codec for codec in CODECS}
+CODEC_BY_NAME: Dict[str, Codec] = {codec.name: codec for codec in CODECS}
+
+
+def choose_codec(names: List[str]) -> Optional[Codec]:
+    """
+    Escolhe o primeiro codec da lista de preferência do peer que também é suportado localmente.
+    """
+    return next((CODEC_BY_NAME[name] for name in names if name in CODEC_BY_NAME), None)
+
+
+def worth_compressing(codec: Codec, sample: bytes) -> bool:
+    """
+    Indica se a amostra de um arquivo comprime o bastante para compensar o custo de CPU.
+    """
+    if len(sample) == 0:
+        return False
+    return len(codec.compress(sample)) <= len(sample) * MAX_RATIO
+
+
+def decompress(flags: int, payload: bytes) -> bytes:
+    """
+    Descomprime o payload de um frame segundo o codec indicado nas flags.
+    """
+    codec_id = flags & CODEC_MASK
+    if codec_id == 0:
+        return payload
+    return CODEC_BY_ID[codec_id].decompress(payload)
@@ -0,0 +1,476 @@
+import re
+from hashlib import sha1
+from threading import Thread, Lock, Condition, Event
+from time import time
+from typing import Dict, List, Optional, Set, Tuple
+from uuid import uuid4
+
+from src.models.logger import logger
+from src.models.peer import Peer, PeerStatus
+from src.utils import encode, decode
+
+# Quantidade de bits dos identificadores de nós e chaves
+ID_BITS = 160
+
+
+def node_id(address: str) -> int:
+    """
+    Identificador de um nó na DHT: SHA-1 do endereço "<host>:<port>".
+    """
+    return int(sha1(address.encode()).hexdigest(), 16)
+
+
+def key_for(kind: str, value: str) -> int:
+    """
+    Chave da DHT para um arquivo ("file", hash do conteúdo) ou para uma
+    palavra do nome ("token", palavra).
+    """
+    return int(sha1(f"{kind}:{value}".encode()).hexdigest(), 16)
+
+
+def tokens(name: str) -> List[str]:
+    """
+    Palavras de um nome de arquivo usadas na busca: letras e números, em
+    minúsculas, com ao menos 2 caracteres (ex: "Aula 02.pdf" -> aula, 02, pdf).
+    """
+    return sorted({t for t in re.split(r"[^0-9a-z]+", name.lower()) if len(t) >= 2})
+
+
+class Record:
+    """
+    Registro guardado na DHT: um arquivo compartilhado por um peer.
+    """
+
+    provider: str
+    name: str
+    size: int
+    hash: str
+    root: Optional[str]
+
+    def __init__(self, provider: str, name: str, size: int, hash: str, root: Optional[str] = None):
+        self.provider = provider
+        self.name = name
+        self.size = size
+        self.hash = hash
+        self.root = root
+
+    def encode(self) -> str:
+        return f"{self.provider}:{encode(self.name)}:{self.size}:{self.hash}:{self.root}"
+
+    @staticmethod
+    def decode(value: str) -> 'Record':
+        # Registros de peers anteriores à raiz de Merkle não a incluem
+        host, port, name, size, hash, *rest = value.split(":")
+        root = rest[0] if len(rest) > 0 and rest[0] != "None" else None
+        return Record(provider=f"{host}:{port}", name=decode(name), size=int(size), hash=hash, root=root)
+
+    def __eq__(self, other):
+        if not isinstance(other, Record):
+            return NotImplemented
+        return (self.provider, self.name, self.hash) == (other.provider, other.name, other.hash)
+
+    def __hash__(self):
+        return hash((self.provider, self.name, self.hash))
+
+
+class RoutingTable:
+    """
+    Tabela de roteamento do Kademlia: um k-bucket para cada distância
+    (posição do bit mais significativo do XOR entre os identificadores),
+    com até `k` nós cada, do contato mais antigo para o mais recente.
+    """
+
+    own_id: int
+    k: int
+    buckets: List[List[str]]
+
+    def __init__(self, own_id: int, k: int):
+        self.own_id = own_id
+        self.k = k
+        self.buckets = [[] for _ in range(ID_BITS)]
+        self._ids: Dict[str, int] = {}
+        self._lock = Lock()
+
+    def id_of(self, address: str) -> int:
+        if address not in self._ids:
+            self._ids[address] = node_id(address)
+        return self._ids[address]
+
+    def __bucket(self, address: str) -> List[str]:
+        distance = self.id_of(address) ^ self.own_id
+        return self.buckets[max(0, distance.bit_length() - 1)]
+
+    def update(self, address: str, alive=None) -> bool:
+        """
+        Registra um contato com o nó. Com o bucket cheio, o nó mais antigo
+        só é substituído se `alive(nó)` indicar que ele não responde mais.
+
+        Returns:
+            bool: True se o nó entrou na tabela agora.
+        """
+        if self.id_of(address) == self.own_id:
+            return False
+
+        with self._lock:
+            bucket = self.__bucket(address)
+            if address in bucket:
+                bucket.remove(address)
+                bucket.append(address)
+                return False
+            if len(bucket) >= self.k:
+                if alive is None or alive(bucket[0]):
+                    return False
+                bucket.pop(0)
+            bucket.append(address)
+            return True
+
+    def remove(self, address: str):
+        with self._lock:
+            bucket = self.__bucket(address)
+            if address in bucket:
+                bucket.remove(address)
+
+    def closest(self, target: int, count: int) -> List[str]:
+        """
+        Retorna os `count` nós conhecidos mais próximos (distância XOR) do alvo.
+        """
+        with self._lock:
+            addresses = [address for bucket in self.buckets for address in bucket]
+        return sorted(addresses, key=lambda a: self.id_of(a) ^ target)[:count]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(len(bucket) for bucket in self.buckets)
+
+
+class DHT:
+    """
+    Índice distribuído de arquivos no estilo Kademlia, sobre os peers conhecidos.
+
+    Cada peer é um nó identificado pelo SHA-1 do seu endereço. Os arquivos
+    compartilhados são publicados sob duas famílias de chaves: o hash do
+    conteúdo (para achar todas as cópias de um arquivo) e cada palavra do
+    nome (para a busca). Cada chave é guardada nos `K` nós de identificador
+    mais próximo dela (distância XOR), e uma busca chega até eles com
+    consultas iterativas, `ALPHA` em paralelo, em O(log N) passos.
+
+    Mensagens (o id da consulta associa cada resposta ao pedido):
+    - FIND_NODE <id> <alvo>  -> NODES <id> <n> [<host>:<port> ...]
+    - FIND_VALUE <id> <chave> -> VALUES <id> <n> [registros...] (ou NODES, se não tiver a chave)
+    - STORE <id> <chave> <n> [registros...] (sem resposta)
+
+    As chaves vão em hexadecimal e cada registro é "<host>:<port>:<nome>:<tamanho>:<hash>".
+    Os registros expiram se não forem republicados (`Server.dht_republish_interval`),
+    e um nó que entra na tabela recebe os registros das chaves de que ficou mais próximo.
+    """
+
+    # Tamanho dos k-buckets e quantidade de nós que guardam cada chave
+    K = 8
+    # Consultas em paralelo em cada passo da busca
+    ALPHA = 3
+    # Máximo de registros em uma resposta VALUES
+    MAX_VALUES = 200
+    # Máximo de registros em uma mensagem STORE (chaves maiores são enviadas em várias)
+    MAX_STORE = 100
+
+    own_address: str
+    own_id: int
+    table: RoutingTable
+    store: Dict[int, Dict[Tuple[str, str], Tuple[Record, float]]]
+    published_version: Optional[int]
+    published: Dict[int, Set[Record]]
+
+    def __init__(self, server):
+        """
+        Args:
+            server (Server): Servidor usado para enviar as mensagens e cujos arquivos são publicados.
+        """
+        self.server = server
+        self.own_address = f"{server.host}:{server.port}"
+        self.own_id = node_id(self.own_address)
+        self.table = RoutingTable(own_id=self.own_id, k=self.K)
+        self.store = {}
+        self._store_lock = Lock()
+        self._replies: Dict[str, Optional[Tuple[str, List[str]]]] = {}
+        self._cond = Condition()
+        self._stopped = Event()
+        self.published_version: Optional[int] = None
+        self.published = {}
+        self._published_at = 0.0
+
+    def start(self):
+        Thread(target=self.__run, daemon=True).start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def __run(self):
+        """
+        Entra na rede (busca pelo próprio identificador, preenchendo a tabela)
+        e publica os arquivos: apenas as chaves que mudaram quando o índice
+        muda, e todas quando o intervalo de republicação vence.
+        """
+        self.lookup(target=self.own_id)
+        while not self._stopped.is_set():
+            expired = time() - self._published_at >= self.server.dht_republish_interval
+            if expired or self.published_version != self.server.index.version:
+                try:
+                    self.publish(full=expired)
+                except Exception as err:
+                    logger.warning(f"Falha ao publicar os arquivos na DHT: {err}")
+            self._stopped.wait(timeout=min(5.0, self.server.dht_republish_interval))
+
+    def handle_request(self, sender: str, action: str, args: List[str]) -> Optional[str]:
+        """
+        Responde a um FIND_NODE, FIND_VALUE ou STORE recebido.
+
+        Returns:
+            Optional[str]: Resposta a enviar ao remetente, se houver.
+        """
+        self.__contact(sender)
+        rpc, key = args[0], int(args[1], 16)
+
+        if action == "STORE":
+            count = int(args[2])
+            self.__store(key=key, records=[Record.decode(r) for r in args[3:3 + count]])
+            return None
+
+        if action == "FIND_VALUE":
+            records = self.values(key=key)
+            if len(records) > 0:
+                return f"VALUES {rpc} {len(records)} " + " ".join(r.encode() for r in records)
+
+        nodes = [a for a in self.table.closest(target=key, count=self.K) if a != sender]
+        return f"NODES {rpc} {len(nodes)} {' '.join(nodes)}".rstrip()
+
+    def handle_reply(self, sender: str, action: str, args: List[str]):
+        """
+        Entrega uma resposta NODES ou VALUES à busca que fez o pedido.
+        """
+        self.__contact(sender)
+        with self._cond:
+            if args[0] in self._replies:
+                self._replies[args[0]] = (action, args[2:2 + int(args[1])])
+                self._cond.notify_all()
+
+    def __contact(self, address: str):
+        """
+        Registra o contato com um nó. Um nó novo recebe os registros guardados
+        aqui cujas chaves ficaram mais próximas dele, de forma que quem entra
+        na rede depois de uma publicação também passe a responder por elas.
+        """
+        if not self.table.update(address, alive=self.__alive):
+            return
+
+        with self._store_lock:
+            keys = list(self.store.keys())
+        for key in keys:
+            if address in self.table.closest(target=key, count=self.K):
+                self.__send_store(address=address, key=key, records=self.values(key=key))
+
+    def __send_store(self, address: str, key: int, records: List[Record]):
+        """
+        Envia os registros da chave ao nó, em mensagens STORE de até `MAX_STORE` registros.
+        """
+        for start in range(0, len(records), self.MAX_STORE):
+            batch = records[start:start + self.MAX_STORE]
+            message = f"STORE {uuid4().hex[:8]} {key:040x} {len(batch)} " + " ".join(r.encode() for r in batch)
+            self.__submit(self.server.send_message, self.__peer(address), message)
+
+    def __submit(self, fn, *args):
+        try:
+            self.server._fanout.submit(fn, *args)
+        except RuntimeError:
+            # Pool encerrado: o servidor está parando
+            pass
+
+    def values(self, key: int) -> List[Record]:
+        """
+        Registros guardados localmente sob a chave (ignorando os expirados).
+        """
+        now = time()
+        with self._store_lock:
+            entries = self.store.get(key, {})
+            for slot in [s for s, (_, expires) in entries.items() if expires <= now]:
+                del entries[slot]
+            return [record for record, _ in entries.values()][:self.MAX_VALUES]
+
+    def __store(self, key: int, records: List[Record]):
+        expires = time() + 2 * self.server.dht_republish_interval
+        with self._store_lock:
+            entries = self.store.setdefault(key, {})
+            for record in records:
+                entries[(record.provider, record.name)] = (record, expires)
+
+    def __forget(self, key: int, records: Set[Record]):
+        """
+        Remove do armazenamento local os registros (deste nó) que deixaram de ser publicados.
+        """
+        with self._store_lock:
+            entries = self.store.get(key, {})
+            for record in records:
+                slot = (record.provider, record.name)
+                if slot in entries and entries[slot][0] == record:
+                    del entries[slot]
+            if len(entries) == 0:
+                self.store.pop(key, None)
+
+    def __alive(self, address: str) -> bool:
+        peer = self.server.peers.get(address)
+        return peer is not None and peer.status == PeerStatus.Online
+
+    def __peer(self, address: str) -> Peer:
+        if address not in self.server.peers:
+            host, port = address.split(":")
+            self.server.peers[address] = Peer(host=host, port=int(port))
+        return self.server.peers[address]
+
+    def __request(self, messages: Dict[str, str]) -> Dict[str, Optional[Tuple[str, List[str]]]]:
+        """
+        Envia uma consulta a cada nó, em paralelo, e aguarda as respostas
+        por até `Server.dht_timeout` segundos.
+
+        Args:
+            messages (Dict[str, str]): Endereço do nó -> ação (ex: "FIND_NODE"), completada com o id e os argumentos.
+
+        Returns:
+            Dict: Endereço -> (ação, argumentos) da resposta, ou None se o nó não respondeu.
+        """
+        rpcs = {address: uuid4().hex[:8] for address in messages}
+        with self._cond:
+            for rpc in rpcs.values():
+                self._replies[rpc] = None
+
+        def send(address: str):
+            action, _, rest = messages[address].partition(" ")
+            if not self.server.send_message(peer=self.__peer(address), message=f"{action} {rpcs[address]} {rest}"):
+                with self._cond:
+                    self._replies.pop(rpcs[address], None)
+                    self._cond.notify_all()
+
+        for address in messages:
+            self.__submit(send, address)
+
+        deadline = time() + self.server.dht_timeout
+        with self._cond:
+            while time() < deadline and any(self._replies.get(rpc, False) is None for rpc in rpcs.values()):
+                self._cond.wait(timeout=deadline - time())
+            return {address: self._replies.pop(rpc, None) for address, rpc in rpcs.items()}
+
+    def lookup(self, target: int, find_value: bool = False) -> Tuple[List[str], List[Record], int]:
+        """
+        Busca iterativa do Kademlia: consulta os nós mais próximos do alvo,
+        `ALPHA` por vez, aproximando-se dele com os nós indicados nas
+        respostas, até que os `K` mais próximos conhecidos tenham respondido.
+        Com `find_value`, a busca para no passo em que algum nó devolveu registros.
+
+        Returns:
+            Tuple[List[str], List[Record], int]: Nós mais próximos, registros encontrados e quantidade de passos.
+        """
+        if len(self.table) < self.K:
+            # Tabela vazia (ou quase): começa pelos peers online conhecidos
+            for peer in list(self.server.peers.values()):
+                if peer.status == PeerStatus.Online:
+                    self.table.update(f"{peer.host}:{peer.port}")
+
+        distance = lambda address: self.table.id_of(address) ^ target
+        shortlist: Set[str] = set(self.table.closest(target=target, count=self.K))
+        queried: Set[str] = set()
+        records: Set[Record] = set()
+        hops = 0
+        action = "FIND_VALUE" if find_value else "FIND_NODE"
+
+        while True:
+            closest = sorted(shortlist, key=distance)[:self.K]
+            pending = [a for a in closest if a not in queried][:self.ALPHA]
+            if len(pending) == 0:
+                break
+
+            hops += 1
+            queried.update(pending)
+            replies = self.__request({address: f"{action} {target:040x}" for address in pending})
+            for address, reply in replies.items():
+                if reply is None:
+                    self.table.remove(address)
+                    shortlist.discard(address)
+                    continue
+
+                kind, items = reply
+                if kind == "VALUES":
+                    records.update(Record.decode(item) for item in items)
+                else:
+                    shortlist.update(a for a in items if a != self.own_address)
+
+            if find_value and len(records) > 0:
+                break
+
+        self.server.metrics.observe("dht_lookup_hops", hops, buckets=list(range(1, 17)))
+        return sorted(shortlist, key=distance)[:self.K], list(records), hops
+
+    def publish(self, full: bool = True):
+        """
+        Publica os arquivos da pasta compartilhada: cada registro é enviado
+        (STORE) aos `K` nós mais próximos do hash do arquivo e de cada
+        palavra do nome. Quando este nó está entre os mais próximos, o
+        registro também é guardado localmente.
+
+        Fora da republicação completa, só são enviados os registros que
+        entraram desde a última publicação (`published`). Os que saíram
+        são removidos do armazenamento local; nos demais nós, expiram por
+        não serem mais republicados.
+
+        Args:
+            full (bool): Republica todas as chaves, renovando a validade dos registros nos outros nós.
+        """
+        version = self.server.index.version
+        by_key: Dict[int, Set[Record]] = {}
+        for entry in self.server.index.files(recursive=True):
+            record = Record(provider=self.own_address, name=entry.name, size=entry.size, hash=entry.hash,
+                            root=entry.root)
+            for key in [key_for("file", entry.hash)] + [key_for("token", t) for t in tokens(entry.name)]:
+                by_key.setdefault(key, set()).add(record)
+
+        for key, records in self.published.items():
+            removed = records - by_key.get(key, set())
+            if len(removed) > 0:
+                self.__forget(key=key, records=removed)
+
+        changes = {key: records if full else records - self.published.get(key, set())
+                   for key, records in by_key.items()}
+        for key, records in changes.items():
+            if len(records) == 0:
+                continue
+            records = sorted(records, key=lambda r: r.name)
+            nodes, _, _ = self.lookup(target=key)
+            if len(nodes) < self.K or (self.own_id ^ key) < (self.table.id_of(nodes[-1]) ^ key):
+                self.__store(key=key, records=records)
+
+            for address in nodes:
+                self.__send_store(address=address, key=key, records=records)
+
+        self.published = by_key
+        self.published_version = version
+        if full:
+            self._published_at = time()
+
+    def search(self, query: str) -> List[Record]:
+        """
+        Busca arquivos cujo nome contém todas as palavras da consulta.
+        A chave consultada é a da palavra mais longa (em geral a mais rara).
+        """
+        words = tokens(query)
+        if len(words) == 0:
+            return []
+
+        key = key_for("token", max(words, key=len))
+        _, records, _ = self.lookup(target=key, find_value=True)
+        records = set(records) | set(self.values(key=key))
+        return [r for r in records if set(words) <= set(tokens(r.name))]
+
+    def find_sources(self, hash: str) -> List[Record]:
+        """
+        Retorna os peers que compartilham o arquivo com o hash informado, com o nome usado por cada um.
+        """
+        key = key_for("file", hash)
+        _, records, _ = self.lookup(target=key, find_value=True)
+        return list(set(records) | set(self.values(key=key)))
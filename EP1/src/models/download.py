@@ -0,0 +1,559 @@
+import os
+import math
+from enum import Enum
+from pathlib import Path
+from threading import Condition, Event, Lock
+from time import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from src.models.bitmap import Bitmap
+from src.models.journal import Journal
+from src.models.merkle import tree_digest, hash_file
+from src.models.window import Window
+
+PART_SUFFIX = ".part"
+
+
+class DownloadStatus(Enum):
+    """
+    Estado de um download gerenciado pelo DownloadManager.
+    """
+
+    Queued = 0
+    Running = 1
+    Done = 2
+    Failed = 3
+
+    def __str__(self):
+        return self.name.upper()
+
+
+class Download:
+    """
+    Download de um arquivo em andamento.
+
+    Os chunks são escritos diretamente na posição correta de um arquivo
+    temporário pré-alocado (<nome>.part) à medida que chegam, de forma que
+    apenas o mapa de chunks recebidos fica em memória. Ao receber o último
+    chunk, o arquivo temporário é renomeado atomicamente para o nome final.
+
+    Quando a lista de hashes dos chunks é conhecida, cada chunk é verificado
+    ao chegar; quando o hash do conteúdo é conhecido, o arquivo completo é
+    verificado antes de ser renomeado.
+
+    O mapa de chunks é salvo periodicamente em um diário (<nome>.journal)
+    por uma thread do DownloadManager (flush), fora do caminho dos chunks
+    recebidos, e um download interrompido é retomado a partir dele.
+
+    Cada chunk pedido tem um prazo (o RTO da janela do peer): vencido o
+    prazo, o chunk volta ao escalonador e é pedido preferencialmente a
+    outro peer que o possua (expire). Nos últimos chunks, um chunk em
+    andamento pode ser pedido em duplicata a um segundo peer (hedge), e
+    vale a primeira resposta.
+
+    No modo enxame, outros peers que baixam o mesmo arquivo entram como
+    fontes durante o download (add_source), com o mapa dos chunks que já
+    possuem (have), e os chunks já recebidos podem ser lidos do arquivo
+    temporário para servi-los (read_chunk).
+    """
+
+    # Intervalo entre gravações do diário, em segundos
+    JOURNAL_INTERVAL = 1.0
+
+    id: str
+    name: str
+    size: int
+    chunk_size: int
+    qtd_chunks: int
+    sources: Dict[str, str]
+    streams: int
+    peer_addresses: List[str]
+    hash: Optional[str]
+    root: Optional[str]
+    chunk_hashes: Optional[List[bytes]]
+    bad_sources: Dict[int, Set[str]]
+    corrupted: int
+    status: DownloadStatus
+    received_bytes: int
+    location: Path
+    temp_location: Path
+    bitmap: Bitmap
+    journal: Optional[Journal]
+    resumed_chunks: int
+    windows: Dict[str, Window]
+    have: Dict[str, Bitmap]
+    availability: List[int]
+    have_version: int
+    in_flight: Dict[int, Dict[str, float]]
+    timed_out: Dict[int, Set[str]]
+    started_at: float
+    finished_at: Optional[float]
+
+    def __init__(self, shared_dir: str, name: str, size: int, chunk_size: int, sources: Dict[str, str],
+                 hash: Optional[str] = None, id: str = "", streams: int = 0, root: Optional[str] = None):
+        """
+        Args:
+            shared_dir (str): Pasta onde o arquivo final será gravado.
+            name (str): Nome do arquivo.
+            size (int): Tamanho total do arquivo em bytes.
+            chunk_size (int): Tamanho de cada chunk em bytes.
+            sources (Dict[str, str]): Endereço de cada peer que serve o arquivo e o nome
+                do arquivo nesse peer (arquivos idênticos podem ter nomes diferentes).
+            hash (Optional[str]): SHA-256 do conteúdo, quando conhecido.
+            id (str): Identificador do download.
+            streams (int): Conexões de dados pedidas a cada peer.
+            root (Optional[str]): Raiz de Merkle anunciada na listagem, quando conhecida.
+        """
+        self.id = id
+        self.name = name
+        self.size = size
+        self.chunk_size = chunk_size
+        self.qtd_chunks = math.ceil(size / chunk_size)
+        self.sources = sources
+        self.streams = streams
+        self.peer_addresses = list(sources.keys())
+        self.hash = hash
+        self.root = root
+        self.chunk_hashes = None
+        self.hashes_ready = Event()
+        self.bad_sources = {}
+        self.corrupted = 0
+        self.scheduler = None
+        self.status = DownloadStatus.Queued
+        self.received_bytes = 0
+        self.done = Event()
+        self.cond = Condition()
+        self.windows = {}
+        self.have = {}
+        self.availability = [0] * self.qtd_chunks
+        self.have_version = 0
+        self.in_flight = {}
+        self.timed_out = {}
+        self._next_expiry = math.inf
+        self.location = Path(shared_dir, name)
+        self.temp_location = Path(shared_dir, name + PART_SUFFIX)
+        self.bitmap = Bitmap(self.qtd_chunks)
+        self.journal = None
+        self.resumed_chunks = 0
+        self.started_at = time()
+        self.finished_at = None
+        self._fd = None
+        self._lock = Lock()
+
+    @property
+    def downloaded(self) -> int:
+        return self.bitmap.count
+
+    @property
+    def peers(self) -> int:
+        return len(self.sources)
+
+    def open(self):
+        """
+        Cria o arquivo temporário já com o tamanho final. Se existir um
+        diário do mesmo conteúdo e tamanho de chunk, o arquivo temporário é
+        reaproveitado e apenas os chunks ausentes serão pedidos.
+        """
+        self.started_at = time()
+        self.status = DownloadStatus.Running
+
+        shared_dir = str(self.location.parent)
+        journal = Journal.load(shared_dir=shared_dir, name=self.name)
+        resumed = journal is not None and journal.matches(size=self.size, chunk_size=self.chunk_size, hash=self.hash) \
+            and self.temp_location.exists() and self.temp_location.stat().st_size == self.size
+
+        if resumed:
+            self.bitmap = journal.bitmap
+            self.resumed_chunks = self.bitmap.count
+            self._fd = os.open(self.temp_location, os.O_RDWR)
+        else:
+            self._fd = os.open(self.temp_location, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+            if self.size > 0:
+                if hasattr(os, "posix_fallocate"):
+                    os.posix_fallocate(self._fd, 0, self.size)
+                else:
+                    os.ftruncate(self._fd, self.size)
+
+        self.journal = Journal(shared_dir=shared_dir, name=self.name, size=self.size, chunk_size=self.chunk_size,
+                               hash=self.hash, sources=self.sources, bitmap=self.bitmap, root=self.root)
+        self.__save_journal()
+
+    def __save_journal(self):
+        """
+        Grava o diário. Os dados do arquivo temporário são descarregados em
+        disco antes, para que o diário nunca marque um chunk que se perderia
+        numa queda do sistema.
+        """
+        if self._fd is not None:
+            os.fsync(self._fd)
+        self.journal.save()
+
+    def flush(self):
+        """
+        Descarrega o arquivo temporário em disco e grava no diário o mapa de
+        chunks do momento anterior ao descarregamento: os chunks que chegam
+        durante o fsync só entram no diário seguinte, de forma que ele nunca
+        marque um chunk que se perderia numa queda do sistema. O fsync é
+        feito sem segurar o lock, sem atrasar a escrita dos chunks.
+        """
+        with self._lock:
+            if self._fd is None or self.journal is None:
+                return
+            snapshot = Bitmap(size=self.bitmap.size, bits=self.bitmap.to_bytes())
+            # Cópia do descritor, que continua válida se o download terminar durante o fsync
+            fd = os.dup(self._fd)
+
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+        with self._lock:
+            # Concluído ou interrompido durante o fsync: o diário já foi removido ou gravado
+            if self._fd is not None:
+                self.journal.save(bitmap=snapshot)
+
+    def request(self, index: int, peer_address: str):
+        """
+        Registra o envio do DL de um chunk para um peer, ocupando uma
+        posição na janela desse peer. Deve ser chamado com self.cond adquirido.
+        """
+        window = self.windows[peer_address]
+        window.on_send()
+        now = time()
+        self.in_flight.setdefault(index, {})[peer_address] = now
+        self._next_expiry = min(self._next_expiry, now + window.rto())
+
+    def acknowledge(self, index: int, peer_address: str) -> Optional[Tuple[str, float]]:
+        """
+        Libera a posição da janela ocupada pelo chunk recebido (e as dos
+        outros peers a quem ele foi pedido em duplicata) e acorda quem
+        aguarda espaço para enviar novas requisições.
+
+        Args:
+            index (int): Índice do chunk recebido.
+            peer_address (str): Peer que enviou o chunk.
+
+        Returns:
+            Optional[Tuple[str, float]]: (peer que atendeu, momento do envio do DL),
+                ou None se o pedido a esse peer não estava em andamento (já venceu).
+        """
+        with self.cond:
+            entry = None
+            holders = self.in_flight.pop(index, {})
+            sent_at = holders.pop(peer_address, None)
+            if sent_at is not None:
+                self.windows[peer_address].on_ack(rtt=time() - sent_at)
+                entry = (peer_address, sent_at)
+            elif peer_address in self.windows:
+                self.windows[peer_address].on_late()
+            for other in holders:
+                self.windows[other].on_cancel()
+            self.cond.notify_all()
+            return entry
+
+    def __release(self, index: int, peer_address: str):
+        """
+        Desiste do pedido de um chunk a um peer e, se nenhum outro peer o
+        está atendendo, devolve o chunk ao escalonador. Deve ser chamado com
+        self.cond adquirido.
+        """
+        holders = self.in_flight.get(index)
+        if holders is None or holders.pop(peer_address, None) is None:
+            return
+        self.windows[peer_address].on_loss()
+        if len(holders) == 0:
+            del self.in_flight[index]
+            if self.scheduler is not None:
+                self.scheduler.requeue(index)
+
+    def expire(self) -> Tuple[int, List[str], float]:
+        """
+        Desiste dos pedidos que passaram do prazo (RTO da janela do peer),
+        devolvendo os chunks ao escalonador para que sejam pedidos a outro
+        peer. Deve ser chamado com self.cond adquirido.
+
+        Returns:
+            Tuple[int, List[str], float]: Quantidade de pedidos vencidos, peers
+                travados (Window.stalled) e segundos até o próximo vencimento.
+        """
+        now = time()
+        if now < self._next_expiry:
+            return 0, [], self._next_expiry - now
+
+        expired = 0
+        timed_out: Set[str] = set()
+        self._next_expiry = math.inf
+        for index, holders in list(self.in_flight.items()):
+            for peer_address, sent_at in list(holders.items()):
+                deadline = sent_at + self.windows[peer_address].rto()
+                if deadline > now:
+                    self._next_expiry = min(self._next_expiry, deadline)
+                    continue
+                self.timed_out.setdefault(index, set()).add(peer_address)
+                self.__release(index=index, peer_address=peer_address)
+                timed_out.add(peer_address)
+                expired += 1
+
+        for peer_address in timed_out:
+            self.windows[peer_address].on_timeout()
+        if expired > 0:
+            self.cond.notify_all()
+        stalled = [p for p in timed_out if self.windows[p].stalled()]
+        return expired, stalled, self._next_expiry - now
+
+    def avoid(self, peer_address: str, index: int) -> bool:
+        """
+        Indica se o chunk deve ser pedido a outro peer: o pedido dele a este
+        peer já venceu e há outra fonte que o possui.
+        """
+        timed_out = self.timed_out.get(index)
+        if timed_out is None or peer_address not in timed_out:
+            return False
+        bad = self.bad_sources.get(index, ())
+        return any(p not in timed_out and p not in bad and self.has(p, index) for p in self.peer_addresses)
+
+    def hedge(self, peer_address: str, max_copies: int) -> Optional[int]:
+        """
+        Escolhe um chunk em andamento com outros peers para pedir em
+        duplicata a este (endgame): o pedido há mais tempo, dentre os que já
+        passaram do RTT médio do peer que os atende. Deve ser chamado com
+        self.cond adquirido.
+
+        Args:
+            peer_address (str): Peer que receberia o pedido duplicado.
+            max_copies (int): Máximo de peers atendendo o mesmo chunk.
+
+        Returns:
+            Optional[int]: Índice do chunk, ou None se nenhum chunk deve ser duplicado.
+        """
+        now = time()
+        best, best_sent_at = None, math.inf
+        for index, holders in self.in_flight.items():
+            if peer_address in holders or len(holders) >= max_copies or not self.has(peer_address, index) \
+                    or peer_address in self.bad_sources.get(index, ()):
+                continue
+            holder = min(holders, key=holders.get)
+            sent_at = holders[holder]
+            if now - sent_at >= (self.windows[holder].srtt or 0.0) and sent_at < best_sent_at:
+                best, best_sent_at = index, sent_at
+        return best
+
+    def verify(self, index: int, data: bytes) -> bool:
+        """
+        Confere o chunk com a lista de hashes, se ela for conhecida.
+        """
+        if self.chunk_hashes is None:
+            return True
+        return index < len(self.chunk_hashes) and tree_digest(data) == self.chunk_hashes[index]
+
+    def reject(self, index: int, peer_address: str) -> bool:
+        """
+        Descarta um chunk corrompido e o devolve ao escalonador para que
+        seja pedido a outro peer.
+
+        Returns:
+            bool: False se nenhum peer restante pode fornecer o chunk.
+        """
+        with self.cond:
+            self.corrupted += 1
+            bad = self.bad_sources.setdefault(index, set())
+            bad.add(peer_address)
+            self.cond.notify_all()
+            if bad.issuperset(self.peer_addresses):
+                return False
+            if self.scheduler is not None:
+                self.scheduler.requeue(index)
+            return True
+
+    def has(self, peer_address: str, index: int) -> bool:
+        """
+        Indica se o peer possui o chunk. Peers sem mapa (have) têm o arquivo completo.
+        """
+        bitmap = self.have.get(peer_address)
+        return bitmap is None or index in bitmap
+
+    def add_source(self, peer_address: str, name: str, bitmap: Optional[Bitmap], window: Window):
+        """
+        Passa a usar um peer como fonte durante o download (ou atualiza o
+        mapa de um peer já usado).
+
+        A disponibilidade de cada chunk conta apenas os peers parciais:
+        peers com o arquivo completo possuem todos os chunks e não mudam
+        quais são os mais raros.
+
+        Args:
+            peer_address (str): Endereço do peer.
+            name (str): Nome do arquivo no peer.
+            bitmap (Optional[Bitmap]): Chunks que o peer possui (None = arquivo completo).
+            window (Window): Janela de requisições usada se o peer ainda não for uma fonte.
+        """
+        with self.cond:
+            self.__forget(peer_address=peer_address)
+            self.sources[peer_address] = name
+            if peer_address not in self.peer_addresses:
+                self.peer_addresses.append(peer_address)
+            self.windows.setdefault(peer_address, window)
+            if bitmap is not None:
+                self.have[peer_address] = bitmap
+                for index in bitmap.present():
+                    self.availability[index] += 1
+            self.have_version += 1
+            self.cond.notify_all()
+
+    def add_have(self, peer_address: str, indices: List[int]) -> bool:
+        """
+        Registra os chunks anunciados por um peer parcial (mensagem HAVE).
+
+        Returns:
+            bool: True se o peer passou a ter o arquivo completo.
+        """
+        with self.cond:
+            bitmap = self.have.get(peer_address)
+            if bitmap is None:
+                return False
+            for index in indices:
+                if 0 <= index < self.qtd_chunks and bitmap.set(index):
+                    self.availability[index] += 1
+            self.have_version += 1
+            self.cond.notify_all()
+            return bitmap.is_complete()
+
+    def mark_missing(self, index: int, peer_address: str) -> bool:
+        """
+        Trata a resposta MISSING de um peer que não tem o chunk pedido,
+        devolvendo o chunk ao escalonador.
+
+        Returns:
+            bool: False se o peer deveria ter o arquivo completo (ele não o
+                compartilha mais e deve ser removido do download).
+        """
+        with self.cond:
+            self.__release(index=index, peer_address=peer_address)
+
+            bitmap = self.have.get(peer_address)
+            if bitmap is not None and bitmap.clear(index):
+                self.availability[index] -= 1
+                self.have_version += 1
+            self.cond.notify_all()
+            return bitmap is not None
+
+    def __forget(self, peer_address: str):
+        """
+        Remove o mapa de um peer da contagem de disponibilidade. Deve ser
+        chamado com self.cond adquirido.
+        """
+        bitmap = self.have.pop(peer_address, None)
+        if bitmap is not None:
+            for index in bitmap.present():
+                self.availability[index] -= 1
+            self.have_version += 1
+
+    def drop_source(self, peer_address: str) -> bool:
+        """
+        Deixa de usar um peer que não pode mais ser alcançado, devolvendo ao
+        escalonador os chunks que estavam pendentes com ele.
+
+        Returns:
+            bool: False se não resta nenhum peer para continuar o download.
+        """
+        with self.cond:
+            if peer_address in self.peer_addresses:
+                self.peer_addresses.remove(peer_address)
+            self.__forget(peer_address=peer_address)
+            for index in [i for i, holders in self.in_flight.items() if peer_address in holders]:
+                self.__release(index=index, peer_address=peer_address)
+            self.cond.notify_all()
+            return len(self.peer_addresses) > 0
+
+    def chunk_length(self, index: int) -> Optional[int]:
+        """
+        Tamanho esperado do chunk (o último pode ser menor).
+
+        Returns:
+            Optional[int]: Tamanho em bytes, ou None se o índice está fora do arquivo.
+        """
+        if not 0 <= index < self.qtd_chunks:
+            return None
+        return min(self.chunk_size, self.size - index * self.chunk_size)
+
+    def is_valid_chunk(self, index: int, data: bytes) -> bool:
+        """
+        Indica se o índice está dentro do arquivo e os dados têm o tamanho esperado do chunk.
+        """
+        return self.chunk_length(index) == len(data)
+
+    def write_chunk(self, index: int, data: bytes) -> bool:
+        """
+        Escreve o chunk em seu offset no arquivo temporário. Chunks fora do
+        arquivo ou com tamanho diferente do esperado são ignorados.
+
+        Returns:
+            bool: True se este chunk concluiu o download.
+        """
+        with self._lock:
+            if self._fd is None or not self.is_valid_chunk(index=index, data=data) or index in self.bitmap:
+                return False
+
+            os.pwrite(self._fd, data, index * self.chunk_size)
+            self.bitmap.set(index)
+            self.received_bytes += len(data)
+
+            if not self.bitmap.is_complete():
+                return False
+
+            self.finish()
+            return True
+
+    def read_chunk(self, index: int) -> Optional[bytes]:
+        """
+        Lê um chunk já recebido do arquivo temporário, para servi-lo a
+        outro peer (modo enxame).
+
+        Returns:
+            Optional[bytes]: Conteúdo do chunk, ou None se ele ainda não foi
+                recebido ou o download não está mais em andamento.
+        """
+        with self._lock:
+            length = self.chunk_length(index)
+            if self._fd is None or length is None or index not in self.bitmap:
+                return None
+            return os.pread(self._fd, length, index * self.chunk_size)
+
+    def finish(self):
+        """
+        Fecha o arquivo temporário, confere o hash do conteúdo (se conhecido)
+        e o renomeia para o nome final. Se o conteúdo não confere, o arquivo
+        temporário é descartado e o download é marcado como falho.
+        """
+        os.close(self._fd)
+        self._fd = None
+        self.finished_at = time()
+        if self.journal is not None:
+            self.journal.remove()
+
+        if self.hash is not None and hash_file(self.temp_location) != self.hash:
+            os.remove(self.temp_location)
+            self.status = DownloadStatus.Failed
+        else:
+            os.replace(self.temp_location, self.location)
+            self.status = DownloadStatus.Done
+        self.done.set()
+
+    def fail(self):
+        """
+        Marca o download como falho, liberando quem aguarda sua conclusão.
+        O arquivo temporário e o diário são mantidos para retomar o download.
+        """
+        with self._lock:
+            if self._fd is not None:
+                self.__save_journal()
+                os.close(self._fd)
+                self._fd = None
+            self.finished_at = time()
+            self.status = DownloadStatus.Failed
+            self.done.set()
+
+    def elapsed(self) -> float:
+        end = self.finished_at if self.finished_at is not None else time()
+        return end - self.started_at
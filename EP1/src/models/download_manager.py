@@ -0,0 +1,473 @@
+from pathlib import PurePosixPath
+from queue import Queue
+from time import time, sleep
+from threading import Thread, Lock
+from typing import Dict, List, Optional, Tuple
+from uuid import uuid4
+
+from src.models.bitmap import Bitmap
+from src.models.download import Download, DownloadStatus
+from src.models.file import File
+from src.models.journal import Journal
+from src.models.logger import logger
+from src.models.merkle import merkle_root, is_tree_aligned
+from src.models.peer import Peer, PeerStatus
+from src.models.scheduler import SCHEDULERS
+from src.models.window import Window
+from src.utils import encode
+
+
+class DownloadManager:
+    """
+    Gerencia múltiplos downloads simultâneos, indexados por um id.
+
+    Os downloads são enfileirados e executados por um conjunto fixo de
+    workers, limitando a quantidade de downloads em paralelo. As respostas
+    FILE carregam o id do download, permitindo direcionar cada chunk ao
+    download correto.
+    """
+
+    # Tempo máximo de espera pela lista de hashes dos chunks
+    HASHES_TIMEOUT = 5.0
+    # Fração final dos chunks em que os chunks em andamento são pedidos em duplicata (endgame)
+    ENDGAME_FRACTION = 0.05
+    # Máximo de peers atendendo o mesmo chunk no endgame
+    HEDGE_COPIES = 2
+    # Intervalo entre as verificações de chunks a duplicar no endgame, em segundos
+    ENDGAME_POLL = 0.05
+
+    max_concurrent: int
+    downloads: Dict[str, Download]
+
+    def __init__(self, server, max_concurrent: int = 4):
+        """
+        Args:
+            server (Server): Servidor usado para enviar as mensagens DL.
+            max_concurrent (int): Quantidade máxima de downloads em paralelo.
+        """
+        self.server = server
+        self.max_concurrent = max_concurrent
+        self.downloads = {}
+        self._queue: Queue = Queue()
+        self._lock = Lock()
+        self._workers: List[Thread] = []
+        self._flusher: Optional[Thread] = None
+
+    def start(self):
+        """
+        Inicia os workers responsáveis por executar os downloads enfileirados
+        e a thread que grava os diários dos downloads em andamento.
+        """
+        for _ in range(self.max_concurrent - len(self._workers)):
+            t = Thread(target=self.__worker, daemon=True)
+            t.start()
+            self._workers.append(t)
+
+        if self._flusher is None:
+            self._flusher = Thread(target=self.__flush_journals, daemon=True)
+            self._flusher.start()
+
+    def __flush_journals(self):
+        """
+        A cada Download.JOURNAL_INTERVAL, descarrega em disco os arquivos
+        temporários dos downloads em andamento e grava os seus diários.
+        """
+        while True:
+            sleep(Download.JOURNAL_INTERVAL)
+            with self._lock:
+                running = [d for d in self.downloads.values() if d.status == DownloadStatus.Running]
+            for download in running:
+                try:
+                    download.flush()
+                except OSError as err:
+                    logger.warning(f"Falha ao gravar o diário do download {download.id}: {err}")
+
+    def enqueue(self, name: str, size: int, sources: Dict[str, str], hash: Optional[str] = None,
+                chunk_size: Optional[int] = None, root: Optional[str] = None) -> str:
+        """
+        Enfileira o download de um arquivo.
+
+        Args:
+            name (str): Nome com que o arquivo será salvo. Arquivos de subpastas
+                do peer (ou nomes com "..") são salvos só com o nome final, direto
+                na pasta compartilhada.
+            size (int): Tamanho do arquivo em bytes.
+            sources (Dict[str, str]): Endereço de cada peer que possui o arquivo e o nome do arquivo nele.
+            hash (Optional[str]): SHA-256 do conteúdo, quando conhecido.
+            chunk_size (Optional[int]): Tamanho do chunk (padrão: o do diário de um download
+                interrompido do mesmo arquivo, se houver, ou o do servidor).
+            root (Optional[str]): Raiz de Merkle anunciada pelos peers, usada para validar a
+                lista de hashes dos chunks.
+
+        Returns:
+            str: Id do download.
+        """
+        name = PurePosixPath(name).name
+        if chunk_size is None:
+            journal = Journal.load(shared_dir=self.server.shared_dir, name=name)
+            if journal is not None and journal.matches(size=size, chunk_size=journal.chunk_size, hash=hash):
+                chunk_size = journal.chunk_size
+
+        download_id = uuid4().hex[:8]
+        download = Download(shared_dir=self.server.shared_dir, name=name, size=size,
+                            chunk_size=chunk_size or self.server.chunk_size,
+                            sources=sources, hash=hash, id=download_id, streams=self.server.data_streams,
+                            root=root)
+
+        with self._lock:
+            self.downloads[download_id] = download
+
+        self.start()
+        self._queue.put(download)
+        return download_id
+
+    def enqueue_batch(self, files: List[List]) -> List[str]:
+        """
+        Enfileira vários arquivos de uma vez.
+
+        Args:
+            files (List[List[File]]): Grupos de arquivos (cada grupo representa um arquivo em diferentes peers).
+
+        Returns:
+            List[str]: Ids dos downloads criados, na mesma ordem.
+        """
+        return [self.enqueue(name=group[0].name, size=group[0].size, hash=group[0].hash,
+                             root=File.common_root(group), sources={f.peer_address: f.name for f in group}) for group in files]
+
+    def resumable(self) -> List[Journal]:
+        """
+        Retorna os downloads interrompidos que podem ser retomados.
+        """
+        with self._lock:
+            running = {d.name for d in self.downloads.values()
+                       if d.status in (DownloadStatus.Queued, DownloadStatus.Running)}
+        return [j for j in Journal.find_all(self.server.shared_dir) if j.name not in running]
+
+    def resume(self, names: Optional[List[str]] = None) -> List[Tuple[str, str]]:
+        """
+        Retoma downloads interrompidos a partir dos seus diários, pedindo
+        apenas os chunks que faltam aos mesmos peers de origem.
+
+        Args:
+            names (Optional[List[str]]): Arquivos a retomar (padrão: todos).
+
+        Returns:
+            List[Tuple[str, str]]: Id e nome do arquivo de cada download enfileirado.
+        """
+        resumed = []
+        for journal in self.resumable():
+            if names is not None and journal.name not in names:
+                continue
+
+            for peer_address in journal.sources:
+                if peer_address not in self.server.peers:
+                    host, port = peer_address.split(":")
+                    self.server.peers[peer_address] = Peer(host=host, port=int(port))
+
+            download_id = self.enqueue(name=journal.name, size=journal.size, sources=journal.sources,
+                                       hash=journal.hash, chunk_size=journal.chunk_size, root=journal.root)
+            resumed.append((download_id, journal.name))
+        return resumed
+
+    def get(self, download_id: Optional[str], name: Optional[str] = None, chunk_size: Optional[int] = None) -> Optional[Download]:
+        """
+        Retorna o download ativo pelo id. Peers antigos não devolvem o id na
+        resposta FILE, então nesse caso o download é buscado pelo nome e chunk.
+        """
+        with self._lock:
+            if download_id is not None:
+                return self.downloads.get(download_id)
+
+            for download in self.downloads.values():
+                if download.status == DownloadStatus.Running and download.chunk_size == chunk_size \
+                        and (download.name == name or name in download.sources.values()):
+                    return download
+        return None
+
+    def running(self, hash: Optional[str] = None, name: Optional[str] = None,
+                chunk_size: Optional[int] = None) -> Optional[Download]:
+        """
+        Retorna o download em andamento do conteúdo (hash) ou do nome local
+        informado, com o tamanho de chunk informado (modo enxame).
+        """
+        with self._lock:
+            for download in self.downloads.values():
+                if download.status != DownloadStatus.Running or download.chunk_size != chunk_size:
+                    continue
+                if (hash is not None and download.hash == hash) or (name is not None and download.name == name):
+                    return download
+        return None
+
+    def add_source(self, download: Download, peer_address: str, name: str, bitmap: Optional[Bitmap]):
+        """
+        Adiciona a um download em andamento um peer do enxame como fonte.
+        """
+        download.add_source(peer_address=peer_address, name=name, bitmap=bitmap,
+                            window=self.__window(peer_address=peer_address))
+
+    def __window(self, peer_address: str) -> Window:
+        """
+        Cria a janela de requisições de um peer, com o RTO inicial a partir do RTT já medido dele.
+        """
+        peer = self.server.peers.get(peer_address)
+        return Window(initial=self.server.window_size, maximum=self.server.max_window_size,
+                      adaptive=self.server.adaptive_window,
+                      srtt=peer.srtt if peer is not None else None,
+                      rttvar=peer.rttvar if peer is not None else None)
+
+    def on_hashes(self, download_id: str, root: str, digests: List[bytes]):
+        """
+        Processa a lista de hashes dos chunks recebida em uma resposta HASH_LIST.
+
+        A raiz da resposta vem do mesmo peer que a lista e não prova nada
+        sozinha: a lista só é aceita se formar a raiz de Merkle anunciada na
+        listagem (Download.root). Sem ela, os chunks não são conferidos um a
+        um (e nenhum peer é descartado por isso); resta o hash do arquivo no final.
+        """
+        download = self.get(download_id=download_id)
+        if download is None:
+            return
+
+        if download.root is not None and root == download.root and len(digests) == download.qtd_chunks \
+                and merkle_root(digests) == download.root:
+            download.chunk_hashes = digests
+        else:
+            logger.warning(f"Lista de hashes do download {download_id} não confere com a raiz anunciada")
+        download.hashes_ready.set()
+
+    def on_chunk(self, download_id: Optional[str], name: str, chunk_size: int, chunk_index: int, data: bytes,
+                 peer_address: str):
+        """
+        Processa um chunk recebido em uma resposta FILE.
+        """
+        download = self.get(download_id=download_id,
+                            name=name, chunk_size=chunk_size)
+        if download is None or download.status != DownloadStatus.Running:
+            return
+
+        if download.chunk_length(chunk_index) is None:
+            logger.warning(f"Chunk {chunk_index} de {peer_address} fora do arquivo do download {download.id}")
+            self.server.metrics.inc("chunks_invalid")
+            return
+
+        entry = download.acknowledge(index=chunk_index, peer_address=peer_address)
+        if entry is not None:
+            peer_address, sent_at = entry
+            self.server.peers[peer_address].observe_chunk(
+                size=len(data), sent_at=sent_at)
+            self.server.metrics.observe(
+                "chunk_latency_seconds", time() - sent_at, peer=peer_address)
+
+        # Tamanho diferente do esperado é tratado como chunk corrompido
+        if not download.is_valid_chunk(index=chunk_index, data=data) \
+                or not download.verify(index=chunk_index, data=data):
+            logger.warning(f"Chunk {chunk_index} do download {download.id} corrompido")
+            self.server.metrics.inc("chunks_corrupted")
+            # Resposta atrasada de um chunk que já chegou por outro peer
+            if chunk_index in download.bitmap:
+                return
+            if not download.reject(index=chunk_index, peer_address=peer_address):
+                download.fail()
+                self.__finish(download=download)
+            return
+
+        finished = download.write_chunk(index=chunk_index, data=data)
+        self.server.swarm.have(download=download, index=chunk_index)
+        if finished:
+            with download.cond:
+                download.cond.notify_all()
+            self.__finish(download=download)
+
+    def on_missing(self, download_id: Optional[str], name: str, chunk_size: int, chunk_index: int,
+                   peer_address: str):
+        """
+        Processa uma resposta MISSING: o peer não tem o chunk pedido.
+        """
+        download = self.get(download_id=download_id,
+                            name=name, chunk_size=chunk_size)
+        if download is None or download.status != DownloadStatus.Running:
+            return
+
+        if download.mark_missing(index=chunk_index, peer_address=peer_address):
+            return
+        logger.warning(f"Peer {peer_address} não tem mais o arquivo, removido do download {download.id}")
+        if not download.drop_source(peer_address=peer_address):
+            download.fail()
+            self.__finish(download=download)
+
+    def wait(self, download_ids: List[str], timeout: Optional[float] = None) -> bool:
+        """
+        Aguarda a conclusão dos downloads informados.
+
+        Returns:
+            bool: True se todos terminaram com sucesso.
+        """
+        ok = True
+        for download_id in download_ids:
+            download = self.downloads[download_id]
+            ok = download.done.wait(timeout=timeout) and ok
+            ok = ok and download.status == DownloadStatus.Done
+        return ok
+
+    def __worker(self):
+        while True:
+            download: Download = self._queue.get()
+            try:
+                self.__run(download=download)
+            except Exception as err:
+                download.fail()
+                logger.error(f"Falha no download {download.id}: {err}")
+            download.done.wait()
+
+    def __run(self, download: Download):
+        """
+        Inicia o download e envia as mensagens "DL" para os peers escolhidos
+        pelo escalonador configurado (Server.scheduler), respeitando a janela
+        de requisições em andamento de cada peer: novos chunks só são pedidos
+        conforme os anteriores chegam.
+
+        Se o hash do conteúdo é conhecido, antes dos chunks é pedida a lista
+        de hashes por chunk (HASHES) a um dos peers, para verificar cada chunk
+        na chegada. Sem resposta em HASHES_TIMEOUT, o download segue apenas
+        com a verificação final do conteúdo.
+
+        No modo enxame (Server.use_swarm), o download entra no enxame do
+        arquivo e os chunks são escolhidos pelo escalonador rarest-first.
+
+        Chunks sem resposta dentro do prazo (RTO) de cada peer voltam ao
+        escalonador e são pedidos a outro peer; um peer travado (Window.stalled)
+        é removido do download. Quando não há mais chunks a escalonar e faltam
+        no máximo ENDGAME_FRACTION dos chunks, os chunks em andamento há mais
+        tempo que o RTT médio são pedidos também a outro peer (Server.hedging).
+        """
+        with self._lock:
+            busy = any(d is not download and d.status == DownloadStatus.Running
+                       and d.name == download.name for d in self.downloads.values())
+        if busy:
+            raise RuntimeError(
+                f"arquivo {download.name} já está sendo baixado")
+
+        download.open()
+
+        if download.qtd_chunks == 0:
+            download.finish()
+            self.__finish(download=download)
+            return
+
+        peers = download.peer_addresses
+        for peer_address in peers:
+            download.windows[peer_address] = self.__window(peer_address=peer_address)
+
+        swarm = self.server.use_swarm and download.hash is not None
+        if swarm:
+            self.server.swarm.join(download=download)
+
+        # Os hashes dos chunks só podem ser conferidos com a raiz anunciada se
+        # cada chunk for uma subárvore completa das folhas da árvore
+        if download.root is not None and is_tree_aligned(download.chunk_size):
+            source = peers[0]
+            self.server.send_message(
+                peer=self.server.peers[source],
+                message=f"HASHES {encode(download.sources[source])} {download.chunk_size} {download.id}")
+            download.hashes_ready.wait(timeout=self.HASHES_TIMEOUT)
+
+        scheduler = SCHEDULERS["rarest-first" if swarm else self.server.scheduler](
+            download=download, peers=self.server.peers)
+        download.scheduler = scheduler
+
+        while not download.done.is_set():
+            batch = []
+            with download.cond:
+                expired, stalled, wait = download.expire()
+                if expired > 0:
+                    self.server.metrics.inc("chunks_timed_out", expired)
+
+                candidates = [
+                    p for p in peers if download.windows[p].available()]
+                while len(candidates) > 0 and scheduler.has_pending():
+                    peer_address = scheduler.select_peer(candidates=candidates)
+                    if peer_address is None:
+                        break
+                    index = scheduler.next_chunk(peer_address=peer_address)
+                    if index is None:
+                        candidates.remove(peer_address)
+                        continue
+
+                    download.request(index=index, peer_address=peer_address)
+                    batch.append((index, peer_address))
+                    if not download.windows[peer_address].available():
+                        candidates.remove(peer_address)
+
+                endgame = self.server.hedging and not scheduler.has_pending() \
+                    and download.qtd_chunks - download.downloaded <= download.qtd_chunks * self.ENDGAME_FRACTION
+                if endgame:
+                    batch.extend(self.__hedge(download=download))
+                    wait = min(wait, self.ENDGAME_POLL)
+
+                if len(batch) == 0:
+                    download.cond.wait(timeout=min(max(wait, 0.01), 1))
+
+            for peer_address in stalled:
+                logger.warning(f"Peer {peer_address} não responde, removido do download {download.id}")
+                self.server.metrics.inc("sources_stalled")
+                if not download.drop_source(peer_address=peer_address):
+                    download.fail()
+                    self.__finish(download=download)
+
+            for i, peer_address in batch:
+                if peer_address not in download.peer_addresses:
+                    continue
+                sent = self.server.send_message(
+                    peer=self.server.peers[peer_address],
+                    message=f"DL {encode(download.sources[peer_address])} {download.chunk_size} {i} {download.id}"
+                )
+                if not sent:
+                    logger.warning(f"Peer {peer_address} inacessível, removido do download {download.id}")
+                    self.server.peers[peer_address].change_status(
+                        new_status=PeerStatus.Offline)
+                    if not download.drop_source(peer_address=peer_address):
+                        download.fail()
+                        self.__finish(download=download)
+
+    def __hedge(self, download: Download) -> List[Tuple[int, str]]:
+        """
+        Pede em duplicata, aos peers com espaço na janela, os chunks em
+        andamento há mais tempo. Deve ser chamado com download.cond adquirido.
+
+        Returns:
+            List[Tuple[int, str]]: Chunks pedidos e o peer de cada um.
+        """
+        batch = []
+        for peer_address in download.peer_addresses:
+            window = download.windows[peer_address]
+            while window.available() and window.timeouts == 0:
+                index = download.hedge(peer_address=peer_address, max_copies=self.HEDGE_COPIES)
+                if index is None:
+                    break
+                download.request(index=index, peer_address=peer_address)
+                batch.append((index, peer_address))
+        if len(batch) > 0:
+            self.server.metrics.inc("chunks_hedged", len(batch))
+        return batch
+
+    def __finish(self, download: Download):
+        """
+        Registra as estatísticas de um download concluído.
+        """
+        if download.status != DownloadStatus.Done:
+            if download.journal is not None and download.journal.location.exists():
+                logger.warning(f"Download do arquivo {download.name} interrompido ({download.downloaded}/{download.qtd_chunks} chunks). "
+                      "Use a opção de retomar downloads para continuar.")
+            else:
+                logger.error(f"Download do arquivo {download.name} falhou.")
+            return
+
+        stats = self.server.state["stats"]
+        key = (download.chunk_size, download.peers, download.size, download.streams)
+        if key not in stats:
+            stats[key] = []
+        stats[key].append(download.elapsed())
+
+        self.server.index.refresh(name=download.name)
+
+        logger.info(f"Download do arquivo {download.name} finalizado.")
@@ -1,23 +1,50 @@
+from typing import List, Optional
+
+
 class File:
     name: str
     size: int
     peer_address: str
+    hash: Optional[str]
+    root: Optional[str]
 
-    def __init__(self, name: str, size: int, peer_address):
+    def __init__(self, name: str, size: int, peer_address, hash: Optional[str] = None,
+                 root: Optional[str] = None):
         self.name = name
         self.size = size
         self.peer_address = peer_address
+        self.hash = hash
+        self.root = root
 
     def __eq__(self, other):
         if not isinstance(other, File):
             return NotImplemented
-        return (self.name, self.size) == (other.name, other.size)
+        return self.key() == other.key()
 
     def __hash__(self):
-        return hash((self.name, self.size))
+        return hash(self.key())
 
     def __repr__(self):
-        return f"File(name={self.name}, size={self.size}, peer_address={self.peer_address})"
+        return f"File(name={self.name}, size={self.size}, peer_address={self.peer_address}, hash={self.hash})"
 
     def key(self):
+        """
+        Identidade do arquivo: o hash do conteúdo, quando conhecido, de forma
+        que arquivos idênticos com nomes diferentes sejam agrupados. Peers
+        antigos não informam o hash e o arquivo é identificado por nome e tamanho.
+        """
+        if self.hash is not None:
+            return f"{self.hash}:{self.size}"
         return f"{self.name}:{self.size}"
+
+    @staticmethod
+    def common_root(files: List['File']) -> Optional[str]:
+        """
+        Raiz de Merkle anunciada para um grupo de arquivos. Só é usada para
+        verificar os chunks se todos os peers anunciaram a mesma raiz; caso
+        contrário, o download depende apenas da verificação do hash no final.
+        """
+        roots = {f.root for f in files}
+        if len(roots) == 1:
+            return roots.pop()
+        return None
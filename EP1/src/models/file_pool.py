@@ -0,0 +1,173 @@
+import os
+import mmap
+from collections import OrderedDict
+from contextlib import contextmanager
+from threading import Lock
+from typing import BinaryIO, Dict, Iterator, Optional, Tuple
+
+from src.models.compression import Codec, SAMPLE_SIZE, worth_compressing
+
+
+class PooledFile:
+    """
+    Arquivo aberto somente para leitura e mapeado em memória, mantido no pool.
+    """
+
+    path: str
+    file: BinaryIO
+    map: Optional[mmap.mmap]
+    size: int
+    signature: Tuple[int, int, int]
+
+    def __init__(self, path: str, signature: Tuple[int, int, int]):
+        self.path = path
+        self.signature = signature
+        self.size = signature[2]
+        self.file = open(path, mode="rb")
+        # mmap não aceita arquivos vazios
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.size > 0 else None
+        self.refs = 0
+        self.evicted = False
+        self._compressible: Dict[int, bool] = {}
+
+    def read(self, offset: int, count: int) -> bytes:
+        if self.map is None:
+            return b""
+        return self.map[offset:offset + count]
+
+    def compressible(self, codec: Codec) -> bool:
+        """
+        Indica se vale a pena comprimir os chunks do arquivo com o codec.
+        A decisão é tomada uma vez por arquivo, com uma amostra do início
+        e do meio do conteúdo.
+        """
+        if codec.id not in self._compressible:
+            half = SAMPLE_SIZE // 2
+            middle = max(half, self.size // 2)
+            sample = self.read(offset=0, count=half) + self.read(offset=middle, count=half)
+            self._compressible[codec.id] = worth_compressing(codec=codec, sample=sample)
+        return self._compressible[codec.id]
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+        self.file.close()
+
+
+class FilePool:
+    """
+    Pool LRU de arquivos abertos para servir chunks.
+
+    Servir um arquivo em chunks pequenos abrindo o arquivo a cada DL custa
+    open/seek/read/close por chunk. O pool mantém até `capacity` arquivos
+    abertos (somente leitura) e mapeados em memória, de forma que ler um
+    chunk é apenas um recorte do mapeamento. Cada acesso confere inode,
+    mtime e tamanho do arquivo: se ele foi alterado ou substituído, o
+    mapeamento antigo é descartado e o arquivo é reaberto.
+    """
+
+    capacity: int
+    hits: int
+    misses: int
+    evictions: int
+
+    def __init__(self, capacity: int = 64):
+        """
+        Args:
+            capacity (int): Quantidade máxima de arquivos abertos ao mesmo tempo.
+        """
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._files: 'OrderedDict[str, PooledFile]' = OrderedDict()
+        self._lock = Lock()
+
+    @contextmanager
+    def open(self, path: str) -> Iterator[PooledFile]:
+        """
+        Empresta o arquivo do pool. Enquanto emprestado, o arquivo não é
+        fechado, mesmo que seja removido do pool por outro acesso.
+        """
+        pooled = self.__acquire(path=str(path))
+        try:
+            yield pooled
+        finally:
+            self.__release(pooled=pooled)
+
+    def read(self, path: str, offset: int, count: int) -> bytes:
+        """
+        Lê um trecho do arquivo a partir do mapeamento em memória.
+        """
+        with self.open(path) as pooled:
+            return pooled.read(offset=offset, count=count)
+
+    def __acquire(self, path: str) -> PooledFile:
+        st = os.stat(path)
+        signature = (st.st_ino, st.st_mtime_ns, st.st_size)
+
+        with self._lock:
+            pooled = self._files.get(path)
+            if pooled is not None and pooled.signature == signature:
+                self._files.move_to_end(path)
+                self.hits += 1
+                pooled.refs += 1
+                return pooled
+
+            self.misses += 1
+            if pooled is not None:
+                self.__evict(path=path)
+
+        # Abre fora do lock: abrir e mapear pode ser lento
+        pooled = PooledFile(path=path, signature=signature)
+        pooled.refs += 1
+
+        with self._lock:
+            current = self._files.get(path)
+            if current is not None:
+                # Outro acesso abriu o mesmo arquivo enquanto este abria
+                if current.signature == signature:
+                    current.refs += 1
+                    pooled.refs -= 1
+                    pooled.close()
+                    return current
+                self.__evict(path=path)
+
+            self._files[path] = pooled
+            while len(self._files) > self.capacity:
+                self.__evict(path=next(iter(self._files)))
+        return pooled
+
+    def __release(self, pooled: PooledFile):
+        with self._lock:
+            pooled.refs -= 1
+            if pooled.evicted and pooled.refs == 0:
+                pooled.close()
+
+    def __evict(self, path: str):
+        """
+        Remove o arquivo do pool. Deve ser chamado com self._lock adquirido.
+        """
+        pooled = self._files.pop(path)
+        pooled.evicted = True
+        self.evictions += 1
+        if pooled.refs == 0:
+            pooled.close()
+
+    def clear(self):
+        """
+        Fecha todos os arquivos que não estão emprestados.
+        """
+        with self._lock:
+            for path in list(self._files.keys()):
+                self.__evict(path=path)
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Contadores do pool: acertos, faltas, taxa de acerto, remoções e arquivos abertos.
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses,
+                    "hit_rate": self.hits / total if total > 0 else 0.0,
+                    "evictions": self.evictions, "open": len(self._files)}
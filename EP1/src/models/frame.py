@@ -0,0 +1,83 @@
+import struct
+from typing import Dict
+
+# Primeiro byte de um frame binário. 0xFF nunca aparece em texto UTF-8,
+# então não há ambiguidade com as mensagens textuais terminadas em EOF.
+MAGIC = 0xFF
+
+# Versão do protocolo anunciada na mensagem PROTO.
+# 1 = protocolo textual original, 2 = frames binários com prefixo de tamanho.
+TEXT_PROTOCOL = 1
+BINARY_PROTOCOL = 2
+PROTOCOL_VERSION = BINARY_PROTOCOL
+
+# magic, versão, tipo, flags, tamanho do meta, tamanho do payload, clock, índice do chunk
+HEADER = struct.Struct("!BBBBHIQQ")
+
+TYPE_BY_ACTION: Dict[str, int] = {
+    "FILE": 1,
+    "HASH_LIST": 2,
+}
+ACTION_BY_TYPE: Dict[int, str] = {v: k for k, v in TYPE_BY_ACTION.items()}
+
+
+class Frame:
+    """
+    Frame binário com prefixo de tamanho.
+
+    O frame é composto por:
+    - cabeçalho fixo (HEADER) com tipo, clock lógico, índice do chunk e tamanhos
+    - meta: a mesma linha textual "<host>:<port> <clock> <ação> [args...]" das
+      mensagens comuns, sem o conteúdo binário
+    - payload: bytes crus do chunk (sem base64)
+    """
+
+    type: int
+    flags: int
+    clock: int
+    chunk_index: int
+    meta: bytes
+    payload: bytes
+
+    def __init__(self, type: int, clock: int, chunk_index: int, meta: bytes, payload: bytes, flags: int = 0):
+        self.type = type
+        self.flags = flags
+        self.clock = clock
+        self.chunk_index = chunk_index
+        self.meta = meta
+        self.payload = payload
+
+    @property
+    def action(self) -> str:
+        return ACTION_BY_TYPE.get(self.type, "")
+
+    def header(self) -> bytes:
+        """
+        Retorna apenas o cabeçalho fixo seguido do meta, sem o payload.
+        Útil quando o payload é enviado separadamente (ex: sendfile).
+        """
+        return self.pack_header(type=self.type, clock=self.clock, chunk_index=self.chunk_index,
+                                meta=self.meta, payload_size=len(self.payload), flags=self.flags)
+
+    def encode(self) -> bytes:
+        """
+        Serializa o frame completo (cabeçalho + meta + payload).
+        """
+        return self.header() + self.payload
+
+    @staticmethod
+    def pack_header(type: int, clock: int, chunk_index: int, meta: bytes, payload_size: int, flags: int = 0) -> bytes:
+        return HEADER.pack(MAGIC, PROTOCOL_VERSION, type, flags, len(meta),
+                           payload_size, clock, chunk_index) + meta
+
+    @staticmethod
+    def unpack_header(data: bytes, offset: int = 0):
+        """
+        Decodifica o cabeçalho fixo, que começa na posição offset de data.
+
+        Returns:
+            Tuple: (versão, tipo, flags, tamanho do meta, tamanho do payload, clock, índice do chunk)
+        """
+        _, version, type, flags, meta_size, payload_size, clock, chunk_index = HEADER.unpack_from(
+            data, offset)
+        return version, type, flags, meta_size, payload_size, clock, chunk_index
@@ -0,0 +1,584 @@
+import os
+import json
+from bisect import bisect_right
+from fnmatch import fnmatchcase
+import ctypes
+import ctypes.util
+import struct
+from select import poll, POLLIN
+from threading import Thread, Lock, Event
+from time import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from src.models.download import PART_SUFFIX
+from src.models.journal import JOURNAL_SUFFIX
+from src.models.merkle import MERKLE_LEAF_SIZE, hash_file_tree, chunk_digests, is_tree_aligned
+
+INDEX_FILE_NAME = ".peerare-index.json"
+
+
+class IndexEntry:
+    """
+    Entrada do índice: um arquivo da pasta compartilhada.
+    """
+
+    name: str
+    size: int
+    mtime: int
+    hash: str
+    root: Optional[str]
+
+    def __init__(self, name: str, size: int, mtime: int, hash: str, root: Optional[str] = None):
+        """
+        Args:
+            name (str): Caminho relativo à pasta compartilhada (separado por "/").
+            size (int): Tamanho em bytes.
+            mtime (int): Data de modificação em nanossegundos.
+            hash (str): SHA-256 do conteúdo, em hexadecimal.
+            root (Optional[str]): Raiz de Merkle das folhas do conteúdo, em hexadecimal
+                                  (ausente em índices salvos por versões anteriores).
+        """
+        self.name = name
+        self.size = size
+        self.mtime = mtime
+        self.hash = hash
+        self.root = root
+
+    def to_dict(self) -> dict:
+        return {"name": self.name, "size": self.size, "mtime": self.mtime, "hash": self.hash,
+                "root": self.root}
+
+
+def is_internal(name: str) -> bool:
+    """
+    Indica se o arquivo é de uso interno do peer (índice, downloads em
+    andamento) e não deve ser compartilhado.
+    """
+    return name == INDEX_FILE_NAME or name.endswith(PART_SUFFIX) \
+        or name.endswith(JOURNAL_SUFFIX) or name.endswith(JOURNAL_SUFFIX + ".tmp")
+
+
+def is_valid_name(name: str) -> bool:
+    """
+    Indica se o nome recebido de outro peer é um caminho relativo seguro
+    dentro da pasta compartilhada (sem "..", "." ou partes vazias, e não
+    absoluto), evitando que DL ou uma listagem apontem para fora dela.
+    """
+    parts = name.split("/")
+    return "\\" not in name and all(part not in ("", ".", "..") for part in parts)
+
+
+def matches(name: str, pattern: str) -> bool:
+    """
+    Indica se o caminho do arquivo corresponde ao padrão de busca, sem
+    diferenciar maiúsculas de minúsculas. Padrões com *, ? ou [ são globs
+    (ex: "*.pdf", "aula??.txt"); os demais são buscados como substring.
+    """
+    name, pattern = name.lower(), pattern.lower()
+    if any(c in pattern for c in "*?["):
+        return fnmatchcase(name, pattern)
+    return pattern in name
+
+
+class SharedIndex:
+    """
+    Índice persistente e incremental da pasta compartilhada.
+
+    Guarda nome, tamanho, data de modificação e hash do conteúdo de cada
+    arquivo (inclusive em subpastas) em um arquivo JSON dentro da própria
+    pasta. Ao iniciar, o índice salvo é carregado e uma thread reexamina a
+    pasta em segundo plano, recalculando o hash apenas dos arquivos cujo
+    tamanho ou data de modificação mudaram; os arquivos já indexados são
+    servidos enquanto isso (`ready` indica o fim da primeira varredura).
+
+    Depois disso, com o inotify, só os caminhos indicados nos eventos são
+    reexaminados, e os arquivos internos (downloads em andamento, diários)
+    são ignorados. Sem o inotify (ou se a fila de eventos transbordar), a
+    pasta inteira é reexaminada a cada RESCAN_INTERVAL. A cada mudança o
+    número de versão é incrementado, permitindo que os peers saibam se a
+    listagem que têm em cache ainda é válida.
+    """
+
+    RESCAN_INTERVAL = 5.0
+    # Quantidade de listas de hashes por chunk mantidas em cache
+    MAX_CHUNK_HASHES = 16
+    # Intervalo mínimo entre atualizações, para agrupar os eventos de
+    # arquivos que ainda estão sendo escritos
+    MIN_RESCAN_INTERVAL = 1.0
+    # Intervalo entre as publicações dos arquivos já indexados durante uma varredura longa
+    COMMIT_INTERVAL = 1.0
+    # Intervalo entre as verificações do índice salvo, nos workers
+    FOLLOW_INTERVAL = 0.2
+
+    shared_dir: str
+    version: int
+    entries: Dict[str, IndexEntry]
+
+    def __init__(self, shared_dir: str):
+        self.shared_dir = shared_dir
+        self.version = 0
+        self.entries = {}
+        self.ready = Event()
+        self._lock = Lock()
+        self._stopped = Event()
+        self._inotify: Optional[_Inotify] = None
+        self._chunk_hashes: Dict[Tuple[str, int, int], Tuple[str, List[bytes]]] = {}
+        # Nomes em ordem alfabética (para a paginação da busca) e a versão a que se referem
+        self._sorted: List[str] = []
+        self._sorted_version: Optional[int] = None
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.shared_dir, INDEX_FILE_NAME)
+
+    def load(self) -> bool:
+        """
+        Carrega o índice salvo em disco.
+
+        Returns:
+            bool: False se não havia índice salvo (ou ele era inválido).
+        """
+        try:
+            with open(self.path, mode="r", encoding="utf-8") as file:
+                data = json.load(file)
+            entries = {e["name"]: IndexEntry(**e) for e in data["entries"]}
+        except (OSError, ValueError, KeyError, TypeError):
+            return False
+
+        # Raízes calculadas com outro tamanho de folha são recalculadas na próxima varredura
+        if data.get("leaf_size") != MERKLE_LEAF_SIZE:
+            for entry in entries.values():
+                entry.root = None
+
+        with self._lock:
+            self.version = int(data.get("version", 0))
+            self.entries = entries
+        return True
+
+    def save(self):
+        """
+        Salva o índice em disco de forma atômica.
+        """
+        with self._lock:
+            data = {"version": self.version, "leaf_size": MERKLE_LEAF_SIZE,
+                    "entries": [e.to_dict() for e in self.entries.values()]}
+
+        temp_path = self.path + PART_SUFFIX
+        with open(temp_path, mode="w", encoding="utf-8") as file:
+            json.dump(data, file)
+        os.replace(temp_path, self.path)
+
+    def start(self):
+        """
+        Carrega o índice e inicia a thread que o mantém atualizado, sem
+        esperar a primeira varredura. Arquivos alterados com o peer parado
+        saem do índice assim que a varredura os encontra (antes do cálculo
+        dos hashes), para não serem anunciados com dados antigos.
+        """
+        self.load()
+        self._inotify = _Inotify.create()
+        Thread(target=self.__watch, daemon=True).start()
+
+    def follow(self):
+        """
+        Carrega o índice e inicia a thread que o recarrega sempre que o
+        arquivo salvo muda, sem varrer a pasta (usado pelos workers, em que
+        o índice é mantido pelo processo principal).
+        """
+        mtime = self.__saved_mtime()
+        self.load()
+        self.ready.set()
+        Thread(target=self.__follow, args=(mtime,), daemon=True).start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def files(self, recursive: bool = False) -> List[IndexEntry]:
+        """
+        Retorna as entradas do índice, sem acessar o disco.
+
+        Args:
+            recursive (bool): Se True, inclui arquivos das subpastas.
+        """
+        with self._lock:
+            return [e for e in self.entries.values() if recursive or "/" not in e.name]
+
+    def search(self, pattern: str, min_size: int = 0, max_size: Optional[int] = None, recursive: bool = False,
+               after: str = "", limit: int = 100) -> List[IndexEntry]:
+        """
+        Busca arquivos no índice, em ordem alfabética do caminho.
+
+        Args:
+            pattern (str): Glob ou substring do caminho (ver matches).
+            min_size (int): Tamanho mínimo em bytes.
+            max_size (Optional[int]): Tamanho máximo em bytes (None = sem limite).
+            recursive (bool): Se True, inclui arquivos das subpastas.
+            after (str): Cursor: retorna apenas arquivos com caminho maior que este.
+            limit (int): Quantidade máxima de resultados.
+        """
+        results = []
+        with self._lock:
+            if self._sorted_version != self.version:
+                self._sorted = sorted(self.entries.keys())
+                self._sorted_version = self.version
+
+            for i in range(bisect_right(self._sorted, after) if after else 0, len(self._sorted)):
+                entry = self.entries.get(self._sorted[i])
+                if entry is None or (not recursive and "/" in entry.name):
+                    continue
+                if entry.size < min_size or (max_size is not None and entry.size > max_size):
+                    continue
+                if matches(name=entry.name, pattern=pattern):
+                    results.append(entry)
+                    if len(results) >= limit:
+                        break
+        return results
+
+    def get(self, name: str) -> Optional[IndexEntry]:
+        with self._lock:
+            return self.entries.get(name)
+
+    def find_hash(self, hash: str) -> Optional[IndexEntry]:
+        """
+        Retorna um arquivo do índice com o conteúdo informado, se houver.
+        """
+        with self._lock:
+            return next((e for e in self.entries.values() if e.hash == hash), None)
+
+    def rescan(self) -> bool:
+        """
+        Reexamina a pasta compartilhada, recalculando o hash apenas dos
+        arquivos novos ou modificados.
+
+        Returns:
+            bool: True se o índice mudou.
+        """
+        found: Dict[str, Tuple[int, int]] = {}
+        for name, size, mtime in self.__walk():
+            found[name] = (size, mtime)
+
+        with self._lock:
+            removed = [name for name in self.entries if name not in found]
+        return self.__apply(found=found, removed=removed)
+
+    def update(self, names: Iterable[str]) -> bool:
+        """
+        Reexamina apenas os caminhos informados (arquivos ou pastas), sem
+        varrer o resto da pasta compartilhada. Caminhos que não existem mais
+        saem do índice, com tudo o que havia dentro deles.
+
+        Args:
+            names (Iterable[str]): Caminhos relativos à pasta compartilhada.
+
+        Returns:
+            bool: True se o índice mudou.
+        """
+        found: Dict[str, Tuple[int, int]] = {}
+        gone: Set[str] = set()
+        for name in names:
+            path = os.path.join(self.shared_dir, name)
+            if os.path.isdir(path) and not os.path.islink(path):
+                for child, size, mtime in self.__walk(relative=name):
+                    found[child] = (size, mtime)
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                gone.add(name)
+                continue
+            if os.path.isfile(path):
+                found[name] = (stat.st_size, stat.st_mtime_ns)
+            else:
+                gone.add(name)
+
+        removed = []
+        if len(gone) > 0:
+            prefixes = tuple(f"{name}/" for name in gone)
+            with self._lock:
+                removed = [name for name in self.entries
+                           if name not in found and (name in gone or name.startswith(prefixes))]
+        return self.__apply(found=found, removed=removed)
+
+    def __apply(self, found: Dict[str, Tuple[int, int]], removed: List[str]) -> bool:
+        """
+        Remove as entradas que sumiram e calcula o hash dos arquivos novos ou
+        modificados. Entradas modificadas saem do índice antes do cálculo, e
+        os arquivos já calculados são publicados a cada COMMIT_INTERVAL, para
+        que uma varredura longa não atrase os que já estão prontos.
+
+        Args:
+            found (Dict[str, Tuple[int, int]]): Caminho -> (tamanho, data de modificação) encontrados.
+            removed (List[str]): Caminhos que saem do índice.
+
+        Returns:
+            bool: True se o índice mudou.
+        """
+        with self._lock:
+            # Entradas sem a raiz de Merkle (índices antigos) também são recalculadas
+            changed = {name: info for name, info in found.items() if name not in self.entries
+                       or (self.entries[name].size, self.entries[name].mtime) != info
+                       or self.entries[name].root is None}
+            stale = [name for name in list(removed) + list(changed) if name in self.entries]
+            for name in stale:
+                del self.entries[name]
+            if len(stale) > 0:
+                self.version += 1
+
+        if len(stale) == 0 and len(changed) == 0:
+            return False
+
+        hashed: Dict[str, IndexEntry] = {}
+        committed_at = time()
+        for name, (size, mtime) in changed.items():
+            try:
+                hash, root = hash_file_tree(os.path.join(self.shared_dir, name))
+                hashed[name] = IndexEntry(name=name, size=size, mtime=mtime, hash=hash, root=root)
+            except OSError:
+                continue
+            if time() - committed_at >= self.COMMIT_INTERVAL:
+                self.__commit(hashed)
+                hashed, committed_at = {}, time()
+        self.__commit(hashed)
+
+        self.save()
+        return True
+
+    def __commit(self, hashed: Dict[str, IndexEntry]):
+        if len(hashed) == 0:
+            return
+        with self._lock:
+            self.entries.update(hashed)
+            self.version += 1
+
+    def chunk_hashes(self, name: str, chunk_size: int) -> Optional[Tuple[str, List[bytes]]]:
+        """
+        Retorna a raiz de Merkle e a lista de hashes dos chunks de um arquivo
+        para um tamanho de chunk. As listas mais recentes ficam em cache
+        enquanto o arquivo não for modificado.
+
+        Returns:
+            Optional[Tuple[str, List[bytes]]]: (raiz, hashes), ou None se o arquivo não está no
+                                               índice ou os chunks não são subárvores da raiz
+                                               anunciada (ver is_tree_aligned).
+        """
+        entry = self.get(name)
+        if entry is None or entry.root is None or not is_tree_aligned(chunk_size):
+            return None
+
+        key = (name, chunk_size, entry.mtime)
+        with self._lock:
+            cached = self._chunk_hashes.get(key)
+        if cached is not None:
+            return cached
+
+        try:
+            digests = chunk_digests(os.path.join(
+                self.shared_dir, name), chunk_size)
+        except OSError:
+            return None
+
+        result = (entry.root, digests)
+        with self._lock:
+            if len(self._chunk_hashes) >= self.MAX_CHUNK_HASHES:
+                self._chunk_hashes.pop(next(iter(self._chunk_hashes)))
+            self._chunk_hashes[key] = result
+        return result
+
+    def refresh(self, name: str):
+        """
+        Atualiza imediatamente a entrada de um único arquivo
+        (ex: ao concluir um download), sem varrer a pasta inteira.
+
+        Args:
+            name (str): Caminho relativo do arquivo.
+        """
+        path = os.path.join(self.shared_dir, name)
+        try:
+            stat = os.stat(path)
+            hash, root = hash_file_tree(path)
+            entry = IndexEntry(name=name, size=stat.st_size,
+                               mtime=stat.st_mtime_ns, hash=hash, root=root)
+        except OSError:
+            return
+
+        with self._lock:
+            self.entries[name] = entry
+            self.version += 1
+        self.save()
+
+    def __walk(self, relative: str = ""):
+        """
+        Percorre a pasta compartilhada (ou uma de suas subpastas) e as
+        subpastas dela, retornando (caminho relativo, tamanho, data de
+        modificação) de cada arquivo.
+        """
+        stack = [relative]
+        while stack:
+            relative = stack.pop()
+            directory = os.path.join(self.shared_dir, relative)
+            if self._inotify is not None:
+                self._inotify.watch(directory)
+            try:
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        name = f"{relative}/{entry.name}" if relative else entry.name
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(name)
+                        elif entry.is_file() and not is_internal(entry.name):
+                            stat = entry.stat()
+                            yield name, stat.st_size, stat.st_mtime_ns
+            except OSError:
+                continue
+
+    def __saved_mtime(self) -> Optional[int]:
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def __follow(self, mtime: Optional[int]):
+        while not self._stopped.wait(timeout=self.FOLLOW_INTERVAL):
+            current = self.__saved_mtime()
+            if current is not None and current != mtime:
+                mtime = current
+                self.load()
+
+    def __watch(self):
+        try:
+            self.rescan()
+        except OSError:
+            pass
+        self.ready.set()
+
+        while not self._stopped.is_set():
+            if self._inotify is None or not self._inotify.complete:
+                self._stopped.wait(timeout=self.RESCAN_INTERVAL)
+                events = None
+            else:
+                events = self._inotify.read(timeout=self.RESCAN_INTERVAL)
+
+            try:
+                if events is None:
+                    self.rescan()
+                else:
+                    names = self.__changed_names(events)
+                    if len(names) > 0:
+                        self.update(names)
+            except OSError:
+                pass
+            self._stopped.wait(timeout=self.MIN_RESCAN_INTERVAL)
+
+    def __changed_names(self, events: List[Tuple[str, int]]) -> Set[str]:
+        """
+        Caminhos relativos afetados pelos eventos do inotify, sem os arquivos internos.
+        """
+        names = set()
+        for path, mask in events:
+            if is_internal(os.path.basename(path)):
+                continue
+            if mask & _Inotify.IN_ISDIR and mask & (_Inotify.IN_MOVED_FROM | _Inotify.IN_DELETE):
+                self._inotify.unwatch(path)
+            name = os.path.relpath(path, self.shared_dir).replace(os.sep, "/")
+            if name != ".":
+                names.add(name)
+        return names
+
+
+class _Inotify:
+    """
+    Acesso mínimo ao inotify do Linux via ctypes, usado para saber quais
+    caminhos da pasta compartilhada mudaram.
+
+    Escritas em andamento (IN_MODIFY) não são observadas: um arquivo é
+    reexaminado quando é fechado depois de escrito (IN_CLOSE_WRITE). Se
+    alguma pasta não puder ser observada (limite de watches do sistema),
+    `complete` fica False e o índice volta às varreduras periódicas.
+    """
+
+    IN_ATTRIB = 0x004
+    IN_CLOSE_WRITE = 0x008
+    IN_MOVED_FROM = 0x040
+    IN_MOVED_TO = 0x080
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_Q_OVERFLOW = 0x4000
+    IN_IGNORED = 0x8000
+    IN_ISDIR = 0x40000000
+    MASK = IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    # Cabeçalho de struct inotify_event: wd, mask, cookie, len
+    EVENT = struct.Struct("iIII")
+
+    def __init__(self, libc, fd: int):
+        self._libc = libc
+        self._fd = fd
+        self._watched: Dict[str, int] = {}
+        self._directories: Dict[int, str] = {}
+        self.complete = True
+
+    @classmethod
+    def create(cls) -> Optional['_Inotify']:
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            fd = libc.inotify_init()
+        except (OSError, AttributeError, TypeError):
+            return None
+        if fd < 0:
+            return None
+        return cls(libc=libc, fd=fd)
+
+    def watch(self, directory: str):
+        directory = os.path.normpath(directory)
+        if directory in self._watched:
+            return
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), self.MASK)
+        if wd >= 0:
+            self._watched[directory] = wd
+            self._directories[wd] = directory
+        else:
+            self.complete = False
+
+    def unwatch(self, directory: str):
+        """
+        Deixa de observar uma pasta removida ou movida (e suas subpastas).
+        Uma pasta movida dentro da pasta compartilhada volta a ser observada
+        com o novo caminho quando for percorrida.
+        """
+        directory = os.path.normpath(directory)
+        prefix = directory + os.sep
+        for path in [p for p in self._watched if p == directory or p.startswith(prefix)]:
+            wd = self._watched.pop(path)
+            self._directories.pop(wd, None)
+            self._libc.inotify_rm_watch(self._fd, wd)
+
+    def read(self, timeout: float) -> Optional[List[Tuple[str, int]]]:
+        """
+        Aguarda até algum evento chegar ou o tempo acabar.
+
+        Returns:
+            Optional[List[Tuple[str, int]]]: (caminho, máscara) de cada evento,
+                ou None se a fila de eventos transbordou e eventos foram perdidos.
+        """
+        # poll, ao contrário de select, aceita descritores acima de 1024 (muitas conexões abertas)
+        watcher = poll()
+        watcher.register(self._fd, POLLIN)
+        if not watcher.poll(timeout * 1000):
+            return []
+
+        data = os.read(self._fd, 64 * 1024)
+        events = []
+        offset = 0
+        while offset + self.EVENT.size <= len(data):
+            wd, mask, _, length = self.EVENT.unpack_from(data, offset)
+            name = data[offset + self.EVENT.size:offset + self.EVENT.size + length].rstrip(b"\0")
+            offset += self.EVENT.size + length
+            if mask & self.IN_Q_OVERFLOW:
+                return None
+            directory = self._directories.get(wd)
+            if mask & self.IN_IGNORED:
+                if directory is not None:
+                    self._watched.pop(directory, None)
+                    self._directories.pop(wd, None)
+                continue
+            if directory is not None:
+                events.append((os.path.join(directory, os.fsdecode(name)) if name else directory, mask))
+        return events
@@ -0,0 +1,103 @@
+import os
+import json
+from base64 import b64encode, b64decode
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from src.models.bitmap import Bitmap
+
+JOURNAL_SUFFIX = ".journal"
+
+
+class Journal:
+    """
+    Diário de um download em andamento, gravado ao lado do arquivo
+    temporário (<nome>.journal).
+
+    Guarda a identidade do arquivo (tamanho, hash e raiz de Merkle), o tamanho do chunk, os
+    peers de origem e o mapa dos chunks já gravados no arquivo temporário,
+    de forma que um download interrompido possa ser retomado pedindo apenas
+    os chunks que faltam.
+    """
+
+    name: str
+    size: int
+    chunk_size: int
+    hash: Optional[str]
+    root: Optional[str]
+    sources: Dict[str, str]
+    bitmap: Bitmap
+    location: Path
+
+    def __init__(self, shared_dir: str, name: str, size: int, chunk_size: int, hash: Optional[str],
+                 sources: Dict[str, str], bitmap: Bitmap, root: Optional[str] = None):
+        self.name = name
+        self.size = size
+        self.chunk_size = chunk_size
+        self.hash = hash
+        self.root = root
+        self.sources = sources
+        self.bitmap = bitmap
+        self.location = Path(shared_dir, name + JOURNAL_SUFFIX)
+
+    def matches(self, size: int, chunk_size: int, hash: Optional[str]) -> bool:
+        """
+        Indica se o diário se refere ao mesmo conteúdo e ao mesmo tamanho de chunk.
+        """
+        if hash is not None and self.hash is not None and hash != self.hash:
+            return False
+        return self.size == size and self.chunk_size == chunk_size
+
+    def save(self, bitmap: Optional[Bitmap] = None):
+        """
+        Grava o diário de forma atômica (arquivo temporário + rename), para
+        que uma interrupção no meio da escrita não o corrompa.
+
+        Args:
+            bitmap (Optional[Bitmap]): Mapa a gravar no lugar do atual (ex: uma cópia
+                                       tirada antes de descarregar o arquivo temporário).
+        """
+        bitmap = bitmap if bitmap is not None else self.bitmap
+        data = {"name": self.name, "size": self.size, "chunk_size": self.chunk_size, "hash": self.hash,
+                "root": self.root, "sources": self.sources, "bitmap": b64encode(bitmap.to_bytes()).decode("utf-8")}
+        temp = self.location.with_name(self.location.name + ".tmp")
+        with open(temp, mode="w") as file:
+            json.dump(data, file)
+        os.replace(temp, self.location)
+
+    def remove(self):
+        try:
+            os.remove(self.location)
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def load(shared_dir: str, name: str) -> Optional['Journal']:
+        """
+        Carrega o diário do download de um arquivo, se existir e for válido.
+        """
+        try:
+            with open(Path(shared_dir, name + JOURNAL_SUFFIX), mode="r") as file:
+                data = json.load(file)
+            size, chunk_size = int(data["size"]), int(data["chunk_size"])
+            bitmap = Bitmap(size=-(-size // chunk_size),
+                            bits=b64decode(data["bitmap"]))
+            return Journal(shared_dir=shared_dir, name=data["name"], size=size, chunk_size=chunk_size,
+                           hash=data.get("hash"), sources=dict(data["sources"]), bitmap=bitmap,
+                           root=data.get("root"))
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    @staticmethod
+    def find_all(shared_dir: str) -> List['Journal']:
+        """
+        Retorna os diários dos downloads interrompidos na pasta compartilhada.
+        """
+        journals = []
+        for entry in sorted(os.listdir(shared_dir)):
+            if entry.endswith(JOURNAL_SUFFIX):
+                journal = Journal.load(
+                    shared_dir=shared_dir, name=entry[:-len(JOURNAL_SUFFIX)])
+                if journal is not None:
+                    journals.append(journal)
+        return journals
@@ -0,0 +1,48 @@
+import sys
+import logging
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+from typing import Optional
+
+# Logger da aplicação. As mensagens do caminho crítico (relógio, mensagens
+# recebidas, chunks) ficam em DEBUG; eventos de controle em INFO.
+logger = logging.getLogger("peerare")
+
+_listener: Optional[QueueListener] = None
+
+
+def setup_logging(level: str = "INFO"):
+    """
+    Configura o logger para não bloquear quem registra as mensagens: os
+    registros vão para uma fila e uma thread separada os escreve na saída
+    padrão. Assim, escrever no terminal não limita a taxa de transferência.
+
+    Args:
+        level (str): Nível mínimo das mensagens exibidas (DEBUG, INFO, WARNING, ERROR).
+    """
+    global _listener
+
+    if _listener is not None:
+        _listener.stop()
+
+    queue = SimpleQueue()
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+
+    logger.handlers = [QueueHandler(queue)]
+    logger.setLevel(level.upper())
+    logger.propagate = False
+
+    _listener = QueueListener(queue, handler)
+    _listener.start()
+
+
+def flush_logging():
+    """
+    Escreve as mensagens ainda na fila (ex: antes de encerrar o programa).
+    """
+    global _listener
+
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
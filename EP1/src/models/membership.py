@@ -0,0 +1,172 @@
+import random
+from threading import Thread, Lock, Event
+from typing import Dict, List, Optional, Tuple
+
+from src.models.logger import logger
+from src.models.peer import Peer, PeerStatus
+
+
+class MemberEntry:
+    """
+    Entrada da tabela de membros: último status conhecido de um peer.
+    """
+
+    status: PeerStatus
+    clock: int
+    version: int
+
+    def __init__(self, status: PeerStatus, clock: int, version: int):
+        """
+        Args:
+            status (PeerStatus): Status do peer.
+            clock (int): Clock do peer quando o status mudou (decide qual informação é mais nova).
+            version (int): Versão da tabela em que a entrada mudou pela última vez.
+        """
+        self.status = status
+        self.clock = clock
+        self.version = version
+
+
+class Membership:
+    """
+    Protocolo de gossip para a lista de peers.
+
+    Em vez de trocar a lista completa de peers (PEER_LIST) a cada consulta,
+    cada peer numera as mudanças da sua tabela de membros (peer novo ou
+    status alterado) com uma versão crescente. Quem consulta envia
+    `GET_PEERS <versão>` com a última versão que recebeu daquele peer
+    (marca d'água) e recebe `PEER_DELTA <versão atual> <n> [peers...]`
+    apenas com as entradas que mudaram depois dela. Assim, o custo de cada
+    rodada cresce com a quantidade de mudanças, e não com o tamanho da rede.
+
+    Uma thread executa uma rodada a cada `Server.gossip_interval` segundos,
+    consultando `Server.gossip_fanout` peers online escolhidos ao acaso. A
+    cada `Server.anti_entropy_rounds` rodadas, um deles é consultado desde a
+    versão 0 (anti-entropia), corrigindo mudanças que tenham se perdido.
+    """
+
+    version: int
+    entries: Dict[str, MemberEntry]
+    watermarks: Dict[str, int]
+
+    def __init__(self, server):
+        """
+        Args:
+            server (Server): Servidor cujos peers são divulgados e atualizados.
+        """
+        self.server = server
+        self.version = 0
+        self.entries = {}
+        self.watermarks = {}
+        self.rounds = 0
+        self._lock = Lock()
+        self._stopped = Event()
+        self._thread: Optional[Thread] = None
+
+    def start(self):
+        if self.server.gossip_interval <= 0 or self._thread is not None:
+            return
+        self._thread = Thread(target=self.__run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def __run(self):
+        while not self._stopped.wait(timeout=self.server.gossip_interval):
+            try:
+                self.round()
+            except Exception as err:
+                logger.warning(f"Falha na rodada de gossip: {err}")
+
+    def refresh(self) -> int:
+        """
+        Compara a tabela de membros com os peers conhecidos pelo servidor e
+        registra uma nova versão para cada peer novo ou com status alterado.
+
+        Returns:
+            int: Versão atual da tabela.
+        """
+        with self._lock:
+            for address, peer in list(self.server.peers.items()):
+                entry = self.entries.get(address)
+                if entry is None or entry.status != peer.status:
+                    self.version += 1
+                    self.entries[address] = MemberEntry(
+                        status=peer.status, clock=peer.clock.count, version=self.version)
+            return self.version
+
+    def delta(self, since: int, exclude: str) -> Tuple[int, List[str]]:
+        """
+        Retorna as entradas alteradas depois da versão `since`, no formato
+        "<host>:<port>:<status>:<clock>".
+
+        Se `since` é maior que a versão atual (o peer foi reiniciado e a
+        numeração recomeçou), todas as entradas são enviadas.
+
+        Args:
+            since (int): Marca d'água de quem consulta.
+            exclude (str): Endereço de quem consulta, que não é enviado a ele mesmo.
+
+        Returns:
+            Tuple[int, List[str]]: Versão atual e entradas alteradas.
+        """
+        version = self.refresh()
+        if since > version:
+            since = 0
+
+        with self._lock:
+            changed = [f"{address}:{entry.status}:{entry.clock}"
+                       for address, entry in self.entries.items()
+                       if entry.version > since and address != exclude]
+        return version, changed
+
+    def merge(self, sender: str, version: int, items: List[str]):
+        """
+        Aplica as entradas recebidas em um PEER_DELTA e avança a marca
+        d'água do remetente.
+
+        Peers conhecidos apenas pelo gossip não são conectados na hora: a
+        conexão é aberta quando houver uma mensagem para eles.
+        """
+        own = f"{self.server.host}:{self.server.port}"
+        for item in items:
+            (host, port, status, clock_n) = item.split(":")
+            key = f"{host}:{port}"
+            if key == own:
+                continue
+            if key not in self.server.peers:
+                self.server.peers[key] = Peer(
+                    host=host, port=int(port), status=status)
+
+            ok = self.server.peers[key].clock.update(
+                new_clock=int(clock_n))
+            if ok:
+                self.server.peers[key].change_status(
+                    new_status=PeerStatus.from_string(status), connect=False)
+
+        with self._lock:
+            self.watermarks[sender] = version
+
+    def watermark(self, address: str) -> int:
+        with self._lock:
+            return self.watermarks.get(address, 0)
+
+    def round(self):
+        """
+        Executa uma rodada de gossip: pede as mudanças a `gossip_fanout`
+        peers online escolhidos ao acaso.
+        """
+        self.rounds += 1
+        online = [peer for peer in list(self.server.peers.values())
+                  if peer.status == PeerStatus.Online]
+        targets = random.sample(online, min(self.server.gossip_fanout, len(online)))
+        anti_entropy = self.server.anti_entropy_rounds > 0 \
+            and self.rounds % self.server.anti_entropy_rounds == 0
+
+        for index, peer in enumerate(targets):
+            address = f"{peer.host}:{peer.port}"
+            since = 0 if anti_entropy and index == 0 else self.watermark(address)
+            if not self.server.send_message(peer=peer, message=f"GET_PEERS {since}"):
+                logger.info(f"=> Peer {address} inacessível")
+                peer.change_status(new_status=PeerStatus.Offline)
@@ -0,0 +1,141 @@
+import hashlib
+from typing import List, Tuple
+
+# Tamanho dos blocos lidos ao calcular o hash do conteúdo
+HASH_BLOCK_SIZE = 1024 * 1024
+
+# Tamanho das folhas da árvore de Merkle anunciada na listagem. A raiz não
+# depende do tamanho de chunk do download: para chunks de MERKLE_LEAF_SIZE
+# vezes uma potência de 2, o hash de cada chunk é a raiz da subárvore das
+# folhas dele, e a raiz desses hashes é a mesma raiz anunciada.
+MERKLE_LEAF_SIZE = 256
+
+# Tamanho de um digest SHA-256 em bytes
+DIGEST_SIZE = 32
+
+
+class TreeHasher:
+    """
+    Calcula a raiz de Merkle de uma sequência de folhas sem guardá-las:
+    mantém apenas as raízes das subárvores completas (uma por bit da
+    quantidade de folhas), como em um contador binário.
+
+    A árvore é a mesma de merkle_root: as subárvores completas, da maior
+    para a menor, são combinadas da direita para a esquerda no final.
+    """
+
+    def __init__(self):
+        self._stack: List[Tuple[int, bytes]] = []
+
+    def add(self, digest: bytes):
+        """
+        Acrescenta o hash de uma folha.
+        """
+        height = 0
+        while len(self._stack) > 0 and self._stack[-1][0] == height:
+            _, left = self._stack.pop()
+            digest = hashlib.sha256(left + digest).digest()
+            height += 1
+        self._stack.append((height, digest))
+
+    def digest(self) -> bytes:
+        if len(self._stack) == 0:
+            return hashlib.sha256(b'').digest()
+        digest = self._stack[-1][1]
+        for _, left in reversed(self._stack[:-1]):
+            digest = hashlib.sha256(left + digest).digest()
+        return digest
+
+
+def is_tree_aligned(chunk_size: int) -> bool:
+    """
+    Indica se os chunks desse tamanho podem ser verificados com a raiz
+    anunciada: o tamanho deve ser MERKLE_LEAF_SIZE vezes uma potência de 2.
+    """
+    leaves, remainder = divmod(chunk_size, MERKLE_LEAF_SIZE)
+    return remainder == 0 and leaves > 0 and leaves & (leaves - 1) == 0
+
+
+def tree_digest(data: bytes) -> bytes:
+    """
+    Raiz (binária) da árvore de Merkle das folhas de MERKLE_LEAF_SIZE de um
+    chunk. Para um chunk de uma única folha, é o SHA-256 do chunk.
+    """
+    if len(data) <= MERKLE_LEAF_SIZE:
+        return hashlib.sha256(data).digest()
+    tree = TreeHasher()
+    view = memoryview(data)
+    for start in range(0, len(data), MERKLE_LEAF_SIZE):
+        tree.add(hashlib.sha256(view[start:start + MERKLE_LEAF_SIZE]).digest())
+    return tree.digest()
+
+
+def hash_file_tree(path: str) -> Tuple[str, str]:
+    """
+    Calcula, em uma única leitura, o SHA-256 do conteúdo de um arquivo e a
+    raiz de Merkle das suas folhas de MERKLE_LEAF_SIZE.
+
+    Returns:
+        Tuple[str, str]: (hash do conteúdo, raiz de Merkle), em hexadecimal.
+    """
+    digest = hashlib.sha256()
+    tree = TreeHasher()
+    with open(path, mode="rb") as file:
+        while True:
+            block = file.read(HASH_BLOCK_SIZE)
+            if not block:
+                break
+            digest.update(block)
+            view = memoryview(block)
+            for start in range(0, len(block), MERKLE_LEAF_SIZE):
+                tree.add(hashlib.sha256(view[start:start + MERKLE_LEAF_SIZE]).digest())
+    return digest.hexdigest(), tree.digest().hex()
+
+
+def hash_file(path: str) -> str:
+    """
+    Calcula o SHA-256 do conteúdo de um arquivo, em hexadecimal.
+    """
+    digest = hashlib.sha256()
+    with open(path, mode="rb") as file:
+        while True:
+            block = file.read(HASH_BLOCK_SIZE)
+            if not block:
+                break
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_digests(path: str, chunk_size: int) -> List[bytes]:
+    """
+    Calcula o hash (tree_digest) de cada chunk de um arquivo.
+    """
+    digests = []
+    with open(path, mode="rb") as file:
+        while True:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                break
+            digests.append(tree_digest(chunk))
+    return digests
+
+
+def merkle_root(digests: List[bytes]) -> str:
+    """
+    Calcula a raiz da árvore de Merkle formada pelos hashes dos chunks.
+    Em níveis com quantidade ímpar de nós, o último é promovido ao nível de cima.
+
+    Returns:
+        str: Raiz em hexadecimal (hash vazio se não houver chunks).
+    """
+    level = list(digests)
+    if len(level) == 0:
+        return hashlib.sha256(b'').hexdigest()
+
+    while len(level) > 1:
+        parents = [hashlib.sha256(level[i] + level[i + 1]).digest()
+                   for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2 == 1:
+            parents.append(level[-1])
+        level = parents
+    return level[0].hex()
@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Optional
 
 
 class Message:
@@ -19,8 +19,9 @@ class Message:
     message: str
     action: str
     args: List[str]
+    payload: Optional[bytes]
 
-    def __init__(self, data: bytes):
+    def __init__(self, data: bytes, payload: Optional[bytes] = None):
         """
         Inicializa uma instância de Message a partir de um payload em bytes.
 
@@ -33,6 +34,7 @@ class Message:
 
         Args:
             data (bytes): A mensagem recebida via socket TCP.
+            payload (Optional[bytes]): Conteúdo binário quando a mensagem chega em um frame binário.
         """
         m = data.decode()
         s = m.split(" ")
@@ -42,6 +44,7 @@ class Message:
         self.clock = int(clock)
         self.message = msg
         self.action = msg.strip().split(" ")[0]
+        self.payload = payload
 
     def __str__(self):
         """
@@ -0,0 +1,182 @@
+import json
+from bisect import bisect_left
+from threading import Lock, Thread, Event
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Limites superiores (em segundos) dos baldes dos histogramas de latência
+LATENCY_BUCKETS: List[float] = [0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                                0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """
+    Histograma com baldes fixos: conta quantas observações ficaram abaixo
+    de cada limite, além da soma e da quantidade total.
+    """
+
+    def __init__(self, buckets: List[float]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def to_dict(self) -> Dict:
+        cumulative, total = {}, 0
+        for bound, count in zip(self.buckets + [float("inf")], self.counts):
+            total += count
+            cumulative["+Inf" if bound == float("inf") else str(bound)] = total
+        return {"count": self.count, "sum": self.sum, "buckets": cumulative}
+
+
+class Metrics:
+    """
+    Registro de métricas do servidor.
+
+    - contadores: mensagens e bytes enviados/recebidos por ação, etc.
+    - medidores: valores instantâneos, atualizados diretamente (add/set) ou
+      calculados no momento da consulta (gauge)
+    - histogramas: latências por peer (RTT das sondagens e dos chunks)
+
+    Cada métrica é identificada pelo nome e por rótulos (ex: action="DL").
+    O registro pode ser consultado por outros peers (mensagem STATS) ou
+    exportado localmente em texto ou JSON.
+    """
+
+    def __init__(self):
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._gauges: Dict[str, Dict[Labels, float]] = {}
+        self._callbacks: Dict[str, Callable[[], float]] = {}
+        self._histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self._lock = Lock()
+
+    @staticmethod
+    def __labels(labels: Dict[str, str]) -> Labels:
+        return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, name: str, value: float = 1, **labels):
+        """
+        Incrementa um contador.
+        """
+        key = self.__labels(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def add(self, name: str, value: float, **labels):
+        """
+        Soma um valor (possivelmente negativo) a um medidor.
+        """
+        key = self.__labels(labels)
+        with self._lock:
+            series = self._gauges.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels):
+        key = self.__labels(labels)
+        with self._lock:
+            self._gauges.setdefault(name, {})[key] = value
+
+    def gauge(self, name: str, callback: Callable[[], float]):
+        """
+        Registra um medidor calculado no momento da consulta.
+        """
+        with self._lock:
+            self._callbacks[name] = callback
+
+    def observe(self, name: str, value: float, buckets: Optional[List[float]] = None, **labels):
+        """
+        Registra uma observação em um histograma.
+        """
+        key = self.__labels(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            if key not in series:
+                series[key] = Histogram(buckets=buckets or LATENCY_BUCKETS)
+            series[key].observe(value)
+
+    def snapshot(self) -> Dict:
+        """
+        Retorna uma cópia de todas as métricas, no formato
+        {"counters": {nome: [{"labels": {...}, "value": v}]}, "gauges": ..., "histograms": ...}.
+        """
+        with self._lock:
+            counters = {name: [{"labels": dict(k), "value": v} for k, v in series.items()]
+                        for name, series in self._counters.items()}
+            gauges = {name: [{"labels": dict(k), "value": v} for k, v in series.items()]
+                      for name, series in self._gauges.items()}
+            histograms = {name: [dict(labels=dict(k), **h.to_dict()) for k, h in series.items()]
+                          for name, series in self._histograms.items()}
+            callbacks = list(self._callbacks.items())
+
+        for name, callback in callbacks:
+            gauges[name] = [{"labels": {}, "value": callback()}]
+        return {"counters": counters, "gauges": gauges, "histograms": histograms}
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot())
+
+    def to_text(self) -> str:
+        """
+        Exporta as métricas em texto, uma série por linha (formato de exposição do Prometheus).
+        """
+        return render_text(self.snapshot())
+
+
+def render_text(snapshot: Dict) -> str:
+    """
+    Converte um snapshot (local ou recebido de outro peer) em texto, uma série por linha.
+    """
+    def series(name: str, labels: Dict[str, str]) -> str:
+        if not labels:
+            return name
+        return name + "{" + ",".join(f'{k}="{v}"' for k, v in sorted(labels.items())) + "}"
+
+    lines = []
+    for kind in ("counters", "gauges"):
+        for name, samples in sorted(snapshot[kind].items()):
+            for sample in samples:
+                lines.append(f"{series(name, sample['labels'])} {sample['value']:g}")
+
+    for name, samples in sorted(snapshot["histograms"].items()):
+        for sample in samples:
+            for bound, count in sample["buckets"].items():
+                lines.append(f"{series(name + '_bucket', dict(sample['labels'], le=bound))} {count}")
+            lines.append(f"{series(name + '_sum', sample['labels'])} {sample['sum']:g}")
+            lines.append(f"{series(name + '_count', sample['labels'])} {sample['count']}")
+    return "\n".join(lines)
+
+
+class MetricsExporter:
+    """
+    Grava periodicamente as métricas em um arquivo local, em JSON (se o
+    caminho termina em .json) ou em texto.
+    """
+
+    def __init__(self, metrics: Metrics, path: str, interval: float = 5.0):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self._stopped = Event()
+
+    def start(self):
+        Thread(target=self.__run, daemon=True).start()
+
+    def stop(self):
+        self._stopped.set()
+        self.export()
+
+    def export(self):
+        content = self.metrics.to_json() if self.path.endswith(".json") else self.metrics.to_text()
+        with open(self.path, mode="w", encoding="utf-8") as file:
+            file.write(content + "\n")
+
+    def __run(self):
+        while not self._stopped.wait(timeout=self.interval):
+            self.export()
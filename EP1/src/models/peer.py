@@ -1,9 +1,16 @@
+import os
 from enum import Enum
-from typing import Optional
+from typing import BinaryIO, List, Optional, Tuple
 from socket import socket, AF_INET, SOCK_STREAM, SOL_SOCKET, SO_KEEPALIVE
+from threading import Lock
+from time import time
 
 from src.models.buffer import EOF
 from src.models.clock import Clock
+from src.models.compression import Codec
+from src.models.frame import TEXT_PROTOCOL
+from src.models.logger import logger
+from src.models.window import smooth_rtt
 
 
 class PeerStatus(Enum):
@@ -46,13 +53,39 @@ class Peer:
     - o IP/host
     - a porta de escuta
     - o status atual (Online/Offline)
+    - a versão de protocolo negociada (mensagem PROTO)
+    - estimativas de RTT e banda, atualizadas a cada chunk recebido
+    - a latência da última sondagem (GET_PEERS -> PEER_LIST)
+    - as conexões de dados extras, usadas apenas para os chunks
+    - o codec de compressão aceito pelo peer (mensagem CODECS)
+
+    A conexão principal (conn) é o canal de controle. Quando o peer pede
+    conexões de dados (mensagem PROTO), os chunks enviados a ele são
+    distribuídos entre elas, cada uma com sua própria trava de envio, de
+    forma que chunks grandes não atrasam as mensagens de controle e vários
+    chunks são enviados em paralelo.
     """
 
+    # Tempo máximo para estabelecer a conexão TCP, em segundos
+    connect_timeout: Optional[float] = 2.0
+
+    # Peso da média móvel exponencial da banda (as do RTT são as do RTO, em window.py)
+    BANDWIDTH_ALPHA = 0.2
+
     host: str
     port: int
     status: PeerStatus
     clock: Clock
     conn: Optional[socket]
+    protocol: int
+    announced: bool
+    srtt: Optional[float]
+    rttvar: Optional[float]
+    bandwidth: Optional[float]
+    probe_latency: Optional[float]
+    probed_at: Optional[float]
+    streams: int
+    codec: Optional[Codec]
 
     def __init__(self, host: str, port: int, status: str = "offline", conn: Optional[socket] = None):
         """
@@ -68,34 +101,194 @@ class Peer:
         self.status = PeerStatus.from_string(status)
         self.clock = Clock()
         self.conn = conn
+        self.protocol = TEXT_PROTOCOL
+        self.announced = False
+        self.srtt = None
+        self.rttvar = None
+        self.bandwidth = None
+        self.probe_latency = None
+        self.probed_at = None
+        self.streams = 0
+        self.codec = None
+        self._data_conns: List[Optional[socket]] = []
+        self._data_locks: List[Lock] = []
+        self._last_delivery = 0.0
+        self._send_lock = Lock()
 
-    def change_status(self, new_status: PeerStatus, clock_n: Optional[int] = None):
+    def change_status(self, new_status: PeerStatus, clock_n: Optional[int] = None, connect: bool = True):
         """
         Atualiza o status do peer, se for diferente do atual.
 
         Args:
             new_status (PeerStatus): Novo status (Online ou Offline).
             clock_n (Optional[int]): Contagem do clock para mudança de status.
+            connect (bool): Conecta ao peer assim que ele fica online (senão, só no próximo envio).
         """
         if clock_n is not None and clock_n < self.clock.count:
             return
 
         if self.status != new_status:
             self.status = new_status
-            print(
+            logger.info(
                 f"Atualizando peer {self.host}:{self.port} status {self.status}")
 
             if self.status == PeerStatus.Online and self.conn is None:
-                self.connect()
+                if connect:
+                    self.connect()
             elif self.status == PeerStatus.Offline:
                 self.conn = None
+                self.announced = False
+                self.close_streams()
+
+    def observe_chunk(self, size: int, sent_at: float, received_at: Optional[float] = None):
+        """
+        Atualiza as estimativas de RTT e banda a partir de um chunk recebido.
+        O RTT suavizado do peer vale entre downloads: é usado pelo
+        escalonador "throughput" e como RTO inicial das novas janelas.
+
+        A banda considera apenas o tempo de serviço do chunk: se o pedido foi
+        feito antes da entrega anterior (pipeline cheio), conta-se a partir
+        dessa entrega; caso contrário, a partir do envio do pedido.
+
+        Args:
+            size (int): Tamanho do chunk em bytes.
+            sent_at (float): Momento do envio do DL.
+            received_at (Optional[float]): Momento da chegada do FILE (default: agora).
+        """
+        if received_at is None:
+            received_at = time()
+        self.srtt, self.rttvar = smooth_rtt(srtt=self.srtt, rttvar=self.rttvar, rtt=received_at - sent_at)
+
+        elapsed = received_at - max(sent_at, self._last_delivery)
+        self._last_delivery = received_at
+        if elapsed <= 0:
+            return
 
-    def send_message(self, message: str):
-        self.conn.sendall(f"{message}{EOF}".encode())
+        sample = size / elapsed
+        if self.bandwidth is None:
+            self.bandwidth = sample
+        else:
+            self.bandwidth += self.BANDWIDTH_ALPHA * (sample - self.bandwidth)
+
+    def observe_probe(self, latency: float):
+        """
+        Registra a latência de uma sondagem respondida.
+        """
+        self.probe_latency = latency
+        self.probed_at = time()
+
+    def set_streams(self, streams: int):
+        """
+        Define quantas conexões de dados usar para enviar chunks ao peer
+        (0 = todos os chunks pela conexão de controle).
+        """
+        with self._send_lock:
+            self.streams = streams
+            self._data_conns.extend([None] * (streams - len(self._data_conns)))
+            self._data_locks.extend(Lock() for _ in range(streams - len(self._data_locks)))
+
+    def close_streams(self):
+        """
+        Fecha as conexões de dados; elas são reabertas no próximo envio.
+        """
+        for i, conn in enumerate(self._data_conns):
+            if conn is not None:
+                self.__close_stream(i)
+
+    def __close_stream(self, stream: int):
+        conn, self._data_conns[stream] = self._data_conns[stream], None
+        try:
+            conn.close()
+        except OSError:
+            pass
+
+    def __channel(self, stream: Optional[int]) -> Tuple[socket, Lock]:
+        """
+        Retorna o socket e a trava de envio de uma conexão de dados (abrindo-a
+        se necessário), ou da conexão de controle se stream for None.
+        """
+        if stream is None or self.streams == 0:
+            return self.conn, self._send_lock
+
+        stream %= self.streams
+        lock = self._data_locks[stream]
+        with lock:
+            if self._data_conns[stream] is None:
+                self._data_conns[stream] = self.open_connection()
+        return self._data_conns[stream], lock
+
+    def __send(self, data: bytes, stream: Optional[int]):
+        conn, lock = self.__channel(stream)
+        with lock:
+            try:
+                conn.sendall(data)
+            except OSError:
+                if conn is not self.conn:
+                    self.__close_stream(stream % self.streams)
+                raise
+
+    def send_message(self, message: str, stream: Optional[int] = None):
+        self.__send(f"{message}{EOF}".encode(), stream=stream)
+
+    def send_frame(self, frame: bytes, stream: Optional[int] = None):
+        """
+        Envia um frame binário já serializado pela conexão persistente
+        (ou pela conexão de dados indicada).
+        """
+        self.__send(frame, stream=stream)
+
+    def send_file(self, header: bytes, file: BinaryIO, offset: int, count: int, stream: Optional[int] = None):
+        """
+        Envia o cabeçalho de um frame seguido de um trecho do arquivo,
+        usando sendfile para que os bytes não passem pelo Python.
+
+        O offset é passado explicitamente ao sendfile, sem mover a posição
+        do arquivo, de forma que o mesmo arquivo aberto pode ser usado por
+        várias conexões ao mesmo tempo.
+        """
+        conn, lock = self.__channel(stream)
+        with lock:
+            try:
+                conn.sendall(header)
+                if count <= 0:
+                    return
+                if not hasattr(os, "sendfile"):
+                    conn.sendall(os.pread(file.fileno(), count, offset))
+                    return
+
+                out, fd = conn.fileno(), file.fileno()
+                while count > 0:
+                    sent = os.sendfile(out, fd, offset, count)
+                    if sent == 0:
+                        raise ConnectionError("arquivo terminou antes do esperado")
+                    offset += sent
+                    count -= sent
+            except OSError:
+                if conn is not self.conn:
+                    self.__close_stream(stream % self.streams)
+                raise
 
     def connect(self) -> socket:
+        """
+        Abre a conexão persistente (de controle) com o peer.
+        """
+        conn = self.open_connection()
+        self.conn = conn
+        self.announced = False
+        return conn
+
+    def open_connection(self) -> socket:
+        """
+        Abre uma nova conexão TCP com o peer. A conexão só pode demorar até
+        connect_timeout; depois de aberta, o socket volta a ser bloqueante.
+        """
         conn = socket(AF_INET, SOCK_STREAM)
         conn.setsockopt(SOL_SOCKET, SO_KEEPALIVE, 1)
-        conn.connect((self.host, self.port))
-        self.conn = conn
+        conn.settimeout(self.connect_timeout)
+        try:
+            conn.connect((self.host, self.port))
+        except OSError:
+            conn.close()
+            raise
+        conn.settimeout(None)
         return conn
@@ -0,0 +1,255 @@
+import random
+from collections import deque
+from time import time
+from typing import Deque, Dict, Iterator, List, Optional, Tuple, Type
+
+
+class Scheduler:
+    """
+    Interface dos escalonadores de chunks de um download.
+
+    Sempre que algum peer tem espaço livre na sua janela, o download pergunta
+    ao escalonador qual dos peers disponíveis deve receber a próxima
+    requisição (select_peer) e qual chunk pedir a ele (next_chunk).
+    """
+
+    def __init__(self, download, peers: Dict):
+        """
+        Args:
+            download (Download): Download sendo escalonado.
+            peers (Dict[str, Peer]): Peers conhecidos pelo servidor, usados para
+                consultar as estimativas de RTT e banda.
+        """
+        self.download = download
+        self.peers = peers
+        self._pending: Iterator[int] = download.bitmap.missing()
+        self._retry: Deque[int] = deque()
+        self._peeked: Optional[int] = next(self._pending, None)
+        self._turn = 0
+
+    def has_pending(self) -> bool:
+        """
+        Indica se ainda existem chunks a serem requisitados.
+        """
+        return len(self._retry) > 0 or self._peeked is not None
+
+    def requeue(self, index: int):
+        """
+        Devolve um chunk para a fila (ex: resposta inválida ou prazo vencido).
+        """
+        self._retry.append(index)
+
+    def select_peer(self, candidates: List[str]) -> Optional[str]:
+        """
+        Escolhe o próximo peer dentre os que têm espaço na janela.
+        Por padrão, de forma rotativa (round-robin).
+
+        Returns:
+            Optional[str]: Endereço do peer, ou None para aguardar alguma resposta
+                antes de enviar novas requisições.
+        """
+        addresses = self.download.peer_addresses
+        for i in range(len(addresses)):
+            peer_address = addresses[(self._turn + i) % len(addresses)]
+            if peer_address in candidates:
+                self._turn = (addresses.index(peer_address) + 1) % len(addresses)
+                return peer_address
+        return candidates[0]
+
+    def next_chunk(self, peer_address: str) -> Optional[int]:
+        """
+        Retorna o próximo chunk a ser pedido ao peer, ou None se não houver.
+        """
+        index = self._pop_retry(peer_address=peer_address)
+        if index is not None:
+            return index
+
+        index = self._peeked
+        if index is not None:
+            self._peeked = next(self._pending, None)
+        return index
+
+    def can_serve(self, peer_address: str) -> bool:
+        """
+        Indica se ainda existe algum chunk que pode ser pedido ao peer.
+        """
+        if self._peeked is not None:
+            return True
+        return self._can_retry(peer_address=peer_address)
+
+    def _can_retry(self, peer_address: str) -> bool:
+        """
+        Indica se algum chunk da fila de repetição pode ser pedido ao peer.
+        """
+        return any(self._eligible(peer_address=peer_address, index=index) for index in self._retry)
+
+    def _eligible(self, peer_address: str, index: int) -> bool:
+        """
+        Indica se o chunk da fila de repetição pode ser pedido ao peer: ele
+        o possui, ainda não o entregou corrompido e não deixou o pedido dele
+        vencer (a menos que seja o único que o possui).
+        """
+        return peer_address not in self.download.bad_sources.get(index, ()) \
+            and self.download.has(peer_address, index) and not self.download.avoid(peer_address, index)
+
+    def _pop_retry(self, peer_address: str) -> Optional[int]:
+        """
+        Retira da fila de repetição o primeiro chunk que pode ser pedido ao
+        peer. Chunks que chegaram depois de voltar para a fila (resposta
+        atrasada) são descartados.
+        """
+        for index in list(self._retry):
+            if index in self.download.bitmap or index in self.download.in_flight:
+                self._retry.remove(index)
+            elif self._eligible(peer_address=peer_address, index=index):
+                self._retry.remove(index)
+                return index
+        return None
+
+
+class RoundRobinScheduler(Scheduler):
+    """
+    Distribui os chunks entre os peers em fila circular.
+    """
+
+
+class ThroughputScheduler(Scheduler):
+    """
+    Pondera a escolha pelo RTT e pela banda medidos de cada peer: o
+    próximo chunk vai para o peer que terminaria de entregá-lo primeiro (o
+    RTT suavizado mais a transmissão dele e dos chunks que o peer já tem
+    em andamento). Se esse peer está com a janela
+    cheia, é melhor esperar por ele do que entregar o chunk a um peer lento.
+    Peers ainda sem medição são tratados como os mais rápidos, para que
+    sejam medidos logo, e peers com pedidos vencidos como os mais lentos.
+    """
+
+    def select_peer(self, candidates: List[str]) -> Optional[str]:
+        def expected_finish(peer_address: str) -> Tuple[int, float]:
+            window = self.download.windows[peer_address]
+            peer = self.peers[peer_address]
+            if window.timeouts > 0:
+                return (2, float(window.timeouts))
+            if peer.bandwidth is None:
+                return (0, 0.0)
+            return (1, (peer.srtt or 0.0) + (window.in_flight + 1) * self.download.chunk_size / peer.bandwidth)
+
+        best = min(candidates, key=expected_finish)
+        # Só vale esperar por um peer mais rápido se ele puder servir o chunk
+        fastest = min((p for p in self.download.peer_addresses if self.can_serve(p)),
+                      key=expected_finish, default=best)
+        if expected_finish(fastest) < expected_finish(best):
+            return None
+        return best
+
+
+class WorkStealingScheduler(Scheduler):
+    """
+    Divide o arquivo em faixas contíguas, uma por peer. Quando a faixa de um
+    peer acaba, ele "rouba" a metade final da maior faixa restante. Peers
+    rápidos acabam ficando com mais trabalho sem nenhuma estimativa de banda.
+    """
+
+    def __init__(self, download, peers: Dict):
+        super().__init__(download=download, peers=peers)
+        self._ranges: Dict[str, List[int]] = {}
+        addresses = download.peer_addresses
+        total = download.qtd_chunks
+        for i, peer_address in enumerate(addresses):
+            self._ranges[peer_address] = [total * i // len(addresses),
+                                          total * (i + 1) // len(addresses)]
+
+    def has_pending(self) -> bool:
+        return len(self._retry) > 0 or any(start < end for start, end in self._ranges.values())
+
+    def can_serve(self, peer_address: str) -> bool:
+        if any(start < end for start, end in self._ranges.values()):
+            return True
+        return self._can_retry(peer_address=peer_address)
+
+    def next_chunk(self, peer_address: str) -> Optional[int]:
+        index = self._pop_retry(peer_address=peer_address)
+        if index is not None:
+            return index
+
+        own = self._ranges[peer_address]
+        while True:
+            if own[0] >= own[1]:
+                self.__steal(own=own)
+                if own[0] >= own[1]:
+                    return None
+
+            index = own[0]
+            own[0] += 1
+            if index not in self.download.bitmap:
+                return index
+
+    def __steal(self, own: List[int]):
+        victim = max(self._ranges.values(), key=lambda r: r[1] - r[0])
+        remaining = victim[1] - victim[0]
+        if remaining <= 0:
+            return
+
+        middle = victim[0] + remaining // 2
+        own[0], own[1] = middle, victim[1]
+        victim[1] = middle
+
+
+class RarestFirstScheduler(Scheduler):
+    """
+    Pede primeiro os chunks que menos peers do enxame possuem (modo
+    enxame). Chunks raros chegam logo a mais peers, que passam a servi-los
+    aos demais, em vez de todos dependerem de quem tem o arquivo completo.
+    Empates são decididos por uma ordem aleatória própria de cada download,
+    para que peers diferentes peçam chunks diferentes à mesma fonte.
+
+    A ordem por raridade é recalculada quando algum peer anuncia novos
+    chunks, no máximo a cada REBUILD_INTERVAL segundos.
+    """
+
+    REBUILD_INTERVAL = 0.5
+
+    def __init__(self, download, peers: Dict):
+        super().__init__(download=download, peers=peers)
+        self._order: List[int] = list(download.bitmap.missing())
+        self._tiebreak: List[int] = list(range(download.qtd_chunks))
+        random.shuffle(self._tiebreak)
+        self._version = -1
+        self._built_at = 0.0
+        self.__rebuild()
+
+    def __rebuild(self):
+        availability, tiebreak = self.download.availability, self._tiebreak
+        self._order.sort(key=lambda i: (availability[i], tiebreak[i]))
+        self._version = self.download.have_version
+        self._built_at = time()
+
+    def has_pending(self) -> bool:
+        return len(self._retry) > 0 or len(self._order) > 0
+
+    def can_serve(self, peer_address: str) -> bool:
+        if any(self.download.has(peer_address, index) for index in self._order):
+            return True
+        return self._can_retry(peer_address=peer_address)
+
+    def next_chunk(self, peer_address: str) -> Optional[int]:
+        index = self._pop_retry(peer_address=peer_address)
+        if index is not None:
+            return index
+
+        if self._version != self.download.have_version and time() - self._built_at >= self.REBUILD_INTERVAL:
+            self.__rebuild()
+
+        for position, index in enumerate(self._order):
+            if self.download.has(peer_address, index):
+                del self._order[position]
+                return index
+        return None
+
+
+SCHEDULERS: Dict[str, Type[Scheduler]] = {
+    "round-robin": RoundRobinScheduler,
+    "throughput": ThroughputScheduler,
+    "work-stealing": WorkStealingScheduler,
+    "rarest-first": RarestFirstScheduler,
+}
@@ -1,21 +1,56 @@
 import os
-import math
-from typing import Dict, Optional, List, Tuple
+import json
+from typing import Dict, Optional, List, Tuple, Union
+from multiprocessing.connection import Connection
 from socket import socket, AF_INET, SOCK_STREAM, SOL_SOCKET, SO_REUSEADDR
-from threading import Thread, Lock
+from concurrent.futures import ThreadPoolExecutor
+from threading import Thread, Lock, Condition
 from pathlib import Path
-from time import sleep, time
+from time import time
 from base64 import b64encode, b64decode
+from uuid import uuid4
 
+from src.models.async_engine import AsyncEngine
 from src.models.buffer import Buffer
 from src.models.clock import Clock
+from src.models.compression import CODECS, Codec, choose_codec, decompress
+from src.models.dht import DHT
+from src.models.download_manager import DownloadManager
 from src.models.peer import Peer, PeerStatus
 from src.models.file import File
+from src.models.file_pool import FilePool
+from src.models.frame import Frame, HEADER, TYPE_BY_ACTION, PROTOCOL_VERSION, BINARY_PROTOCOL
+from src.models.index import SharedIndex, is_internal, is_valid_name, matches
+from src.models.logger import logger
+from src.models.membership import Membership
+from src.models.merkle import DIGEST_SIZE
 from src.models.message import Message
+from src.models.metrics import Metrics
+from src.models.swarm import Swarm
+from src.models.uploads import UploadScheduler
+from src.models.workers import ServingWorkers, SO_REUSEPORT
 from src.utils import encode, decode, draw_row
 from src.exceptions.InvalidDirectoryException import InvalidDirectoryException
 
 
+# Cursor da última página de uma busca (um "%" isolado nunca aparece em um nome codificado)
+END_CURSOR = "%"
+
+
+def parse_listed_file(item: str) -> Tuple[str, int, Optional[str], Optional[str]]:
+    """
+    Interpreta um arquivo das respostas LS_INDEX e SEARCH_RESULT, no formato
+    "<nome>:<tamanho>:<hash>[:<raiz de Merkle>]" (peers anteriores à raiz de
+    Merkle não a enviam). O nome vem codificado e nunca contém ":".
+
+    Returns:
+        Tuple[str, int, Optional[str], Optional[str]]: (nome, tamanho, hash, raiz).
+    """
+    name, size, hash, *rest = item.strip().split(":")
+    root = rest[0] if len(rest) > 0 and rest[0] != "None" else None
+    return decode(name), int(size), hash, root
+
+
 class Server():
     host: str
     port: int
@@ -23,10 +58,63 @@ class Server():
     _app: socket
     _clock: Clock
     chunk_size: int = 256
+    use_sendfile: bool = True
+    window_size: int = 8
+    max_window_size: int = 256
+    adaptive_window: bool = True
+    scheduler: str = "throughput"
+    engine: str = "threads"
+    # Tempo máximo de espera pela resposta de cada peer na busca de arquivos
+    discovery_timeout: float = 2.0
+    # Tempo máximo total da busca de arquivos
+    discovery_deadline: float = 5.0
+    # Conexões de dados pedidas a cada peer para receber chunks (0 = só a conexão de controle)
+    data_streams: int = 1
+    # Máximo de conexões de dados aceitas de um peer
+    max_data_streams: int = 8
+    # Comprime os chunks enviados a peers que negociaram um codec (mensagem CODECS)
+    compression: bool = True
+    # Tempo máximo de espera pela resposta PEER_LIST de cada sondagem
+    probe_timeout: float = 2.0
+    # Quantidade de threads usadas para contatar vários peers em paralelo
+    fanout_workers: int = 256
+    # Tempo máximo de espera pela resposta de uma consulta STATS
+    stats_timeout: float = 2.0
+    # Intervalo entre as rodadas de gossip da lista de peers (0 = desligado)
+    gossip_interval: float = 5.0
+    # Quantidade de peers consultados em cada rodada de gossip
+    gossip_fanout: int = 3
+    # A cada quantas rodadas um peer é consultado desde a versão 0 (anti-entropia)
+    anti_entropy_rounds: int = 10
+    # Quantidade máxima de arquivos em cada página da resposta SEARCH_RESULT
+    search_page_size: int = 100
+    # Quantidade máxima de resultados pedidos a cada peer em uma busca
+    search_max_results: int = 1000
+    # Busca arquivos pela DHT em vez de pedir a listagem (LS) a todos os peers
+    use_dht: bool = False
+    # Tempo máximo de espera pela resposta de cada consulta da DHT
+    dht_timeout: float = 1.0
+    # Intervalo entre as republicações dos arquivos na DHT
+    dht_republish_interval: float = 600.0
+    # Troca chunks com outros peers que baixam o mesmo arquivo (modo enxame)
+    use_swarm: bool = False
+    # Pede em duplicata a outro peer os últimos chunks em andamento (endgame)
+    hedging: bool = True
+    # Threads que enviam os chunks pedidos (0 = envia na thread da conexão, sem escalonamento)
+    upload_workers: int = 2
+    # Taxa máxima de envio de chunks, em bytes por segundo (0 = sem limite)
+    upload_rate: float = 0
+    # Taxa máxima de envio de chunks para cada peer, em bytes por segundo (0 = sem limite)
+    peer_upload_rate: float = 0
+    # Processos extras que atendem conexões na mesma porta (SO_REUSEPORT); 0 = só este processo
+    serving_workers: int = 0
     peers: Dict[str, Peer]
     state: Dict[str, any]
+    file_pool: FilePool
+    metrics: Metrics
 
-    def __init__(self, host: str = "0.0.0.0", port: int = 19000, shared_dir: str = ".", peers: Optional[Dict[str, Peer]] = None):
+    def __init__(self, host: str = "0.0.0.0", port: int = 19000, shared_dir: str = ".", peers: Optional[Dict[str, Peer]] = None,
+                 max_downloads: int = 4, parent: Optional[Connection] = None):
         """
         Inicializa o servidor com o endereço e porta especificados.
 
@@ -35,6 +123,9 @@ class Server():
             port (int): Porta para escutar (default: 19000).
             shared_dir (str): Caminho do diretório compartilhado (default: pasta atual).
             peers (Optional[Dict[str, Peer]]): Mapa inicial de peers conhecidos.
+            max_downloads (int): Quantidade máxima de downloads simultâneos (default: 4).
+            parent (Optional[Connection]): Pipe para o processo principal, quando este
+                servidor é um worker (ver ServingWorkers).
         """
         super().__init__()
         self.host = host
@@ -45,18 +136,63 @@ class Server():
         self.peers = peers
         self._app = socket(AF_INET, SOCK_STREAM)
         self._clock = Clock()
-        self.state = {"peer_locks": {}, "stats": {}}
+        self._engine = None
+        self.state = {"peer_locks": {}, "stats": {}, "ls_cache": {}, "remote_stats": {},
+                      "transfer": {"sent_raw": 0, "sent": 0, "received_raw": 0, "received": 0}}
+        self._transfer_lock = Lock()
+        self.metrics = Metrics()
+        self.metrics.gauge("buffered_bytes", Buffer.buffered)
+        self.downloads = DownloadManager(
+            server=self, max_concurrent=max_downloads)
 
         self.load_shared_dir()
+        self.index = SharedIndex(shared_dir=shared_dir)
+        # Nos workers, apenas o processo principal varre a pasta e salva o índice
+        if parent is None:
+            self.index.start()
+        else:
+            self.index.follow()
+        self.file_pool = FilePool()
+        self._fanout = ThreadPoolExecutor(max_workers=self.fanout_workers)
+        self._ls_cond = Condition()
+        self._probe_cond = Condition()
+        self._probes: Dict[str, float] = {}
+        self._stats_cond = Condition()
+        self._search_cond = Condition()
+        self.membership = Membership(server=self)
+        self.dht = DHT(server=self)
+        self.swarm = Swarm(server=self)
+        self.uploads = UploadScheduler(server=self)
+        self.metrics.gauge("upload_queued", self.uploads.queued)
+        self.workers = ServingWorkers(server=self, parent=parent)
+        self.metrics.gauge("file_pool_open", lambda: self.file_pool.stats()["open"])
 
     def listen(self):
         """
         Inicia o servidor TCP, escutando conexões na porta configurada.
-        Cada conexão recebida é processada em uma nova thread.
+
+        Com a engine "threads" (padrão), cada conexão recebida é processada em
+        uma nova thread. Com a engine "asyncio", todas as conexões são lidas por
+        um único event loop (ver AsyncEngine).
+
+        Com `serving_workers` maior que 0, outros processos passam a aceitar
+        conexões na mesma porta e a atender os pedidos de chunks (ver ServingWorkers).
         """
         self._app.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)
+        if self.workers.reuse_port():
+            self._app.setsockopt(SOL_SOCKET, SO_REUSEPORT, 1)
         self._app.bind((self.host, self.port))
         self._app.listen()
+        if not self.workers.is_worker:
+            self.membership.start()
+            if self.use_dht:
+                self.dht.start()
+            self.workers.start()
+
+        if self.engine == "asyncio":
+            self._engine = AsyncEngine(server=self)
+            self._engine.run()
+            return
 
         while True:
             try:
@@ -75,141 +211,386 @@ class Server():
         Args:
             conn (socket): Socket da conexão com o peer.
         """
-        while True:
-            data = Buffer.readuntil(sock=conn, buffer_size=self.chunk_size)
-            if data is None:
-                continue
-
-            message = Message(data=data)
-
-            self._clock.count = max(message.clock, self._clock.count)
-
-            self._clock.increment()
-
-            sender = f"{message.host}:{message.port}"
-
-            if sender not in self.peers:
-                self.peers[sender] = Peer(
-                    host=message.host, port=message.port)
-
-            self.peers[sender].clock.update(new_clock=message.clock)
-
-            if sender not in self.state["peer_locks"]:
-                self.state["peer_locks"][sender] = Lock()
+        self.metrics.add("connections_active", 1)
+        try:
+            while True:
+                data = Buffer.readmessage(sock=conn, buffer_size=self.chunk_size)
+                if data is None:
+                    # Conexão encerrada pelo peer
+                    break
+
+                if not self.handle_message(data=data):
+                    break
+        finally:
+            self.metrics.add("connections_active", -1)
+            Buffer.release(sock=conn)
+            conn.close()
+
+    def handle_message(self, data: Union[bytes, Frame]) -> bool:
+        """
+        Interpreta uma mensagem recebida e executa a resposta apropriada.
+        Usado tanto pela engine de threads quanto pela engine asyncio.
 
-            if message.action == "GET_PEERS":
-                self.peers[sender].change_status(
-                    new_status=PeerStatus.Online)
-                print(f"Mensagem recebida {data.decode()}")
+        Args:
+            data (Union[bytes, Frame]): Mensagem textual ou frame binário recebido.
 
-                # Responde com a lista de peers conhecidos, exceto ele mesmo
-                filtered_peers = list(filter(
-                    lambda x: f"{x.host}:{x.port}" != sender, self.peers.values()))
-                print(filtered_peers)
-                if len(filtered_peers) > 0:
-                    peers_str = " ".join(
-                        f"{p.host}:{p.port}:{p.status}:{p.clock.count}" for p in filtered_peers
-                    )
-                    reply = f"PEER_LIST {len(filtered_peers)} {peers_str}"
-                    self.send_message(
-                        peer=self.peers[sender], message=reply)
-                    print("Resposta enviada")
-
-            elif message.action == "PEER_LIST":
-                self.peers[sender].change_status(
-                    new_status=PeerStatus.Online)
-                print(f"Resposta recebida {data.decode()}")
-
-                # Atualiza a lista de peers com os recebidos
-                peers_list = message.args[1:]
-                for item in peers_list:
-                    (host, port, status, clock_n) = item.split(":")
-                    key = f"{host}:{port}"
-                    if key not in self.peers:
-                        self.peers[key] = Peer(
-                            host=host, port=int(port), status=status)
-
-                    ok = self.peers[key].clock.update(
-                        new_clock=int(clock_n))
-                    if ok:
-                        self.peers[key].change_status(
-                            new_status=PeerStatus.from_string(status))
-
-            elif message.action == "LS":
-                self.peers[sender].change_status(
-                    new_status=PeerStatus.Online)
-                print(f"Mensagem recebida {data.decode()}")
+        Returns:
+            bool: False se a conexão deve ser encerrada (mensagem BYE).
+        """
+        # Em um worker, só os pedidos de leitura da pasta compartilhada são tratados aqui
+        if self.workers.is_worker and not self.workers.route(data):
+            return True
 
+        payload = None
+        if isinstance(data, Frame):
+            size = HEADER.size + len(data.meta) + len(data.payload)
+            data, payload = data.meta, self.__decompress(frame=data)
+        else:
+            size = len(data)
+
+        message = Message(data=data, payload=payload)
+        self.metrics.inc("messages_in", action=message.action)
+        self.metrics.inc("bytes_in", size, action=message.action)
+
+        self._clock.count = max(message.clock, self._clock.count)
+
+        self._clock.increment()
+
+        sender = f"{message.host}:{message.port}"
+
+        if sender not in self.peers:
+            self.peers[sender] = Peer(
+                host=message.host, port=message.port)
+
+        self.peers[sender].clock.update(new_clock=message.clock)
+
+        if sender not in self.state["peer_locks"]:
+            self.state["peer_locks"][sender] = Lock()
+
+        if message.action == "PROTO":
+            # Negocia a versão do protocolo: usa a maior versão suportada por ambos
+            version = int(message.args[0]) if message.args else 1
+            self.peers[sender].protocol = min(version, PROTOCOL_VERSION)
+            # Conexões de dados pedidas pelo peer para os chunks enviados a ele
+            if len(message.args) > 1 and self.peers[sender].protocol >= BINARY_PROTOCOL:
+                self.peers[sender].set_streams(
+                    streams=min(int(message.args[1]), self.max_data_streams))
+            # Uma nova conexão negocia a compressão novamente (peers antigos não enviam CODECS)
+            self.peers[sender].codec = None
+
+        elif message.action == "CODECS":
+            # Codecs aceitos pelo peer, em ordem de preferência
+            if self.peers[sender].protocol >= BINARY_PROTOCOL:
+                self.peers[sender].codec = choose_codec(
+                    names=message.args[0].split(",") if message.args else [])
+
+        elif message.action == "GET_PEERS":
+            self.peers[sender].change_status(
+                new_status=PeerStatus.Online)
+            logger.info(f"Mensagem recebida {data.decode()}")
+
+            # Peers com gossip enviam a versão da tabela que já conhecem e recebem só as mudanças
+            if len(message.args) > 0:
+                version, changed = self.membership.delta(
+                    since=int(message.args[0]), exclude=sender)
+                self.send_message(peer=self.peers[sender],
+                                  message=f"PEER_DELTA {version} {len(changed)} {' '.join(changed)}".rstrip())
+                return True
+
+            # Responde com a lista de peers conhecidos, exceto ele mesmo
+            filtered_peers = list(filter(
+                lambda x: f"{x.host}:{x.port}" != sender, self.peers.values()))
+            logger.debug(filtered_peers)
+            # Responde mesmo sem peers, para que o remetente meça a latência da sondagem
+            peers_str = " ".join(
+                f"{p.host}:{p.port}:{p.status}:{p.clock.count}" for p in filtered_peers
+            )
+            reply = f"PEER_LIST {len(filtered_peers)} {peers_str}".rstrip()
+            self.send_message(
+                peer=self.peers[sender], message=reply)
+            logger.info("Resposta enviada")
+
+        elif message.action == "PEER_LIST":
+            self.peers[sender].change_status(
+                new_status=PeerStatus.Online)
+            logger.info(f"Resposta recebida {data.decode()}")
+            self.__observe_probe(sender=sender)
+
+            # Atualiza a lista de peers com os recebidos
+            peers_list = message.args[1:]
+            for item in peers_list:
+                (host, port, status, clock_n) = item.split(":")
+                key = f"{host}:{port}"
+                if key not in self.peers:
+                    self.peers[key] = Peer(
+                        host=host, port=int(port), status=status)
+
+                ok = self.peers[key].clock.update(
+                    new_clock=int(clock_n))
+                if ok:
+                    self.peers[key].change_status(
+                        new_status=PeerStatus.from_string(status))
+
+        elif message.action == "PEER_DELTA":
+            self.peers[sender].change_status(
+                new_status=PeerStatus.Online)
+            logger.debug("Resposta recebida %s %s", message, message.args)
+            self.__observe_probe(sender=sender)
+
+            count = int(message.args[1])
+            self.membership.merge(sender=sender, version=int(message.args[0]),
+                                  items=message.args[2:2 + count])
+
+        elif message.action == "LS":
+            self.peers[sender].change_status(
+                new_status=PeerStatus.Online)
+            logger.info(f"Mensagem recebida {data.decode()}")
+
+            # Peers antigos enviam "LS" sem a versão e recebem a listagem original
+            if len(message.args) == 0:
                 files = self.get_shared_files()
                 files_str = f"LS_LIST {len(files)} " + \
                     " ".join(f"{encode(x[0])}:{x[1]}" for x in files)
                 self.send_message(
                     peer=self.peers[sender], message=files_str)
+            elif int(message.args[0]) == self.index.version:
+                self.send_message(
+                    peer=self.peers[sender], message=f"LS_SAME {self.index.version}")
+            else:
+                entries = self.index.files()
+                files_str = f"LS_INDEX {self.index.version} {len(entries)} " + \
+                    " ".join(f"{encode(e.name)}:{e.size}:{e.hash}:{e.root}" for e in entries)
+                self.send_message(
+                    peer=self.peers[sender], message=files_str)
 
-            elif message.action == "LS_LIST":
-                print(f"Resposta recebida {data.decode()}")
-
-                files = []
-                if int(message.args[0]) > 0:
-                    for data in message.args[1:]:
-                        splited = data.strip().split(":")
-                        name, size = decode(
-                            ":".join(splited[0:-1])), int(splited[-1])
-                        files.append((name, size))
-
-                if "LS" not in self.state:
-                    self.state["LS"] = {}
-
-                self.state["LS"][f"{sender}"] = files
-
-            elif message.action == "DL":
-                print(f"Mensagem recebida {data.decode()}")
-
-                file_name, chunk_size, chunk_index = message.args[0], int(
-                    message.args[1]), int(message.args[2])
-                decoded_file_name = decode(file_name)
-                location = Path(self.shared_dir, decoded_file_name)
-                with open(location, mode="rb+") as arq:
-                    arq.seek(chunk_index * chunk_size)
-                    data = arq.read(chunk_size)
+        elif message.action == "LS_LIST":
+            logger.info(f"Resposta recebida {data.decode()}")
+
+            files = []
+            if int(message.args[0]) > 0:
+                for data in message.args[1:]:
+                    splited = data.strip().split(":")
+                    name, size = decode(
+                        ":".join(splited[0:-1])), int(splited[-1])
+                    files.append((name, size, None, None))
+
+            self.__store_listing(sender=sender, files=files)
+
+        elif message.action == "LS_INDEX":
+            logger.info(f"Resposta recebida {data.decode()}")
+
+            version, files = int(message.args[0]), []
+            if int(message.args[1]) > 0:
+                for data in message.args[2:]:
+                    files.append(parse_listed_file(data))
+
+            self.state["ls_cache"][sender] = (version, files)
+            self.__store_listing(sender=sender, files=files)
+
+        elif message.action == "LS_SAME":
+            logger.info(f"Resposta recebida {data.decode()}")
+
+            # A listagem não mudou desde a última consulta: usa o cache
+            _, files = self.state["ls_cache"].get(sender, (None, []))
+            self.__store_listing(sender=sender, files=files)
+
+        elif message.action == "SEARCH":
+            self.peers[sender].change_status(
+                new_status=PeerStatus.Online)
+            logger.info(f"Mensagem recebida {data.decode()}")
+
+            query_id, pattern = message.args[0], decode(message.args[1])
+            min_size, max_size = int(message.args[2]), int(message.args[3])
+            cursor = decode(message.args[5]) if len(message.args) > 5 else ""
+            # Pede um resultado a mais para saber se existe uma próxima página
+            found = self.index.search(pattern=pattern, min_size=min_size,
+                                      max_size=max_size if max_size >= 0 else None,
+                                      recursive=message.args[4] == "1", after=cursor,
+                                      limit=self.search_page_size + 1)
+            page = found[:self.search_page_size]
+            next_cursor = encode(page[-1].name) if len(found) > len(page) else END_CURSOR
+            self.send_message(
+                peer=self.peers[sender],
+                message=f"SEARCH_RESULT {query_id} {next_cursor} {len(page)} " +
+                        " ".join(f"{encode(e.name)}:{e.size}:{e.hash}:{e.root}" for e in page))
+
+        elif message.action == "SEARCH_RESULT":
+            logger.info(f"Resposta recebida {' '.join(data.decode().split(' ')[:6])}")
+
+            query_id, cursor, count = message.args[0], message.args[1], int(message.args[2])
+            files = []
+            for item in message.args[3:3 + count]:
+                file = parse_listed_file(item)
+                if is_valid_name(file[0]):
+                    files.append(file)
+            self.__store_page(sender=sender, query_id=query_id, cursor=cursor, files=files)
+
+        elif message.action == "DL":
+            file_name, chunk_size, chunk_index = message.args[0], int(
+                message.args[1]), int(message.args[2])
+            logger.debug("Mensagem recebida %s %s %d %d", message, file_name, chunk_size, chunk_index)
+            decoded_file_name = decode(file_name)
+            if not is_valid_name(decoded_file_name):
+                logger.warning(f"Pedido de {sender} fora da pasta compartilhada recusado: {decoded_file_name}")
+                return True
+            # Índice, arquivos temporários e journals não são compartilhados
+            if is_internal(decoded_file_name.rsplit("/", 1)[-1]):
+                logger.warning(f"Pedido de {sender} por arquivo interno recusado: {decoded_file_name}")
+                return True
+            location = Path(self.shared_dir, decoded_file_name)
+
+            # Devolve o id do download quando o peer o enviou
+            download_id = f" {message.args[3]}" if len(message.args) > 3 else ""
+            reply = f"FILE {file_name} {chunk_size} {chunk_index}{download_id}"
+
+            # Arquivo ainda em download: o chunk é lido do arquivo temporário, se já foi recebido
+            partial = None
+            if not location.is_file():
+                # Os downloads em andamento ficam no processo principal
+                if self.workers.is_worker:
+                    self.workers.forward(data)
+                    return True
+                partial = self.swarm.read_chunk(
+                    name=decoded_file_name, chunk_size=chunk_size, index=chunk_index)
+                # O download pode ter acabado de ser concluído e renomeado
+                if partial is None and not location.is_file():
+                    self.send_message(peer=self.peers[sender],
+                                      message=f"MISSING {file_name} {chunk_size} {chunk_index}{download_id}")
+                    return True
+                if partial is not None:
+                    self.metrics.inc("chunks_served_partial")
+
+            # O envio é feito pelo escalonador de upload, e a conexão segue lendo as próximas mensagens
+            def send():
+                codec = self.peers[sender].codec if self.compression else None
+                if partial is None and self.peers[sender].protocol >= BINARY_PROTOCOL and codec is not None:
+                    # Arquivos compressíveis são lidos e comprimidos; os demais seguem sem compressão
+                    with self.file_pool.open(location) as pooled:
+                        if pooled.compressible(codec=codec):
+                            self.send_frame(peer=self.peers[sender], message=reply, chunk_index=chunk_index,
+                                            payload=pooled.read(offset=chunk_index * chunk_size, count=chunk_size),
+                                            stream=chunk_index, codec=codec)
+                            return
+
+                if partial is None and self.peers[sender].protocol >= BINARY_PROTOCOL and self.use_sendfile:
+                    self.send_file_frame(peer=self.peers[sender], message=reply, location=location,
+                                         chunk_index=chunk_index, chunk_size=chunk_size, stream=chunk_index)
+                    return
+
+                data = partial if partial is not None else self.file_pool.read(
+                    path=location, offset=chunk_index * chunk_size, count=chunk_size)
+
+                if self.peers[sender].protocol >= BINARY_PROTOCOL:
+                    self.send_frame(peer=self.peers[sender], message=reply,
+                                    chunk_index=chunk_index, payload=data, stream=chunk_index, codec=codec)
+                else:
                     b64chunk = b64encode(data).decode("utf-8")
                     self.send_message(
-                        peer=self.peers[sender], message=f"FILE {file_name} {chunk_size} {chunk_index} {b64chunk}")
-
-            elif message.action == "FILE":
-                print(f"Resposta recebida {data.decode()}")
-                file_name, chunk_size, chunk_index, b64chunk = message.args[0], int(
-                    message.args[1]), int(message.args[2]), message.args[3]
-                chunk_data = b64decode(b64chunk)
-
-                temp_file = self.state["temp_file"]
-                temp_file["data"][chunk_index] = chunk_data
-                temp_file["downloaded"] += 1
-
-                if temp_file["qtd_chunks"] == temp_file["downloaded"]:
-                    key = (temp_file["chunk_size"],
-                           temp_file["peers"], temp_file["file_size"])
-                    if key not in self.state["stats"]:
-                        self.state["stats"][key] = []
-                    self.state["stats"][key].append(
-                        time() - temp_file["started_at"])
-
-                    decoded_file_name = decode(file_name)
-                    location = Path(self.shared_dir, decoded_file_name)
-                    with open(location, mode="wb") as arq:
-                        for index in range(temp_file["qtd_chunks"]):
-                            arq.write(temp_file["data"][index])
-
-                        temp_file.clear()
-                        print(
-                            f"Download do arquivo {decoded_file_name} finalizado.")
-
-            elif message.action == "BYE":
-                # Marca o peer como offline
-                print(f"Mensagem recebida: {data.decode()}")
-                self.peers[sender].change_status(
-                    new_status=PeerStatus.Offline)
-                break
+                        peer=self.peers[sender], message=f"{reply} {b64chunk}")
+
+            self.uploads.submit(peer_address=sender, size=chunk_size, send=send)
+
+        elif message.action == "FILE":
+            file_name, chunk_size, chunk_index = message.args[0], int(
+                message.args[1]), int(message.args[2])
+            # Só o cabeçalho: o conteúdo do chunk nunca vai para o log
+            logger.debug("Resposta recebida %s %s %d %d", message, file_name, chunk_size, chunk_index)
+            if message.payload is not None:
+                chunk_data = message.payload
+                extra = message.args[3:]
+            else:
+                chunk_data = b64decode(message.args[-1])
+                extra = message.args[3:-1]
+
+            # Peers antigos não devolvem o id do download
+            download_id = extra[0] if len(extra) > 0 else None
+            self.downloads.on_chunk(download_id=download_id, name=decode(file_name), chunk_size=chunk_size,
+                                    chunk_index=chunk_index, data=chunk_data, peer_address=sender)
+
+        elif message.action == "MISSING":
+            file_name, chunk_size, chunk_index = message.args[0], int(
+                message.args[1]), int(message.args[2])
+            logger.debug("Resposta recebida %s %s %d %d", message, file_name, chunk_size, chunk_index)
+            download_id = message.args[3] if len(message.args) > 3 else None
+            self.downloads.on_missing(download_id=download_id, name=decode(file_name), chunk_size=chunk_size,
+                                      chunk_index=chunk_index, peer_address=sender)
+
+        elif message.action == "BITFIELD":
+            self.peers[sender].change_status(
+                new_status=PeerStatus.Online)
+            logger.debug("Mensagem recebida %s %s", message, message.args[:3])
+            self.swarm.handle_bitfield(sender=sender, args=message.args)
+
+        elif message.action == "HAVE":
+            logger.debug("Mensagem recebida %s %s", message, message.args[:3])
+            self.swarm.handle_have(sender=sender, args=message.args)
+
+        elif message.action == "SWARM":
+            logger.info(f"Resposta recebida {data.decode()}")
+            self.swarm.handle_swarm(sender=sender, args=message.args)
+
+        elif message.action == "HASHES":
+            file_name, chunk_size, download_id = message.args[0], int(
+                message.args[1]), message.args[2]
+            logger.debug("Mensagem recebida %s %s %d %s", message, file_name, chunk_size, download_id)
+            # Raiz "-" indica que o arquivo não está mais disponível
+            root, digests = self.index.chunk_hashes(
+                name=decode(file_name), chunk_size=chunk_size) or ("-", [])
+            reply = f"HASH_LIST {file_name} {chunk_size} {download_id} {root} {len(digests)}"
+
+            if self.peers[sender].protocol >= BINARY_PROTOCOL:
+                self.send_frame(peer=self.peers[sender], message=reply,
+                                chunk_index=0, payload=b"".join(digests))
+            else:
+                self.send_message(peer=self.peers[sender],
+                                  message=" ".join([reply] + [d.hex() for d in digests]))
+
+        elif message.action == "HASH_LIST":
+            download_id, root, count = message.args[2], message.args[3], int(
+                message.args[4])
+            logger.debug("Resposta recebida %s %s %d hashes", message, download_id, count)
+            if message.payload is not None:
+                digests = [message.payload[i:i + DIGEST_SIZE]
+                           for i in range(0, count * DIGEST_SIZE, DIGEST_SIZE)]
+            else:
+                digests = [bytes.fromhex(d) for d in message.args[5:5 + count]]
+            self.downloads.on_hashes(
+                download_id=download_id, root=root, digests=digests)
+
+        elif message.action == "STATS":
+            logger.info(f"Mensagem recebida {data.decode()}")
+            self.send_message(peer=self.peers[sender],
+                              message=f"STATS_REPLY {encode(self.metrics.to_json())}")
+
+        elif message.action == "STATS_REPLY":
+            logger.info(f"Resposta recebida de {sender}: STATS_REPLY")
+            with self._stats_cond:
+                self.state["remote_stats"][sender] = json.loads(decode(message.args[0]))
+                self._stats_cond.notify_all()
+
+        elif message.action in ("FIND_NODE", "FIND_VALUE", "STORE"):
+            self.peers[sender].change_status(
+                new_status=PeerStatus.Online)
+            logger.debug("Mensagem recebida %s %s", message, message.args[:2])
+
+            reply = self.dht.handle_request(
+                sender=sender, action=message.action, args=message.args)
+            if reply is not None:
+                self.send_message(peer=self.peers[sender], message=reply)
+
+        elif message.action in ("NODES", "VALUES"):
+            logger.debug("Resposta recebida %s %s", message, message.args[:2])
+            self.dht.handle_reply(
+                sender=sender, action=message.action, args=message.args)
+
+        elif message.action == "BYE":
+            # Marca o peer como offline
+            logger.info(f"Mensagem recebida: {data.decode()}")
+            self.peers[sender].change_status(
+                new_status=PeerStatus.Offline)
+            return False
+
+        return True
 
     def shutdown(self):
         """
@@ -226,6 +607,17 @@ class Server():
         """
         Fecha o socket principal do servidor, encerrando o loop de escuta.
         """
+        self.index.stop()
+        self.membership.stop()
+        self.dht.stop()
+        self.swarm.stop()
+        self.uploads.stop()
+        self.workers.stop()
+        self.file_pool.clear()
+        self._fanout.shutdown(wait=False)
+        if self._engine is not None:
+            self._engine.stop()
+
         try:
             self._app.close()
         except:
@@ -255,63 +647,466 @@ class Server():
             bool: True se enviado com sucesso, False caso contrário.
         """
         try:
-            if peer.conn is None:
-                peer.connect()
+            self.__ensure_connected(peer=peer)
 
             self._clock.increment()
             m = f"{self.host}:{self.port} {self._clock.count} {message}"
             peer.send_message(message=m)
+            self.__count_message(action=message.split(" ")[0], size=len(m))
             return True
         except Exception:
             return False
 
+    def send_frame(self, peer: Peer, message: str, chunk_index: int, payload: bytes,
+                   stream: Optional[int] = None, codec: Optional[Codec] = None) -> bool:
+        """
+        Envia uma mensagem como frame binário (cabeçalho fixo + payload cru),
+        disponível apenas para peers que negociaram o protocolo binário.
+
+        Args:
+            peer (Peer): Peer de destino.
+            message (str): Ação e argumentos textuais (ex: "FILE <nome> <tamanho> <índice>").
+            chunk_index (int): Índice do chunk transportado.
+            payload (bytes): Conteúdo binário do chunk.
+            stream (Optional[int]): Conexão de dados a usar (None = conexão de controle).
+            codec (Optional[Codec]): Codec para comprimir o payload. O payload só
+                é enviado comprimido se ficar menor.
+
+        Returns:
+            bool: True se enviado com sucesso, False caso contrário.
+        """
+        try:
+            self.__ensure_connected(peer=peer)
+
+            flags, raw_size = 0, len(payload)
+            if codec is not None:
+                compressed = codec.compress(payload)
+                if len(compressed) < raw_size:
+                    flags, payload = codec.id, compressed
+            self.__count_transfer(direction="sent", raw=raw_size, wire=len(payload))
+
+            self._clock.increment()
+            meta = f"{self.host}:{self.port} {self._clock.count} {message}".encode()
+            frame = Frame(type=TYPE_BY_ACTION[message.split(" ")[0]], clock=self._clock.count,
+                          chunk_index=chunk_index, meta=meta, payload=payload, flags=flags)
+            encoded = frame.encode()
+            peer.send_frame(frame=encoded, stream=stream)
+            self.__count_message(action=frame.action, size=len(encoded))
+            return True
+        except Exception:
+            return False
+
+    def send_file_frame(self, peer: Peer, message: str, location: Path, chunk_index: int, chunk_size: int,
+                        stream: Optional[int] = None) -> bool:
+        """
+        Envia um chunk de arquivo como frame binário sem copiá-lo para o Python:
+        o cabeçalho é enviado normalmente e os bytes do chunk seguem direto do
+        page cache para o socket via sendfile.
+
+        Args:
+            peer (Peer): Peer de destino (precisa ter negociado o protocolo binário).
+            message (str): Ação e argumentos textuais (ex: "FILE <nome> <tamanho> <índice>").
+            location (Path): Caminho do arquivo servido.
+            chunk_index (int): Índice do chunk.
+            chunk_size (int): Tamanho do chunk em bytes.
+            stream (Optional[int]): Conexão de dados a usar (None = conexão de controle).
+
+        Returns:
+            bool: True se enviado com sucesso, False caso contrário.
+        """
+        try:
+            self.__ensure_connected(peer=peer)
+
+            with self.file_pool.open(location) as pooled:
+                offset = chunk_index * chunk_size
+                count = max(0, min(chunk_size, pooled.size - offset))
+
+                self._clock.increment()
+                meta = f"{self.host}:{self.port} {self._clock.count} {message}".encode()
+                header = Frame.pack_header(type=TYPE_BY_ACTION[message.split(" ")[0]], clock=self._clock.count,
+                                           chunk_index=chunk_index, meta=meta, payload_size=count)
+                peer.send_file(header=header, file=pooled.file,
+                               offset=offset, count=count, stream=stream)
+                self.__count_transfer(direction="sent", raw=count, wire=count)
+                self.__count_message(action=message.split(" ")[0], size=len(header) + count)
+            return True
+        except Exception:
+            return False
+
+    def __decompress(self, frame: Frame) -> bytes:
+        payload = decompress(flags=frame.flags, payload=frame.payload)
+        self.__count_transfer(direction="received", raw=len(payload), wire=len(frame.payload))
+        return payload
+
+    def __count_transfer(self, direction: str, raw: int, wire: int):
+        """
+        Contabiliza os bytes de payload enviados ou recebidos em frames,
+        antes (raw) e depois (wire) da compressão.
+        """
+        with self._transfer_lock:
+            transfer = self.state["transfer"]
+            transfer[f"{direction}_raw"] += raw
+            transfer[direction] += wire
+
+    def __observe_probe(self, sender: str):
+        """
+        Registra a latência da sondagem GET_PEERS respondida pelo peer, se houver uma pendente.
+        """
+        with self._probe_cond:
+            sent_at = self._probes.pop(sender, None)
+            if sent_at is not None:
+                latency = time() - sent_at
+                self.peers[sender].observe_probe(latency=latency)
+                self.metrics.observe("rtt_seconds", latency, peer=sender)
+                self._probe_cond.notify_all()
+
+    def __count_message(self, action: str, size: int):
+        """
+        Contabiliza uma mensagem enviada nas métricas (quantidade e bytes por ação).
+        """
+        self.metrics.inc("messages_out", action=action)
+        self.metrics.inc("bytes_out", size, action=action)
+
+    def query_stats(self, peer: Peer) -> Optional[Dict]:
+        """
+        Consulta as métricas de outro peer (mensagem STATS) e aguarda a
+        resposta STATS_REPLY por até `stats_timeout` segundos.
+
+        Args:
+            peer (Peer): Peer consultado.
+
+        Returns:
+            Optional[Dict]: Snapshot das métricas do peer, ou None se ele não respondeu.
+        """
+        address = f"{peer.host}:{peer.port}"
+        with self._stats_cond:
+            self.state["remote_stats"].pop(address, None)
+
+        if not self.send_message(peer=peer, message="STATS"):
+            return None
+
+        deadline = time() + self.stats_timeout
+        with self._stats_cond:
+            while address not in self.state["remote_stats"] and time() < deadline:
+                self._stats_cond.wait(timeout=deadline - time())
+            return self.state["remote_stats"].get(address)
+
+    def __ensure_connected(self, peer: Peer):
+        """
+        Garante que existe uma conexão aberta com o peer e que a versão
+        de protocolo suportada já foi anunciada nela (mensagem PROTO).
+        Peers antigos ignoram a mensagem e continuam no protocolo textual.
+        """
+        if peer.conn is None:
+            peer.connect()
+
+        if not peer.announced:
+            peer.announced = True
+            self._clock.increment()
+            m = f"{self.host}:{self.port} {self._clock.count} PROTO {PROTOCOL_VERSION} {self.data_streams}"
+            peer.send_message(message=m)
+            self.__count_message(action="PROTO", size=len(m))
+            if self.compression and len(CODECS) > 0:
+                self._clock.increment()
+                m = f"{self.host}:{self.port} {self._clock.count} CODECS {','.join(c.name for c in CODECS)}"
+                peer.send_message(message=m)
+                self.__count_message(action="CODECS", size=len(m))
+
     def find_peers(self):
         """
         Envia a mensagem GET_PEERS para todos os peers conhecidos,
         atualizando o status de cada um como Online/Offline.
+
+        As sondagens são feitas em paralelo por um pool de threads
+        (`fanout_workers`), e cada conexão pode demorar até
+        `Peer.connect_timeout`. As respostas (PEER_LIST, ou PEER_DELTA
+        com apenas as mudanças desde a última consulta) que chegam em até
+        `probe_timeout` segundos registram a latência de cada peer.
         """
         peers_list: List[Peer] = list(self.peers.values())
         print("Buscando peers")
-        for peer in peers_list:
-            ok = self.send_message(peer=peer, message="GET_PEERS")
-            print(
-                f'Encaminhando mensagem "{self.host}:{self.port} {self._clock.count} GET_PEERS" para {peer.host}:{peer.port}')
+
+        def probe(peer: Peer):
+            address = f"{peer.host}:{peer.port}"
+            with self._probe_cond:
+                self._probes[address] = time()
+            # Peers antigos ignoram a versão e respondem com a lista completa (PEER_LIST)
+            ok = self.send_message(peer=peer, message=f"GET_PEERS {self.membership.watermark(address)}")
+            logger.debug('Encaminhando mensagem "%s:%d %d GET_PEERS" para %s',
+                         self.host, self.port, self._clock.count, address)
+            if not ok:
+                with self._probe_cond:
+                    self._probes.pop(address, None)
+                    self._probe_cond.notify_all()
             new_status = PeerStatus.Online if ok is True else PeerStatus.Offline
             peer.change_status(new_status=new_status)
 
+        futures = [self._fanout.submit(probe, peer) for peer in peers_list]
+        for future in futures:
+            future.result()
+
+        # Aguarda as respostas das sondagens enviadas
+        deadline = time() + self.probe_timeout
+        with self._probe_cond:
+            while len(self._probes) > 0 and time() < deadline:
+                self._probe_cond.wait(timeout=deadline - time())
+            self._probes.clear()
+
+        widths = [25, 10, 15]
+        print(draw_row(["Peer", "Status", "Latência[ms]"], widths))
+        for peer in sorted(peers_list, key=lambda p: (p.status != PeerStatus.Online,
+                                                       p.probe_latency if p.probe_latency is not None else float("inf"))):
+            latency = f"{peer.probe_latency * 1000:.2f}" if peer.probe_latency is not None else "-"
+            print(draw_row([f"{peer.host}:{peer.port}", peer.status, latency], widths))
+
     def get_shared_files(self) -> List[Tuple[str, int]]:
         """
-        Obtém uma lista de duplas de arquivos da pasta compartilhada contendo (nome, tamanho em bytes) de cada arquivo
+        Obtém uma lista de duplas de arquivos da pasta compartilhada contendo (nome, tamanho em bytes) de cada arquivo.
+        A lista vem do índice em memória (SharedIndex), sem acessar o disco.
+        """
+        return [(e.name, e.size) for e in self.index.files()]
+
+    def __store_listing(self, sender: str, files: List[Tuple[str, int, Optional[str], Optional[str]]]):
+        """
+        Guarda a listagem de arquivos recebida de um peer para a busca em andamento.
+        Respostas que chegam depois do fim da busca são descartadas.
         """
-        files: List[Tuple[str, int]] = []
-        for file in Path(self.shared_dir).iterdir():
-            if file.is_file():
-                files.append((file.name, file.stat().st_size))
-        return files
+        with self._ls_cond:
+            waiting = self.state.get("LS_waiting", set())
+            if sender not in waiting:
+                return
 
-    def __discover_files(self) -> List[Peer]:
+            waiting.discard(sender)
+            self.state["LS"][sender] = [f for f in files if is_valid_name(f[0])]
+            self._ls_cond.notify_all()
+
+    def __discover_files(self, peers_list: Optional[List[Peer]] = None) -> List[Peer]:
         """
         Descobre arquivos na rede.
 
-        Envia a mensagem "LS" (List Shared) para todos os peers online
-        e aguarda as respostas para preencher o estado local.
+        Envia a mensagem "LS" (List Shared) para todos os peers online em
+        paralelo e aguarda as respostas para preencher o estado local. As
+        respostas são exibidas conforme chegam. Um peer que não responde em
+        `discovery_timeout` segundos após o envio, ou até o fim da busca
+        (`discovery_deadline`), é marcado como offline.
+
+        Args:
+            peers_list (Optional[List[Peer]]): Peers consultados (padrão: todos os peers online).
 
         Returns:
             List[Peer]: Lista de peers online que responderam à solicitação.
         """
-        peers_list = [peer for peer in self.peers.values(
-        ) if peer.status == PeerStatus.Online]
+        if peers_list is None:
+            peers_list = [peer for peer in self.peers.values(
+            ) if peer.status == PeerStatus.Online]
+        deadline = time() + self.discovery_deadline
+        sent_at: Dict[str, float] = {}
+
+        with self._ls_cond:
+            self.state["LS"] = {}
+            self.state["LS_waiting"] = {
+                f"{peer.host}:{peer.port}" for peer in peers_list}
+
+        def request(peer: Peer):
+            address = f"{peer.host}:{peer.port}"
+            # Envia a versão da listagem em cache (-1 se não houver)
+            version, _ = self.state["ls_cache"].get(address, (-1, None))
+            ok = self.send_message(peer=peer, message=f"LS {version}")
+
+            with self._ls_cond:
+                if ok:
+                    sent_at[address] = time()
+                elif address in self.state["LS_waiting"]:
+                    self.state["LS_waiting"].discard(address)
+                    peer.change_status(new_status=PeerStatus.Offline)
+                    print(f"=> Peer {address} inacessível")
+                self._ls_cond.notify_all()
 
         for peer in peers_list:
-            self.send_message(peer=peer, message="LS")
+            self._fanout.submit(request, peer)
+
+        shown = 0
+        with self._ls_cond:
+            while True:
+                listing, waiting = self.state["LS"], self.state["LS_waiting"]
+                for address in list(listing)[shown:]:
+                    shown += 1
+                    print(f"=> {address}: {len(listing[address])} arquivos ({shown}/{len(peers_list)} peers)")
+
+                now = time()
+                expired = [a for a in waiting if a in sent_at and now - sent_at[a] >= self.discovery_timeout]
+                if now >= deadline:
+                    expired = list(waiting)
+                for address in expired:
+                    waiting.discard(address)
+                    self.peers[address].change_status(new_status=PeerStatus.Offline)
+                    print(f"=> Peer {address} não respondeu")
+
+                if len(waiting) == 0:
+                    break
+
+                wake_at = min([deadline] + [sent_at[a] + self.discovery_timeout for a in waiting if a in sent_at])
+                self._ls_cond.wait(timeout=max(0.0, wake_at - now))
+
+        return [self.peers[address] for address in self.state["LS"]]
+
+    def __store_page(self, sender: str, query_id: str, cursor: str,
+                     files: List[Tuple[str, int, str, Optional[str]]]):
+        """
+        Guarda uma página de resultados da busca em andamento e, se houver
+        mais resultados, já pede a próxima página ao peer. Páginas de buscas
+        encerradas são descartadas.
+        """
+        with self._search_cond:
+            search = self.state.get("SEARCH")
+            if search is None or search["id"] != query_id or sender not in search["waiting"]:
+                return
+
+            results = search["results"].setdefault(sender, [])
+            results.extend(files)
+            search["pages"].append((sender, files))
+            more = cursor != END_CURSOR and len(results) < self.search_max_results
+            if more:
+                search["sent_at"][sender] = time()
+            else:
+                search["waiting"].discard(sender)
+            self._search_cond.notify_all()
+
+        if more and not self.send_message(peer=self.peers[sender],
+                                          message=f"SEARCH {query_id} {search['query']} {cursor}"):
+            with self._search_cond:
+                search["waiting"].discard(sender)
+                self._search_cond.notify_all()
+
+    def __search_peers(self, pattern: str, min_size: int = 0, max_size: Optional[int] = None,
+                       recursive: bool = False):
+        """
+        Busca arquivos nos peers online com a mensagem SEARCH, preenchendo
+        self.state["LS"] no mesmo formato da listagem recebida com LS.
 
-        if "LS" not in self.state:
-            self.state["LS"] = {}
+        Cada peer filtra os próprios arquivos e responde em páginas de até
+        `search_page_size` arquivos (SEARCH_RESULT), com um cursor para a
+        próxima página, que é pedida assim que a anterior chega. Os arquivos
+        são exibidos conforme as páginas chegam. Peers que não respondem em
+        `discovery_timeout` segundos, sem ter enviado nenhuma página, são
+        tratados como peers antigos: recebem LS e a listagem é filtrada aqui.
 
-        while len(self.state["LS"]) < len(peers_list):
-            sleep(0.1)
+        Args:
+            pattern (str): Glob ou substring do caminho dos arquivos.
+            min_size (int): Tamanho mínimo em bytes.
+            max_size (Optional[int]): Tamanho máximo em bytes (None = sem limite).
+            recursive (bool): Se True, inclui arquivos das subpastas dos peers.
+        """
+        peers_list = [peer for peer in self.peers.values() if peer.status == PeerStatus.Online]
+        query = f"{encode(pattern or '*')} {min_size} {max_size if max_size is not None else -1} {int(recursive)}"
+        deadline = time() + self.discovery_deadline
+
+        with self._search_cond:
+            search = {"id": uuid4().hex[:8], "query": query, "results": {}, "pages": [], "sent_at": {},
+                      "waiting": {f"{peer.host}:{peer.port}" for peer in peers_list}}
+            self.state["SEARCH"] = search
+
+        def request(peer: Peer):
+            address = f"{peer.host}:{peer.port}"
+            ok = self.send_message(peer=peer, message=f"SEARCH {search['id']} {query}")
+
+            with self._search_cond:
+                if ok:
+                    search["sent_at"].setdefault(address, time())
+                elif address in search["waiting"]:
+                    search["waiting"].discard(address)
+                    peer.change_status(new_status=PeerStatus.Offline)
+                    print(f"=> Peer {address} inacessível")
+                self._search_cond.notify_all()
 
-        return peers_list
+        for peer in peers_list:
+            self._fanout.submit(request, peer)
+
+        silent, shown = [], 0
+        with self._search_cond:
+            while True:
+                for address, files in search["pages"][shown:]:
+                    shown += 1
+                    for name, size, _, _ in files:
+                        print(f"=> {address}: {name} ({size} bytes)")
+
+                waiting, sent_at, now = search["waiting"], search["sent_at"], time()
+                expired = [a for a in waiting if a in sent_at and now - sent_at[a] >= self.discovery_timeout]
+                if now >= deadline:
+                    expired = list(waiting)
+                for address in expired:
+                    waiting.discard(address)
+                    if address not in search["results"]:
+                        silent.append(self.peers[address])
+
+                if len(waiting) == 0:
+                    break
+
+                wake_at = min([deadline] + [sent_at[a] + self.discovery_timeout for a in waiting if a in sent_at])
+                self._search_cond.wait(timeout=max(0.0, wake_at - now))
+
+            self.state.pop("SEARCH", None)
+
+        results = search["results"]
+        if len(silent) > 0:
+            self.__discover_files(peers_list=silent)
+            for address, files in self.state["LS"].items():
+                results[address] = [f for f in files if matches(name=f[0], pattern=pattern or "*")
+                                    and f[1] >= min_size and (max_size is None or f[1] <= max_size)]
+        self.state["LS"] = {address: files for address, files in results.items() if len(files) > 0}
+
+    @staticmethod
+    def parse_query(line: str) -> Tuple[str, int, Optional[int], bool]:
+        """
+        Interpreta a linha de busca digitada pelo usuário:
+        "<padrão> [min=<bytes>] [max=<bytes>] [-r]".
+
+        Returns:
+            Tuple[str, int, Optional[int], bool]: (padrão, tamanho mínimo, tamanho máximo, incluir subpastas).
+        """
+        words, min_size, max_size, recursive = [], 0, None, False
+        for word in line.split():
+            if word.startswith("min="):
+                min_size = int(word[4:])
+            elif word.startswith("max="):
+                max_size = int(word[4:])
+            elif word == "-r":
+                recursive = True
+            else:
+                words.append(word)
+        return " ".join(words), min_size, max_size, recursive
+
+    def __search_dht(self, queries: List[str], exact: bool = False):
+        """
+        Busca arquivos pela DHT, preenchendo self.state["LS"] no mesmo formato
+        da listagem recebida com LS (peer -> [(nome, tamanho, hash)]).
+
+        Para cada arquivo encontrado, as cópias com o mesmo conteúdo (inclusive
+        com outros nomes) são buscadas pela chave do hash.
+
+        Args:
+            queries (List[str]): Termos de busca (ou nomes de arquivos).
+            exact (bool): Se True, considera apenas arquivos com o nome exatamente igual ao termo.
+        """
+        found = set()
+        for query in queries:
+            records = self.dht.search(query=query)
+            if exact:
+                records = [r for r in records if r.name == query]
+            found.update(records)
+            for hash in {r.hash for r in records}:
+                found.update(self.dht.find_sources(hash=hash))
+
+        self.state["LS"] = {}
+        for record in found:
+            if record.provider == f"{self.host}:{self.port}":
+                continue
+            if record.provider not in self.peers:
+                host, port = record.provider.split(":")
+                self.peers[record.provider] = Peer(host=host, port=int(port))
+            self.state["LS"].setdefault(record.provider, []).append(
+                (record.name, record.size, record.hash, record.root))
+        print(f"=> {len(found)} arquivos encontrados em {len(self.state['LS'])} peers")
 
     def __group_files(self) -> Dict[str, List[File]]:
         """
@@ -328,8 +1123,9 @@ class Server():
 
         for peer_address in self.state["LS"]:
             peer_files = self.state["LS"][peer_address]
-            for name, size in peer_files:
-                file = File(name=name, size=size, peer_address=peer_address)
+            for name, size, hash, root in peer_files:
+                file = File(name=name, size=size,
+                            peer_address=peer_address, hash=hash, root=root)
                 key = file.key()
                 if key not in grouped_files:
                     grouped_files[key] = []
@@ -368,54 +1164,76 @@ class Server():
         """
         Lida com a seleção de download feita pelo usuário.
 
-        Solicita ao usuário que escolha um arquivo para download e,
-        com base na escolha, envia as mensagens "DL" para os peers
-        de forma rotativa (round-robin) para baixar os chunks do arquivo.
+        Solicita ao usuário que escolha um ou mais arquivos (separados por espaço)
+        e enfileira cada um no gerenciador de downloads.
 
         Args:
             groups (List[List[File]]): Lista de grupos de arquivos disponíveis para seleção.
         """
-        print("\nDigite o número do arquivo para fazer download")
-        opt = int(input(">"))
-
-        if opt > 0 and opt <= len(groups):
-            print("entrou")
-            selected_group_files = groups[opt - 1]
-            file = selected_group_files[0]
-            name, size = file.name, file.size
-            peer_addresses = [f.peer_address for f in selected_group_files]
-            qtd_chunks = math.ceil(size / self.chunk_size)
-
-            self.state["temp_file"] = {
-                "qtd_chunks": qtd_chunks,
-                "downloaded": 0,
-                "data": {},
-                "chunk_size": self.chunk_size,
-                "peers": len(peer_addresses),
-                "file_size": size,
-                "started_at": time()
-            }
-
-            for i in range(qtd_chunks):
-                print(f"Enviando chunk {i}")
-                peer_address = peer_addresses[i % len(peer_addresses)]
-                self.send_message(
-                    peer=self.peers[peer_address],
-                    message=f"DL {encode(name)} {self.chunk_size} {i}"
-                )
+        print("\nDigite o número do arquivo para fazer download (ou vários, separados por espaço)")
+        opts = [int(x) for x in input(">").split()]
+
+        selected = [groups[opt - 1] for opt in opts if opt > 0 and opt <= len(groups)]
+        for download_id, group in zip(self.downloads.enqueue_batch(selected), selected):
+            print(f"Download {download_id} do arquivo {group[0].name} enfileirado")
+
+    def download_files(self, names: List[str], wait: bool = True) -> List[str]:
+        """
+        Fluxo não interativo de download: descobre os arquivos na rede (pela
+        listagem dos peers ou, com `use_dht`, pela DHT) e enfileira o
+        download dos arquivos com os nomes informados.
+
+        Args:
+            names (List[str]): Nomes dos arquivos a serem baixados.
+            wait (bool): Se True, aguarda a conclusão de todos os downloads.
+
+        Returns:
+            List[str]: Ids dos downloads enfileirados.
+        """
+        if self.use_dht:
+            self.__search_dht(queries=names, exact=True)
+        else:
+            self.__discover_files()
+        grouped_files = self.__group_files()
+
+        selected = []
+        for name in names:
+            # O mesmo conteúdo pode ter nomes diferentes em cada peer
+            group = next((g for g in grouped_files.values()
+                         if any(f.name == name for f in g)), None)
+            if group is None:
+                print(f"Arquivo {name} não encontrado na rede")
+                continue
+            selected.append((name, group))
+
+        download_ids = [self.downloads.enqueue(name=name, size=group[0].size, hash=group[0].hash,
+                                               root=File.common_root(group),
+                                               sources={f.peer_address: f.name for f in group})
+                        for name, group in selected]
+        if wait:
+            self.downloads.wait(download_ids)
+        return download_ids
 
     def search_files(self):
         """
         Fluxo completo de busca e seleção de arquivos na rede.
 
-        1. Descobre arquivos disponíveis nos peers online.
+        1. Busca os arquivos que correspondem ao padrão nos peers online (SEARCH)
+           ou, com `use_dht`, busca um termo na DHT.
         2. Agrupa os arquivos por identidade.
         3. Exibe a lista de arquivos agrupados.
         4. Lida com a seleção do usuário para iniciar o download.
 
         """
-        self.__discover_files()
+        if self.use_dht:
+            print("Digite o termo de busca")
+            self.__search_dht(queries=[input("> ")])
+        else:
+            print("Digite o padrão de busca (ex: aula, *.pdf; vazio para todos). "
+                  "Opções: min=<bytes> max=<bytes> -r (incluir subpastas)")
+            pattern, min_size, max_size, recursive = self.parse_query(input("> "))
+            self.__search_peers(pattern=pattern, min_size=min_size, max_size=max_size, recursive=recursive)
         grouped_files = self.__group_files()
         groups = self.__display_files(grouped_files)
-        print(groups)
+        logger.debug(groups)
         self.__handle_download_selection(groups)
@@ -0,0 +1,207 @@
+import random
+from base64 import b64encode, b64decode
+from threading import Thread, Lock, Event
+from typing import Dict, List, Optional, Set, Tuple
+
+from src.models.bitmap import Bitmap
+from src.models.logger import logger
+from src.models.peer import Peer
+from src.utils import encode, decode
+
+# Mapa de um peer que tem o arquivo completo, em uma mensagem BITFIELD
+FULL_BITFIELD = "*"
+
+SwarmKey = Tuple[str, int]
+
+
+class Swarm:
+    """
+    Modo enxame: peers que baixam o mesmo arquivo trocam entre si os chunks
+    que já receberam, em vez de todos pedirem o arquivo inteiro a quem o
+    tem completo.
+
+    Um enxame é identificado pelo hash do conteúdo e pelo tamanho do chunk
+    (os índices dos chunks só coincidem com o mesmo tamanho). Ao iniciar um
+    download, o peer envia seu mapa de chunks (BITFIELD) às fontes. Quem tem
+    o arquivo completo guarda os membros do enxame e responde com outros
+    membros (SWARM); quem também está baixando o arquivo responde com o
+    próprio mapa, e os dois passam a ser fontes um do outro. Cada chunk
+    recebido é anunciado aos membros (HAVE), em lotes a cada HAVE_INTERVAL.
+
+    Mensagens:
+    - BITFIELD <hash> <chunk> <nome> <mapa>: chunks do remetente (mapa de bits
+      em base64, ou "*" para o arquivo completo) e o nome do arquivo nele
+    - HAVE <hash> <chunk> <i,j,...>: chunks recebidos desde o último anúncio
+    - SWARM <hash> <chunk> <n> [<host>:<port> ...]: outros membros do enxame
+    - MISSING <nome> <chunk> <índice> [id]: resposta a um DL de chunk que o peer não tem
+
+    Como cada peer que recebe um chunk passa a servi-lo, a quantidade de
+    cópias de um chunk raro dobra a cada rodada e o tempo para distribuir
+    um arquivo a N peers cresce com log(N), e não com N.
+    """
+
+    # Intervalo entre os anúncios HAVE, em segundos
+    HAVE_INTERVAL = 0.1
+    # Máximo de membros enviados em uma mensagem SWARM
+    MAX_MEMBERS = 30
+
+    members: Dict[SwarmKey, Set[str]]
+
+    def __init__(self, server):
+        """
+        Args:
+            server (Server): Servidor usado para enviar as mensagens e cujos downloads são compartilhados.
+        """
+        self.server = server
+        self.own_address = f"{server.host}:{server.port}"
+        self.members = {}
+        self._announced: Set[Tuple[SwarmKey, str]] = set()
+        self._pending: Dict[SwarmKey, List[int]] = {}
+        self._lock = Lock()
+        self._stopped = Event()
+        self._thread: Optional[Thread] = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = Thread(target=self.__run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def __run(self):
+        while not self._stopped.wait(timeout=self.HAVE_INTERVAL):
+            try:
+                self.__flush()
+            except Exception as err:
+                logger.warning(f"Falha ao anunciar chunks ao enxame: {err}")
+
+    def join(self, download):
+        """
+        Entra no enxame de um download, enviando o mapa de chunks às fontes.
+        """
+        if download.hash is None:
+            return
+        self.start()
+        for peer_address in list(download.peer_addresses):
+            self.__send_bitfield(address=peer_address, download=download)
+
+    def have(self, download, index: int):
+        """
+        Agenda o anúncio de um chunk recebido aos membros do enxame.
+        """
+        if download.hash is None:
+            return
+        with self._lock:
+            self._pending.setdefault((download.hash, download.chunk_size), []).append(index)
+
+    def handle_bitfield(self, sender: str, args: List[str]):
+        hash, chunk_size, name, bits = args[0], int(args[1]), decode(args[2]), args[3]
+        key = (hash, chunk_size)
+
+        download = self.server.downloads.running(hash=hash, chunk_size=chunk_size)
+        if download is not None:
+            bitmap = None
+            if bits != FULL_BITFIELD:
+                bitmap = Bitmap(download.qtd_chunks, b64decode(bits))
+            if bitmap is not None and not bitmap.is_complete():
+                with self._lock:
+                    self.members.setdefault(key, set()).add(sender)
+            self.server.downloads.add_source(download=download, peer_address=sender, name=name, bitmap=bitmap)
+            self.__send_bitfield(address=sender, download=download)
+            return
+
+        # Quem tem o arquivo completo apresenta os demais membros do enxame
+        entry = self.server.index.find_hash(hash=hash)
+        if entry is None:
+            return
+        with self._lock:
+            members = self.members.setdefault(key, set())
+            others = [m for m in members if m != sender]
+            if bits != FULL_BITFIELD:
+                members.add(sender)
+        others = random.sample(others, min(self.MAX_MEMBERS, len(others)))
+
+        if self.__mark_announced(key=key, address=sender):
+            self.server.send_message(peer=self.__peer(sender),
+                                     message=f"BITFIELD {hash} {chunk_size} {encode(entry.name)} {FULL_BITFIELD}")
+        if len(others) > 0:
+            self.server.send_message(peer=self.__peer(sender),
+                                     message=f"SWARM {hash} {chunk_size} {len(others)} {' '.join(others)}")
+
+    def handle_have(self, sender: str, args: List[str]):
+        hash, chunk_size = args[0], int(args[1])
+        download = self.server.downloads.running(hash=hash, chunk_size=chunk_size)
+        if download is None:
+            return
+        if download.add_have(peer_address=sender, indices=[int(i) for i in args[2].split(",")]):
+            # O peer completou o arquivo: não precisa mais dos anúncios
+            with self._lock:
+                self.members.get((hash, chunk_size), set()).discard(sender)
+
+    def handle_swarm(self, sender: str, args: List[str]):
+        hash, chunk_size, count = args[0], int(args[1]), int(args[2])
+        download = self.server.downloads.running(hash=hash, chunk_size=chunk_size)
+        if download is None:
+            return
+        for address in args[3:3 + count]:
+            if address != self.own_address and address not in download.sources:
+                self.__send_bitfield(address=address, download=download)
+
+    def read_chunk(self, name: str, chunk_size: int, index: int) -> Optional[bytes]:
+        """
+        Lê um chunk de um arquivo que ainda está sendo baixado.
+
+        Returns:
+            Optional[bytes]: Conteúdo do chunk, ou None se ele não está disponível.
+        """
+        download = self.server.downloads.running(name=name, chunk_size=chunk_size)
+        if download is None:
+            return None
+        return download.read_chunk(index=index)
+
+    def __send_bitfield(self, address: str, download):
+        """
+        Envia o mapa de chunks do download a um peer, uma única vez por enxame.
+        """
+        key = (download.hash, download.chunk_size)
+        if address == self.own_address or not self.__mark_announced(key=key, address=address):
+            return
+        with download.cond:
+            bits = b64encode(download.bitmap.to_bytes()).decode()
+        self.server.send_message(
+            peer=self.__peer(address),
+            message=f"BITFIELD {download.hash} {download.chunk_size} {encode(download.name)} {bits}")
+
+    def __mark_announced(self, key: SwarmKey, address: str) -> bool:
+        """
+        Returns:
+            bool: False se o mapa já foi enviado a esse peer neste enxame.
+        """
+        with self._lock:
+            if (key, address) in self._announced:
+                return False
+            self._announced.add((key, address))
+            return True
+
+    def __flush(self):
+        """
+        Envia os chunks recebidos desde o último anúncio aos membros de cada enxame.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            targets = {key: list(self.members.get(key, ())) for key in pending}
+
+        for (hash, chunk_size), indices in pending.items():
+            message = f"HAVE {hash} {chunk_size} {','.join(str(i) for i in indices)}"
+            for address in targets[(hash, chunk_size)]:
+                if not self.server.send_message(peer=self.__peer(address), message=message):
+                    with self._lock:
+                        self.members[(hash, chunk_size)].discard(address)
+
+    def __peer(self, address: str) -> Peer:
+        if address not in self.server.peers:
+            host, port = address.split(":")
+            self.server.peers[address] = Peer(host=host, port=int(port))
+        return self.server.peers[address]
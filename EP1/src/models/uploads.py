@@ -0,0 +1,250 @@
+from collections import deque
+from threading import Thread, Condition, Lock
+from time import time
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from src.models.logger import logger
+
+
+class TokenBucket:
+    """
+    Balde de fichas: libera em média `rate` bytes por segundo, acumulando
+    no máximo `burst` bytes enquanto fica ocioso.
+
+    Um envio só começa com o saldo não negativo, mas pode deixá-lo
+    negativo (um chunk maior que o balde não fica bloqueado para sempre);
+    o próximo envio espera o saldo ser reposto.
+    """
+
+    rate: float
+    burst: float
+    tokens: float
+
+    def __init__(self, rate: float, burst: float):
+        """
+        Args:
+            rate (float): Taxa média em bytes por segundo.
+            burst (float): Saldo máximo acumulado, em bytes.
+        """
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self._updated_at = time()
+
+    def __refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def delay(self, now: float) -> float:
+        """
+        Tempo, em segundos, até o saldo voltar a ser não negativo (0 = pode enviar).
+        """
+        self.__refill(now)
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def consume(self, amount: float, now: float):
+        self.__refill(now)
+        self.tokens -= amount
+
+
+class _Job:
+    """
+    Envio de um chunk aguardando na fila de um peer.
+    """
+
+    def __init__(self, cost: int, tag: float, send: Callable[[], None]):
+        self.cost = cost
+        self.tag = tag
+        self.send = send
+        self.enqueued_at = time()
+
+
+class UploadScheduler:
+    """
+    Escalonador dos envios de chunks (respostas FILE aos pedidos DL).
+
+    O handler da conexão apenas enfileira o envio e volta a ler as
+    mensagens seguintes, de forma que as mensagens de controle (LS,
+    GET_PEERS, SEARCH...) são respondidas na hora, sem esperar pelos
+    chunks pedidos antes delas. Os chunks são enviados por
+    `Server.upload_workers` threads:
+
+    - cada peer tem a sua fila, e a próxima fila atendida é escolhida por
+      enfileiramento justo ponderado (self-clocked fair queuing): cada envio
+      recebe uma etiqueta de término virtual (custo / peso do peer) e sai
+      primeiro o de menor etiqueta. O custo de um envio são os bytes do
+      chunk mais REQUEST_COST, para que quem pede chunks minúsculos não
+      ganhe mais atendimentos que os demais.
+    - baldes de fichas limitam a taxa total (`Server.upload_rate`) e a de
+      cada peer (`Server.peer_upload_rate`). Um peer sem saldo é pulado, sem
+      atrasar os outros.
+    - a fila de cada peer tem no máximo MAX_QUEUED_PER_PEER envios. Com a
+      fila cheia, o handler da conexão fica bloqueado em submit e para de
+      ler dela, e o controle de fluxo do TCP faz o peer parar de enviar
+      pedidos, em vez de a fila crescer sem limite na memória.
+
+    Com `Server.upload_workers` igual a 0, os chunks são enviados pela
+    própria thread da conexão, como antes.
+    """
+
+    # Custo fixo de cada envio, em bytes (leitura do disco, cabeçalho, chamadas de sistema)
+    REQUEST_COST = 512
+    # Saldo máximo de cada balde, em segundos da sua taxa
+    BURST_SECONDS = 0.1
+    # Máximo de envios aguardando na fila de cada peer
+    MAX_QUEUED_PER_PEER = 64
+
+    weights: Dict[str, float]
+
+    def __init__(self, server):
+        """
+        Args:
+            server (Server): Servidor cujas configurações de taxa e threads são usadas.
+        """
+        self.server = server
+        self.weights = {}
+        self._queues: Dict[str, Deque[_Job]] = {}
+        self._last_tags: Dict[str, float] = {}
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._global: Optional[TokenBucket] = None
+        self._virtual = 0.0
+        self._queued = 0
+        lock = Lock()
+        # Workers aguardam envios em _cond; handlers com a fila do peer cheia aguardam em _space
+        self._cond = Condition(lock)
+        self._space = Condition(lock)
+        self._stopped = False
+        self._workers: List[Thread] = []
+
+    def start(self):
+        with self._cond:
+            for _ in range(self.server.upload_workers - len(self._workers)):
+                t = Thread(target=self.__worker, daemon=True)
+                t.start()
+                self._workers.append(t)
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+            self._space.notify_all()
+
+    def set_weight(self, peer_address: str, weight: float):
+        """
+        Define o peso de um peer (padrão 1): com peso 2, ele recebe o dobro da banda dos demais.
+        """
+        with self._cond:
+            self.weights[peer_address] = weight
+
+    def queued(self) -> int:
+        """
+        Quantidade de envios aguardando na fila.
+        """
+        return self._queued
+
+    def submit(self, peer_address: str, size: int, send: Callable[[], None]):
+        """
+        Enfileira o envio de um chunk para um peer. Se a fila do peer estiver
+        cheia, bloqueia até um envio dela sair.
+
+        Args:
+            peer_address (str): Peer que pediu o chunk.
+            size (int): Tamanho do chunk em bytes.
+            send (Callable[[], None]): Função que envia o chunk.
+        """
+        if self.server.upload_workers <= 0:
+            send()
+            return
+
+        self.start()
+        cost = size + self.REQUEST_COST
+        with self._cond:
+            queue = self._queues.get(peer_address)
+            if queue is not None and len(queue) >= self.MAX_QUEUED_PER_PEER:
+                self.server.metrics.inc("upload_queue_full")
+                while not self._stopped and len(self._queues.get(peer_address, ())) >= self.MAX_QUEUED_PER_PEER:
+                    self._space.wait()
+            if self._stopped:
+                return
+
+            start = max(self._virtual, self._last_tags.get(peer_address, 0.0))
+            tag = start + cost / self.weights.get(peer_address, 1.0)
+            self._last_tags[peer_address] = tag
+            self._queues.setdefault(peer_address, deque()).append(_Job(cost=cost, tag=tag, send=send))
+            self._queued += 1
+            self._cond.notify()
+
+    def __bucket(self, peer_address: Optional[str]) -> Optional[TokenBucket]:
+        """
+        Balde de fichas de um peer (ou o global, se peer_address for None);
+        None se a taxa não é limitada. Deve ser chamado com self._cond adquirido.
+        """
+        rate = self.server.upload_rate if peer_address is None else self.server.peer_upload_rate
+        bucket = self._global if peer_address is None else self._buckets.get(peer_address)
+        if rate <= 0:
+            return None
+        if bucket is None or bucket.rate != rate:
+            bucket = TokenBucket(rate=rate, burst=rate * self.BURST_SECONDS)
+            if peer_address is None:
+                self._global = bucket
+            else:
+                self._buckets[peer_address] = bucket
+        return bucket
+
+    def __next(self) -> Optional[Tuple[str, _Job]]:
+        """
+        Aguarda e retira o próximo envio: o de menor etiqueta dentre os
+        peers com saldo, se o balde global também tiver saldo.
+
+        Returns:
+            Optional[Tuple[str, _Job]]: Peer e envio, ou None se o escalonador foi parado.
+        """
+        with self._cond:
+            while not self._stopped:
+                now = time()
+                wait = None
+                best: Optional[str] = None
+
+                global_bucket = self.__bucket(peer_address=None)
+                global_delay = global_bucket.delay(now) if global_bucket is not None else 0.0
+                if global_delay > 0:
+                    wait = global_delay
+                else:
+                    for peer_address, queue in self._queues.items():
+                        bucket = self.__bucket(peer_address=peer_address)
+                        delay = bucket.delay(now) if bucket is not None else 0.0
+                        if delay > 0:
+                            wait = delay if wait is None else min(wait, delay)
+                        elif best is None or queue[0].tag < self._queues[best][0].tag:
+                            best = peer_address
+
+                if best is not None:
+                    queue = self._queues[best]
+                    job = queue.popleft()
+                    self._queued -= 1
+                    self._virtual = job.tag
+                    if len(queue) == 0:
+                        del self._queues[best]
+                        del self._last_tags[best]
+                    if len(queue) == self.MAX_QUEUED_PER_PEER - 1:
+                        self._space.notify_all()
+                    for bucket in (global_bucket, self.__bucket(peer_address=best)):
+                        if bucket is not None:
+                            bucket.consume(job.cost, now)
+                    return best, job
+
+                self._cond.wait(timeout=wait)
+            return None
+
+    def __worker(self):
+        while True:
+            item = self.__next()
+            if item is None:
+                return
+
+            peer_address, job = item
+            self.server.metrics.observe("upload_wait_seconds", time() - job.enqueued_at)
+            try:
+                job.send()
+            except Exception as err:
+                logger.warning(f"Falha ao enviar chunk para {peer_address}: {err}")
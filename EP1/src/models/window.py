@@ -0,0 +1,166 @@
+from typing import Optional, Tuple
+
+# Pesos das médias móveis do RTT suavizado e de sua variação (RFC 6298)
+RTT_ALPHA = 0.125
+RTT_BETA = 0.25
+
+
+def smooth_rtt(srtt: Optional[float], rttvar: Optional[float], rtt: float) -> Tuple[float, float]:
+    """
+    Atualiza o RTT suavizado e sua variação com uma nova medição, como no
+    cálculo do RTO do TCP (RFC 6298).
+
+    Returns:
+        Tuple[float, float]: Novos (srtt, rttvar).
+    """
+    if srtt is None:
+        return rtt, rtt / 2
+    rttvar += RTT_BETA * (abs(srtt - rtt) - rttvar)
+    srtt += RTT_ALPHA * (rtt - srtt)
+    return srtt, rttvar
+
+
+class Window:
+    """
+    Janela deslizante de requisições DL em andamento para um peer.
+
+    Funciona de forma semelhante ao controle de congestionamento do TCP:
+    - slow start: a janela cresce 1 chunk por resposta até atingir ssthresh
+    - congestion avoidance: cresce 1 chunk a cada janela completa de respostas
+    - quando o RTT de um chunk passa de DELAY_FACTOR vezes o menor RTT
+      observado, e de pelo menos DELAY_SLACK segundos a mais que ele (fila
+      crescendo no peer), ou um chunk é perdido, a janela
+      é reduzida pela metade, no máximo uma vez por janela
+    Com adaptive=False a janela fica fixa no tamanho inicial.
+
+    A janela também estima o tempo máximo de espera por cada chunk (RTO),
+    como o TCP (RFC 6298): RTT suavizado mais 4 vezes a sua variação,
+    partindo da estimativa do peer de downloads anteriores (Peer.srtt). A
+    cada rodada de chunks vencidos o RTO dobra (backoff), até a chegada de
+    um chunk dentro do prazo. Um peer que deixa MAX_TIMEOUTS rodadas
+    seguidas vencerem sem entregar nenhum chunk é considerado travado.
+    """
+
+    DELAY_FACTOR = 2.0
+    DELAY_SLACK = 0.005
+    # RTO antes da primeira medição e seus limites, em segundos
+    INITIAL_RTO = 1.0
+    MIN_RTO = 0.2
+    MAX_RTO = 30.0
+    MAX_BACKOFF = 64
+    MAX_TIMEOUTS = 4
+
+    cwnd: float
+    ssthresh: float
+    in_flight: int
+    min_rtt: Optional[float]
+    srtt: Optional[float]
+    rttvar: Optional[float]
+    backoff: int
+    timeouts: int
+
+    def __init__(self, initial: int = 8, maximum: int = 256, minimum: int = 1, adaptive: bool = True,
+                 srtt: Optional[float] = None, rttvar: Optional[float] = None):
+        """
+        Args:
+            initial (int): Tamanho inicial da janela (em chunks).
+            maximum (int): Tamanho máximo da janela.
+            minimum (int): Tamanho mínimo da janela.
+            adaptive (bool): Se False a janela não se ajusta.
+            srtt (Optional[float]): RTT suavizado já conhecido do peer (Peer.srtt), usado no RTO inicial.
+            rttvar (Optional[float]): Variação do RTT já conhecida do peer.
+        """
+        self.cwnd = float(initial)
+        self.ssthresh = float(maximum)
+        self.maximum = maximum
+        self.minimum = minimum
+        self.adaptive = adaptive
+        self.in_flight = 0
+        self.min_rtt = None
+        self.srtt = srtt
+        self.rttvar = None if srtt is None else (rttvar if rttvar is not None else srtt / 2)
+        self.backoff = 1
+        self.timeouts = 0
+        self._acks_since_decrease = 0
+
+    def available(self) -> bool:
+        """
+        Indica se ainda cabe mais uma requisição na janela.
+        """
+        return self.in_flight < int(self.cwnd)
+
+    def on_send(self):
+        self.in_flight += 1
+
+    def on_ack(self, rtt: float):
+        """
+        Registra a chegada de um chunk e ajusta a janela.
+
+        Args:
+            rtt (float): Tempo entre o envio do DL e a chegada do FILE, em segundos.
+        """
+        self.in_flight = max(0, self.in_flight - 1)
+        self._acks_since_decrease += 1
+        self.backoff = 1
+        self.timeouts = 0
+        self.srtt, self.rttvar = smooth_rtt(srtt=self.srtt, rttvar=self.rttvar, rtt=rtt)
+        if not self.adaptive:
+            return
+
+        if self.min_rtt is None or rtt < self.min_rtt:
+            self.min_rtt = rtt
+
+        if rtt > max(self.min_rtt * self.DELAY_FACTOR, self.min_rtt + self.DELAY_SLACK):
+            self.__decrease()
+        elif self.cwnd < self.ssthresh:
+            self.cwnd = min(self.cwnd + 1, self.maximum)
+        else:
+            self.cwnd = min(self.cwnd + 1 / self.cwnd, self.maximum)
+
+    def on_loss(self):
+        """
+        Registra um chunk perdido (sem resposta) e reduz a janela.
+        """
+        self.in_flight = max(0, self.in_flight - 1)
+        if self.adaptive:
+            self.__decrease()
+
+    def on_cancel(self):
+        """
+        Libera a posição de um chunk que chegou por outro peer (pedido em duplicata).
+        """
+        self.in_flight = max(0, self.in_flight - 1)
+
+    def on_timeout(self):
+        """
+        Registra uma rodada de chunks vencidos: dobra o RTO.
+        """
+        self.backoff = min(self.backoff * 2, self.MAX_BACKOFF)
+        self.timeouts += 1
+
+    def on_late(self):
+        """
+        Registra a chegada de um chunk depois do prazo: o peer não está travado,
+        mas o RTO só volta ao normal com um chunk entregue dentro do prazo.
+        """
+        self.timeouts = 0
+
+    def rto(self) -> float:
+        """
+        Tempo máximo de espera por um chunk pedido ao peer, em segundos.
+        """
+        rto = self.INITIAL_RTO if self.srtt is None else max(self.srtt + 4 * self.rttvar, self.MIN_RTO)
+        return min(rto * self.backoff, self.MAX_RTO)
+
+    def stalled(self) -> bool:
+        """
+        Indica se o peer deixou MAX_TIMEOUTS rodadas seguidas vencerem sem entregar nenhum chunk.
+        """
+        return self.timeouts >= self.MAX_TIMEOUTS
+
+    def __decrease(self):
+        if self._acks_since_decrease < self.cwnd:
+            return
+        self._acks_since_decrease = 0
+        self.ssthresh = max(self.cwnd / 2, self.minimum)
+        self.cwnd = self.ssthresh
@@ -0,0 +1,182 @@
+import logging
+import multiprocessing
+import socket
+from multiprocessing.connection import Connection
+from threading import Thread, Lock
+from typing import Dict, List, Optional, Union
+
+from src.models.frame import Frame
+from src.models.logger import logger, setup_logging, flush_logging
+
+# Indisponível fora do Linux/BSD: nesse caso o servidor segue com um único processo
+SO_REUSEPORT: Optional[int] = getattr(socket, "SO_REUSEPORT", None)
+
+# Pedidos atendidos pelos workers: apenas leem a pasta compartilhada e o índice
+SERVED_ACTIONS = {"DL", "HASHES", "LS", "SEARCH"}
+# Mensagens que mudam o estado da conexão: tratadas pelo worker e também repassadas
+CONNECTION_ACTIONS = {"PROTO", "CODECS", "BYE"}
+# Configurações do servidor copiadas para os workers
+SETTINGS = ("chunk_size", "use_sendfile", "engine", "data_streams", "max_data_streams", "compression",
+            "search_page_size", "upload_workers")
+
+
+class ServingWorkers:
+    """
+    Processos extras que atendem as conexões recebidas na mesma porta do
+    servidor (SO_REUSEPORT), para que o envio de chunks (leitura dos
+    arquivos, compressão, base64, parsing das mensagens) não fique limitado
+    a um núcleo pelo GIL do processo principal.
+
+    O kernel distribui as conexões recebidas entre o processo principal e os
+    `Server.serving_workers` workers. Cada worker é um Server que só atende
+    os pedidos de leitura da pasta compartilhada (SERVED_ACTIONS), com o
+    índice lido do arquivo salvo pelo processo principal (SharedIndex.follow).
+    As demais mensagens (tabela de peers, downloads, DHT, enxame, ...) e os
+    pedidos de chunks de arquivos ainda em download são repassados ao
+    processo principal por um pipe, de forma que o estado continua em um só
+    lugar. Os limites de taxa de upload são divididos entre os processos.
+
+    Os workers são criados com "spawn" (e não fork), já que o processo
+    principal já tem várias threads em execução.
+    """
+
+    processes: List[multiprocessing.Process]
+
+    def __init__(self, server, parent: Optional[Connection] = None):
+        """
+        Args:
+            server (Server): Servidor do processo atual.
+            parent (Optional[Connection]): Pipe para o processo principal, se este processo for um worker.
+        """
+        self.server = server
+        self.parent = parent
+        self.processes = []
+        self._controls: List[Connection] = []
+        self._lock = Lock()
+
+    @property
+    def is_worker(self) -> bool:
+        return self.parent is not None
+
+    def reuse_port(self) -> bool:
+        """
+        Indica se o socket de escuta deve ser aberto com SO_REUSEPORT.
+        """
+        return SO_REUSEPORT is not None and (self.is_worker or self.server.serving_workers > 0)
+
+    def start(self):
+        """
+        Cria os workers. Deve ser chamado depois que o socket do servidor já
+        está escutando, para que a porta nunca fique sem ninguém aceitando conexões.
+        """
+        count = self.server.serving_workers
+        if self.is_worker or count <= 0 or len(self.processes) > 0:
+            return
+        if SO_REUSEPORT is None:
+            logger.warning("SO_REUSEPORT indisponível neste sistema, servidor seguirá com um único processo")
+            return
+
+        context = multiprocessing.get_context("spawn")
+        settings = self.__settings()
+        for _ in range(count):
+            reader, writer = context.Pipe(duplex=False)
+            control_reader, control_writer = context.Pipe(duplex=False)
+            process = context.Process(target=run_worker, args=(settings, writer, control_reader), daemon=True)
+            process.start()
+            writer.close()
+            control_reader.close()
+            self.processes.append(process)
+            self._controls.append(control_writer)
+            Thread(target=self.__receive, args=(reader,), daemon=True).start()
+
+    def stop(self):
+        """
+        Encerra os workers (eles terminam quando o pipe de controle é fechado).
+        """
+        for control in self._controls:
+            control.close()
+        self._controls = []
+
+    def route(self, data: Union[bytes, Frame]) -> bool:
+        """
+        Em um worker, repassa ao processo principal as mensagens que não são
+        pedidos de leitura da pasta compartilhada.
+
+        Returns:
+            bool: True se a mensagem também deve ser tratada por este worker.
+        """
+        if isinstance(data, Frame):
+            action = data.action
+        else:
+            parts = data.split(b" ", 3)
+            action = parts[2].decode() if len(parts) > 2 else ""
+
+        if action in SERVED_ACTIONS:
+            return True
+        self.forward(data)
+        return action in CONNECTION_ACTIONS
+
+    def forward(self, data: Union[bytes, Frame]):
+        """
+        Envia uma mensagem recebida por este worker para ser tratada pelo processo principal.
+        """
+        with self._lock:
+            self.parent.send(data)
+        self.server.metrics.inc("messages_forwarded")
+
+    def __settings(self) -> Dict:
+        processes = self.server.serving_workers + 1
+        settings = {name: getattr(self.server, name) for name in SETTINGS}
+        settings.update(host=self.server.host, port=self.server.port, shared_dir=self.server.shared_dir,
+                        upload_rate=self.server.upload_rate / processes,
+                        peer_upload_rate=self.server.peer_upload_rate / processes)
+        if len(logger.handlers) > 0:
+            settings["log_level"] = logging.getLevelName(logger.getEffectiveLevel())
+        return settings
+
+    def __receive(self, reader: Connection):
+        """
+        Trata no processo principal as mensagens repassadas por um worker.
+        """
+        while True:
+            try:
+                data = reader.recv()
+            except (EOFError, OSError):
+                return
+            try:
+                self.server.handle_message(data=data)
+            except Exception as err:
+                logger.warning(f"Falha ao tratar mensagem repassada por um worker: {err}")
+
+
+def run_worker(settings: Dict, parent: Connection, control: Connection):
+    """
+    Ponto de entrada de um worker: cria um Server com as mesmas
+    configurações do processo principal, escutando na mesma porta, e o
+    mantém até o pipe de controle ser fechado.
+
+    Args:
+        settings (Dict): Endereço, pasta e configurações do servidor principal.
+        parent (Connection): Pipe para repassar mensagens ao processo principal.
+        control (Connection): Pipe fechado pelo processo principal para encerrar o worker.
+    """
+    # Importado aqui: o módulo do servidor depende deste
+    from src.models.server import Server
+
+    settings = dict(settings)
+    level = settings.pop("log_level", None)
+    if level is not None:
+        setup_logging(level=level)
+
+    server = Server(host=settings.pop("host"), port=settings.pop("port"),
+                    shared_dir=settings.pop("shared_dir"), parent=parent)
+    for name, value in settings.items():
+        setattr(server, name, value)
+    Thread(target=server.listen, daemon=True).start()
+
+    try:
+        control.recv()
+    except (EOFError, OSError):
+        pass
+    server.stop()
+    flush_logging()
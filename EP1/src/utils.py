@@ -26,3 +26,15 @@ def standard_deviation(values: List[int]) -> float:
     std_dev = math.sqrt(variance)
 
     return std_dev
+
+
+def percentile(values: List[float], p: float) -> float:
+    """
+    Percentil p (0-100) dos valores, pelo método do posto mais próximo.
+    """
+    if len(values) == 0:
+        return 0.0
+
+    ordered = sorted(values)
+    rank = max(1, math.ceil(p / 100 * len(ordered)))
+    return ordered[rank - 1]